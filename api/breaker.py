@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+from collections import deque
+
+# After BREAKER_FAILURE_THRESHOLD consecutive failures an endpoint class fails
+# fast for BREAKER_RESET_SECONDS, then lets one probe call through
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', 30))
+
+# Latency of recent successful calls, used for the hedging delay
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SECONDS = 0.1
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an endpoint class whose breaker is open"""
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"Circuit open for {endpoint}, retrying in {retry_in:.0f}s")
+        self.endpoint = endpoint
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one endpoint class.
+
+    Errors, timeouts and 5xx answers count as failures; a success closes the
+    breaker again. While open every call fails at once. Once
+    BREAKER_RESET_SECONDS have passed a single probe is let through
+    (half-open): its success closes the breaker, its failure reopens it.
+    """
+
+    def __init__(self, endpoint, threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.endpoint = endpoint
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.rejected = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    def allow(self):
+        """Raise CircuitOpen unless a call may go out now"""
+        with self.lock:
+            if self.state == CLOSED:
+                return
+            retry_in = self.opened_at + self.reset_seconds - time.monotonic()
+            if self.state == OPEN and retry_in <= 0:
+                self.state = HALF_OPEN
+                self.probing = False
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return
+            self.rejected += 1
+        raise CircuitOpen(self.endpoint, max(retry_in, 0))
+
+    def check(self):
+        """Raise CircuitOpen if allow() would refuse, without taking the probe"""
+        with self.lock:
+            if self.state == CLOSED:
+                return
+            retry_in = self.opened_at + self.reset_seconds - time.monotonic()
+            if (self.state == OPEN and retry_in > 0) or (self.state == HALF_OPEN and self.probing):
+                self.rejected += 1
+                raise CircuitOpen(self.endpoint, max(retry_in, 0))
+
+    def cancel(self):
+        """A call was abandoned without an outcome; free the probe slot"""
+        with self.lock:
+            self.probing = False
+
+    def record_success(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            if self.state != CLOSED:
+                print(f"✅ Circuit for {self.endpoint} closed again")
+            self.state = CLOSED
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.probing = False
+                print(f"🔌 Circuit for {self.endpoint} opened after {self.failures} failures")
+
+    def percentile(self, fraction):
+        with self.lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging a call, or None while latency is unknown"""
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_DELAY_SECONDS, self.percentile(0.95))
+
+    def record_hedge(self, won):
+        with self.lock:
+            self.hedges_sent += 1
+            self.hedges_won += int(won)
+
+    def stats(self):
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'rejected': self.rejected,
+                'p50_ms': round(p50 * 1000) if p50 is not None else None,
+                'p95_ms': round(p95 * 1000) if p95 is not None else None,
+                'hedges_sent': self.hedges_sent,
+                'hedges_won': self.hedges_won
+            }
+
+_lock = threading.Lock()
+_breakers = {}
+
+def get_breaker(endpoint):
+    """Breaker for an endpoint class; non-Google calls share the 'other' breaker"""
+    endpoint = endpoint or 'other'
+    with _lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+        return breaker
+
+def get_breaker_stats():
+    with _lock:
+        breakers = list(_breakers.values())
+    return {breaker.endpoint: breaker.stats() for breaker in breakers}
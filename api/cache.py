@@ -0,0 +1,318 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from api.hot_cache import hot_cache
+
+# Cache backend configuration
+CACHE_DIR = 'cache'
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'sqlite')  # 'sqlite' or 'file'
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH', os.path.join(CACHE_DIR, 'cache.db'))
+
+# How long past expiry an entry may still be served while it is refreshed
+CACHE_STALE_GRACE_HOURS = float(os.getenv('CACHE_STALE_GRACE_HOURS', 24))
+
+class CacheBackend:
+    """Durable key/value store behind the in-memory hot tier.
+
+    Values are JSON-serializable. Entries keep their stored_at/expires_at
+    timestamps so callers can decide how to treat expired data, and the
+    upstream cost of building them so the hot tier can weigh them on reload.
+    """
+
+    def get_entry(self, key):
+        """Return {'value', 'stored_at', 'expires_at', 'size', 'cost'} or None, even if expired"""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl_seconds, cost=1):
+        """Store value for ttl_seconds and return its serialized size in bytes"""
+        raise NotImplementedError
+
+    def set_many(self, items, ttl_seconds, cost=1):
+        """Store several (key, value) pairs; backends may do this in one transaction"""
+        return [self.set(key, value, ttl_seconds, cost) for key, value in items]
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove every entry and return how many were removed"""
+        raise NotImplementedError
+
+    def cleanup_expired(self, grace_seconds=0, prefix=''):
+        """Remove entries (under prefix) expired for longer than grace_seconds and return how many"""
+        raise NotImplementedError
+
+    def stats(self):
+        """Return {'backend', 'total_entries', 'total_size_mb'}"""
+        raise NotImplementedError
+
+    def get(self, key):
+        """Return the value for key, or None if missing or expired"""
+        entry = self.get_entry(key)
+        if entry is None or entry['expires_at'] <= time.time():
+            return None
+        return entry['value']
+
+class FileCacheBackend(CacheBackend):
+    """One JSON file per key in a flat directory, written atomically.
+
+    Each file's mtime is set to the entry's expiry time, so expiry sweeps and
+    stats only need a stat per file rather than a read.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{hashlib.md5(key.encode()).hexdigest()}.json")
+
+    def _entry_files(self):
+        if not os.path.exists(self.directory):
+            return []
+        return [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith('.json')]
+
+    def get_entry(self, key):
+        try:
+            with open(self._path(key), 'r') as f:
+                entry = json.load(f)
+        except:
+            return None
+        if not isinstance(entry, dict) or entry.get('key') != key:
+            return None
+        return entry
+
+    def set(self, key, value, ttl_seconds, cost=1):
+        now = time.time()
+        expires_at = now + ttl_seconds
+        data = json.dumps({'key': key, 'value': value, 'stored_at': now, 'expires_at': expires_at, 'cost': cost})
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.utime(tmp_path, (now, expires_at))
+            os.replace(tmp_path, self._path(key))
+        except:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return len(data)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        cleared = 0
+        for path in self._entry_files():
+            try:
+                os.remove(path)
+                cleared += 1
+            except:
+                pass
+        return cleared
+
+    def cleanup_expired(self, grace_seconds=0, prefix=''):
+        cutoff = time.time() - grace_seconds
+        expired = 0
+        for path in self._entry_files():
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    # File names are hashed, so the key is read back from expired files only
+                    if prefix:
+                        with open(path, 'r') as f:
+                            if not json.load(f).get('key', '').startswith(prefix):
+                                continue
+                    os.remove(path)
+                    expired += 1
+            except:
+                pass
+        return expired
+
+    def stats(self):
+        files = self._entry_files()
+        total_size = sum(os.path.getsize(path) for path in files)
+        return {
+            'backend': 'file',
+            'total_entries': len(files),
+            'total_size_mb': round(total_size / (1024 * 1024), 2)
+        }
+
+class SQLiteCacheBackend(CacheBackend):
+    """Embedded SQLite store with an indexed expiry column.
+
+    Entry counts and byte totals are kept in a one-row table maintained by
+    triggers, so stats are a single-row read however large the cache grows.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            cost INTEGER NOT NULL DEFAULT 1,
+            stored_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_cache_entries_expires_at ON cache_entries (expires_at);
+        CREATE TABLE IF NOT EXISTS cache_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_entries INTEGER NOT NULL,
+            total_bytes INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO cache_stats (id, total_entries, total_bytes) VALUES (1, 0, 0);
+        CREATE TRIGGER IF NOT EXISTS cache_entries_insert AFTER INSERT ON cache_entries BEGIN
+            UPDATE cache_stats SET total_entries = total_entries + 1, total_bytes = total_bytes + NEW.size WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS cache_entries_update AFTER UPDATE ON cache_entries BEGIN
+            UPDATE cache_stats SET total_bytes = total_bytes + NEW.size - OLD.size WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS cache_entries_delete AFTER DELETE ON cache_entries BEGIN
+            UPDATE cache_stats SET total_entries = total_entries - 1, total_bytes = total_bytes - OLD.size WHERE id = 1;
+        END;
+    '''
+
+    UPSERT = '''
+        INSERT INTO cache_entries (key, value, size, cost, stored_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, cost = excluded.cost,
+            stored_at = excluded.stored_at, expires_at = excluded.expires_at
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self):
+        # sqlite3 connections must not cross threads or forked workers
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        return conn
+
+    def get_entry(self, key):
+        row = self._connect().execute(
+            'SELECT value, size, cost, stored_at, expires_at FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'value': json.loads(row[0]), 'size': row[1], 'cost': row[2],
+                'stored_at': row[3], 'expires_at': row[4]}
+
+    def set_many(self, items, ttl_seconds, cost=1):
+        now = time.time()
+        rows = []
+        for key, value in items:
+            data = json.dumps(value)
+            rows.append((key, data, len(data), cost, now, now + ttl_seconds))
+        with self._connect() as conn:
+            conn.executemany(self.UPSERT, rows)
+        return [row[2] for row in rows]
+
+    def set(self, key, value, ttl_seconds, cost=1):
+        return self.set_many([(key, value)], ttl_seconds, cost)[0]
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._connect() as conn:
+            return conn.execute('DELETE FROM cache_entries').rowcount
+
+    def cleanup_expired(self, grace_seconds=0, prefix=''):
+        with self._connect() as conn:
+            return conn.execute('DELETE FROM cache_entries WHERE expires_at < ? AND substr(key, 1, ?) = ?',
+                                (time.time() - grace_seconds, len(prefix), prefix)).rowcount
+
+    def stats(self):
+        total_entries, total_bytes = self._connect().execute(
+            'SELECT total_entries, total_bytes FROM cache_stats WHERE id = 1'
+        ).fetchone()
+        return {
+            'backend': 'sqlite',
+            'total_entries': total_entries,
+            'total_size_mb': round(total_bytes / (1024 * 1024), 2)
+        }
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_cache_backend():
+    """Return the process-wide cache backend selected by CACHE_BACKEND"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if CACHE_BACKEND == 'file':
+                    _backend = FileCacheBackend(CACHE_DIR)
+                else:
+                    _backend = SQLiteCacheBackend(CACHE_DB_PATH)
+    return _backend
+
+def load_cached(key, hot=True):
+    """Look a key up in the hot tier, then the durable backend; None if missing or expired"""
+    return load_cached_or_stale(key, grace_seconds=0, hot=hot)[0]
+
+def load_cached_or_stale(key, grace_seconds=CACHE_STALE_GRACE_HOURS * 3600, hot=True):
+    """Return (value, is_stale) for key.
+
+    Entries expired for less than grace_seconds are still returned, flagged
+    stale, so callers can serve them while a refresh runs. Only fresh entries
+    are promoted into the hot tier; stale reads go to the backend each time
+    until the refresh lands. hot=False bypasses the hot tier altogether.
+    """
+    value = hot_cache.get(key) if hot else None
+    if value is not None:
+        return value, False
+
+    try:
+        entry = get_cache_backend().get_entry(key)
+    except Exception as e:
+        print(f"❌ Cache read failed for {key}: {str(e)}")
+        return None, False
+    if entry is None:
+        return None, False
+
+    now = time.time()
+    if entry['expires_at'] > now:
+        if hot:
+            hot_cache.put(key, entry['value'], entry['expires_at'], cost=entry.get('cost', 1),
+                          size=entry.get('size'))
+        return entry['value'], False
+    if entry['expires_at'] + grace_seconds > now:
+        return entry['value'], True
+    return None, False
+
+def save_cached(key, value, ttl_seconds, cost=1, hot=True):
+    """Write a value through to the durable backend and (unless hot=False) the hot tier"""
+    save_many_cached([(key, value)], ttl_seconds, cost, hot)
+
+def save_many_cached(items, ttl_seconds, cost=1, hot=True):
+    """Write several (key, value) pairs in one backend transaction where supported"""
+    expires_at = time.time() + ttl_seconds
+    try:
+        sizes = get_cache_backend().set_many(items, ttl_seconds, cost)
+    except Exception as e:
+        print(f"❌ Cache write failed: {str(e)}")
+        sizes = [None] * len(items)
+    if not hot:
+        return
+    for (key, value), size in zip(items, sizes):
+        hot_cache.put(key, value, expires_at, cost=cost, size=size)
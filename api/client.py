@@ -0,0 +1,297 @@
+import os
+import ssl
+import time
+import asyncio
+import threading
+import requests
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from api.breaker import get_breaker
+from api.quota import QUOTA_MAX_WAIT_SECONDS, get_endpoint, upstream_quota
+from deadline import clamp_timeout
+
+# Connection pool configuration
+UPSTREAM_POOL_CONNECTIONS = int(os.getenv('UPSTREAM_POOL_CONNECTIONS', 4))  # Distinct hosts kept pooled
+UPSTREAM_POOL_MAXSIZE = int(os.getenv('UPSTREAM_POOL_MAXSIZE', 16))  # Keep-alive connections per host
+UPSTREAM_ASYNC_LIMIT = int(os.getenv('UPSTREAM_ASYNC_LIMIT', 32))  # Total aiohttp connections per loop
+UPSTREAM_KEEPALIVE_SECONDS = int(os.getenv('UPSTREAM_KEEPALIVE_SECONDS', 60))
+UPSTREAM_TIMEOUT_SECONDS = 10
+
+# Root of the Google Maps web services; point it at a local stand-in to
+# benchmark without spending quota
+GOOGLE_MAPS_BASE_URL = os.getenv('GOOGLE_MAPS_BASE_URL', 'https://maps.googleapis.com/maps/api').rstrip('/')
+
+# Hedged calls: once a call marked hedge=True has run longer than its
+# endpoint's recent p95, a duplicate goes out and the first answer wins
+UPSTREAM_HEDGING = os.getenv('UPSTREAM_HEDGING', '1') == '1'
+HEDGE_MAX_WORKERS = int(os.getenv('HEDGE_MAX_WORKERS', 8))
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+_ssl_context = None
+_async_sessions = {}
+_hedge_pool = None
+_hedge_pool_pid = None
+
+def get_ssl_context():
+    """Return the process-wide SSL context shared by every async connection.
+
+    It verifies certificates and host names, as requests does for the sync
+    calls; every Google call carries the API key.
+    """
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    return _ssl_context
+
+def get_session():
+    """Return the long-lived pooled requests session for this process.
+
+    The session is rebuilt after a fork so gunicorn workers never share sockets.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+
+    with _lock:
+        if _session is None or _session_pid != pid:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=UPSTREAM_POOL_CONNECTIONS,
+                                  pool_maxsize=UPSTREAM_POOL_MAXSIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+            _session_pid = pid
+    return _session
+
+def get_hedge_pool():
+    """Return this process's thread pool for hedge duplicates, rebuilt after a fork"""
+    global _hedge_pool, _hedge_pool_pid
+    pid = os.getpid()
+    with _lock:
+        if _hedge_pool is None or _hedge_pool_pid != pid:
+            _hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix='hedge')
+            _hedge_pool_pid = pid
+    return _hedge_pool
+
+def get_hedge_delay(endpoint, timeout, hedge):
+    """Seconds after which a call should be hedged, or None to send it once"""
+    if not (hedge and UPSTREAM_HEDGING):
+        return None
+    delay = get_breaker(endpoint).hedge_delay()
+    # A hedge that could not finish inside the timeout is not worth sending
+    return delay if delay is not None and delay < timeout / 2 else None
+
+def get_json(endpoint, url, params, timeout, shortened=False):
+    """One GET through the endpoint's circuit breaker; return the decoded JSON.
+
+    Transport errors, timeouts, 5xx answers, undecodable bodies and Google's
+    UNKNOWN_ERROR count as breaker failures. shortened=True marks a timeout
+    cut below the normal one by the request deadline or a late hedge; running
+    out of it says nothing about the endpoint, so it only frees the probe slot.
+    """
+    breaker = get_breaker(endpoint)
+    breaker.allow()
+    started = time.monotonic()
+    try:
+        response = get_session().get(url, params=params, timeout=timeout)
+        if response.status_code >= 500:
+            response.raise_for_status()
+        data = response.json()
+    except requests.Timeout:
+        breaker.cancel() if shortened else breaker.record_failure()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    if isinstance(data, dict) and data.get('status') == 'UNKNOWN_ERROR':
+        breaker.record_failure()
+    else:
+        breaker.record_success(time.monotonic() - started)
+    return data
+
+def run_in_thread(call, timeout):
+    """Start call(timeout) on a thread of its own and return its Future"""
+    future = Future()
+    def run():
+        try:
+            future.set_result(call(timeout))
+        except Exception as e:
+            future.set_exception(e)
+    threading.Thread(target=run, name='hedge-primary', daemon=True).start()
+    return future
+
+def hedged(call, endpoint, timeout, delay):
+    """Run call(timeout); if it has not answered after delay, race a duplicate.
+
+    The primary starts at once on its own thread, leaving the caller free to
+    take whichever answer comes first; only duplicates use the hedge pool, so
+    primaries never queue behind each other there. The duplicate only goes
+    out if a spare quota token is on hand. The first successful answer wins;
+    the slower call finishes in the background.
+    """
+    primary = run_in_thread(call, timeout)
+    done, _ = wait([primary], timeout=delay)
+    if done or not upstream_quota.try_acquire(endpoint):
+        return primary.result()
+
+    backup = get_hedge_pool().submit(call, timeout - delay)
+    pending = {primary, backup}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                get_breaker(endpoint).record_hedge(won=future is backup)
+                return future.result()
+            error = error or future.exception()
+    get_breaker(endpoint).record_hedge(won=False)
+    raise error
+
+def fetch_json(url, params=None, timeout=UPSTREAM_TIMEOUT_SECONDS, hedge=False):
+    """GET an upstream URL through the shared session and decode the JSON body.
+
+    Google calls take a token from the upstream quota first and report their
+    status back, which may raise QuotaExceeded. The timeout, and any wait
+    for a token, is clamped to the request deadline, which may raise
+    DeadlineExceeded. While the endpoint's circuit breaker is open the call
+    fails at once with CircuitOpen. hedge=True marks a latency-critical call
+    that may be hedged.
+    """
+    endpoint = get_endpoint(url)
+    get_breaker(endpoint).check()
+    upstream_quota.acquire(endpoint, max_wait=min(QUOTA_MAX_WAIT_SECONDS, clamp_timeout(timeout)))
+    full_timeout, timeout = timeout, clamp_timeout(timeout)
+    call = lambda timeout: get_json(endpoint, url, params, timeout, shortened=timeout < full_timeout)
+
+    delay = get_hedge_delay(endpoint, timeout, hedge)
+    data = call(timeout) if delay is None else hedged(call, endpoint, timeout, delay)
+    if isinstance(data, dict):
+        upstream_quota.report(endpoint, data.get('status'))
+    return data
+
+def fetch_bytes(url, params=None, timeout=UPSTREAM_TIMEOUT_SECONDS):
+    """GET an upstream URL through the shared session; return (content, content_type)"""
+    endpoint = get_endpoint(url)
+    breaker = get_breaker(endpoint)
+    breaker.check()
+    upstream_quota.acquire(endpoint, max_wait=min(QUOTA_MAX_WAIT_SECONDS, clamp_timeout(timeout)))
+    full_timeout, timeout = timeout, clamp_timeout(timeout)
+    breaker.allow()
+    started = time.monotonic()
+    try:
+        response = get_session().get(url, params=params, timeout=timeout)
+        if response.status_code >= 500:
+            response.raise_for_status()
+    except requests.Timeout:
+        # A timeout cut short by the request deadline says nothing about the endpoint
+        breaker.cancel() if timeout < full_timeout else breaker.record_failure()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success(time.monotonic() - started)
+    if response.status_code == 429:
+        upstream_quota.report(endpoint, 'OVER_QUERY_LIMIT')
+    response.raise_for_status()
+    return response.content, response.headers.get('Content-Type', 'application/octet-stream')
+
+async def get_json_async(endpoint, url, params, timeout, shortened=False):
+    """get_json for coroutines; a cancelled call frees the breaker's probe slot"""
+    import aiohttp
+
+    breaker = get_breaker(endpoint)
+    breaker.allow()
+    started = time.monotonic()
+    try:
+        async with get_async_session().get(url, params=params,
+                                           timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status >= 500:
+                response.raise_for_status()
+            data = await response.json(content_type=None)
+    except asyncio.CancelledError:
+        breaker.cancel()
+        raise
+    except asyncio.TimeoutError:
+        breaker.cancel() if shortened else breaker.record_failure()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    if isinstance(data, dict) and data.get('status') == 'UNKNOWN_ERROR':
+        breaker.record_failure()
+    else:
+        breaker.record_success(time.monotonic() - started)
+    return data
+
+async def hedged_async(call, endpoint, timeout, delay):
+    """hedged() for coroutines; the losing call is cancelled"""
+    tasks = [asyncio.ensure_future(call(timeout))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or not upstream_quota.try_acquire(endpoint):
+            return await tasks[0]
+
+        tasks.append(asyncio.ensure_future(call(timeout - delay)))
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    get_breaker(endpoint).record_hedge(won=task is tasks[1])
+                    return task.result()
+                error = error or task.exception()
+        get_breaker(endpoint).record_hedge(won=False)
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def fetch_json_async(url, params=None, timeout=UPSTREAM_TIMEOUT_SECONDS, hedge=False):
+    """fetch_json for coroutines, on the shared aiohttp session of the running loop"""
+    endpoint = get_endpoint(url)
+    get_breaker(endpoint).check()
+    await upstream_quota.acquire_async(endpoint, max_wait=min(QUOTA_MAX_WAIT_SECONDS, clamp_timeout(timeout)))
+    full_timeout, timeout = timeout, clamp_timeout(timeout)
+    call = lambda timeout: get_json_async(endpoint, url, params, timeout, shortened=timeout < full_timeout)
+
+    delay = get_hedge_delay(endpoint, timeout, hedge)
+    data = await (call(timeout) if delay is None else hedged_async(call, endpoint, timeout, delay))
+    if isinstance(data, dict):
+        upstream_quota.report(endpoint, data.get('status'))
+    return data
+
+def get_async_session():
+    """Return the shared aiohttp session bound to the running event loop.
+
+    aiohttp sessions cannot cross event loops, so one session is kept per loop
+    and sessions whose loop has been closed are dropped.
+    """
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is not None and not session.closed:
+        return session
+
+    for stale_loop in [l for l in _async_sessions if l.is_closed()]:
+        del _async_sessions[stale_loop]
+
+    connector = aiohttp.TCPConnector(ssl=get_ssl_context(),
+                                     limit=UPSTREAM_ASYNC_LIMIT,
+                                     limit_per_host=UPSTREAM_POOL_MAXSIZE,
+                                     keepalive_timeout=UPSTREAM_KEEPALIVE_SECONDS,
+                                     ttl_dns_cache=300)
+    session = aiohttp.ClientSession(connector=connector,
+                                    timeout=aiohttp.ClientTimeout(total=UPSTREAM_TIMEOUT_SECONDS))
+    _async_sessions[loop] = session
+    return session
+
+async def close_async_session():
+    """Close the shared aiohttp session for the running event loop, if any"""
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
@@ -0,0 +1,79 @@
+import os
+import asyncio
+from api.client import GOOGLE_MAPS_BASE_URL, fetch_json, fetch_json_async
+from api.cache import load_cached_or_stale, save_cached
+from revalidate import refresher
+
+GOOGLE_PLACE_DETAILS_URL = f'{GOOGLE_MAPS_BASE_URL}/place/details/json'
+
+# Place details change far less often than search results, so they get a
+# longer TTL than the 24h search cache
+DETAILS_CACHE_TTL_HOURS = float(os.getenv('DETAILS_CACHE_TTL_HOURS', 24 * 7))
+
+# The full field mask is shared by every caller so a cached entry can serve
+# app.py and api/google_places.py alike
+DETAILS_FIELDS = 'photos,website,url,formatted_phone_number,opening_hours,reviews,editorial_summary,price_level,rating,user_ratings_total'
+
+# Field tiers: 'minimal' only asks for Basic data fields (what a listing
+# needs), 'full' adds the contact and atmosphere fields an opened card shows
+DETAILS_TIERS = {
+    'minimal': 'photos,url',
+    'full': DETAILS_FIELDS
+}
+
+# Tiers whose cached entries can answer a request for a tier, richest first
+COVERING_TIERS = {
+    'minimal': ['full', 'minimal'],
+    'full': ['full']
+}
+
+def get_details_key(place_id, tier='full'):
+    """Cache key for one tier of a place's details"""
+    return f"details:{place_id}" if tier == 'full' else f"details:{tier}:{place_id}"
+
+def get_cached_details(place_id, api_key=None, tier='full'):
+    """Return the cached raw details result for a place, or None if missing.
+
+    A cached full entry also answers minimal requests. A recently expired
+    entry is still returned, and when an api_key is given a background
+    refresh of it is scheduled.
+    """
+    for covering in COVERING_TIERS[tier]:
+        key = get_details_key(place_id, covering)
+        result, stale = load_cached_or_stale(key)
+        if result is None:
+            continue
+        if stale and api_key:
+            refresher.schedule(key, lambda: fetch_details(place_id, api_key, tier=covering))
+        return result
+    return None
+
+def save_cached_details(place_id, result, tier='full'):
+    """Store the raw details result for a place"""
+    save_cached(get_details_key(place_id, tier), result, DETAILS_CACHE_TTL_HOURS * 3600)
+
+def fetch_details(place_id, api_key, timeout=10, tier='full'):
+    """Fetch one tier of raw details for a place from Google and cache them; None if unavailable"""
+    params = {
+        'key': api_key,
+        'place_id': place_id,
+        'fields': DETAILS_TIERS[tier]
+    }
+    data = fetch_json(GOOGLE_PLACE_DETAILS_URL, params=params, timeout=timeout)
+    return _store_details(place_id, data, tier)
+
+async def fetch_details_async(place_id, api_key, timeout=10, tier='full'):
+    """fetch_details for coroutines"""
+    params = {
+        'key': api_key,
+        'place_id': place_id,
+        'fields': DETAILS_TIERS[tier]
+    }
+    data = await fetch_json_async(GOOGLE_PLACE_DETAILS_URL, params=params, timeout=timeout)
+    return await asyncio.to_thread(_store_details, place_id, data, tier)
+
+def _store_details(place_id, data, tier):
+    if data.get('status') == 'OK' and data.get('result'):
+        save_cached_details(place_id, data['result'], tier)
+        return data['result']
+    return None
@@ -0,0 +1,193 @@
+import os
+import re
+import bisect
+import threading
+import unicodedata
+from collections import OrderedDict
+from api.cache import get_cache_backend
+
+# Searches are restricted to Singapore, so the component is part of every key
+GEOCODE_COMPONENTS = 'country:SG'
+GEOCODE_CACHE_TTL_DAYS = float(os.getenv('GEOCODE_CACHE_TTL_DAYS', 30))
+GEOCODE_MEMORY_ENTRIES = int(os.getenv('GEOCODE_MEMORY_ENTRIES', 1024))
+
+# Prefix lookups only kick in for queries at least this long, and the index
+# of resolved queries and addresses is capped at GEOCODE_PREFIX_MAX_ENTRIES
+GEOCODE_PREFIX_MIN_CHARS = int(os.getenv('GEOCODE_PREFIX_MIN_CHARS', 4))
+GEOCODE_PREFIX_MAX_ENTRIES = int(os.getenv('GEOCODE_PREFIX_MAX_ENTRIES', 10000))
+GEOCODE_MAX_RESULTS = 5
+
+# Reverse lookups are keyed on a ~10m grid
+REVERSE_GEOCODE_PRECISION = 4
+
+# Country names that add nothing to a query already restricted to the country
+COUNTRY_NAMES = {'country:SG': ('singapore', 'sg')}
+
+def normalize_query(query, components=GEOCODE_COMPONENTS):
+    """Lowercase, strip accents and punctuation, and drop a trailing country name"""
+    text = unicodedata.normalize('NFKD', query or '').encode('ascii', 'ignore').decode().lower()
+    words = re.findall(r'[a-z0-9]+', text)
+    country_names = COUNTRY_NAMES.get(components, ())
+    while words and words[-1] in country_names:
+        words.pop()
+    return ' '.join(words)
+
+def get_geocode_key(normalized, components=GEOCODE_COMPONENTS):
+    return f"geocode:{components}:{normalized}"
+
+def get_reverse_key(lat, lng):
+    return f"geocode:reverse:{round(float(lat), REVERSE_GEOCODE_PRECISION)},{round(float(lng), REVERSE_GEOCODE_PRECISION)}"
+
+class LRUCache:
+    """Small thread-safe least-recently-used map"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+class PrefixIndex:
+    """Sorted index of normalized queries and addresses that resolved before.
+
+    A prefix lookup is a bisect to the first key at or after the prefix and a
+    scan while keys still start with it.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.keys = []
+        self.results = {}
+
+    def add(self, key, results):
+        if not key:
+            return
+        with self.lock:
+            if key not in self.results:
+                if len(self.keys) >= self.max_entries:
+                    return
+                bisect.insort(self.keys, key)
+            self.results[key] = results
+
+    def search(self, prefix, limit=GEOCODE_MAX_RESULTS):
+        matches = []
+        seen = set()
+        with self.lock:
+            i = bisect.bisect_left(self.keys, prefix)
+            while i < len(self.keys) and self.keys[i].startswith(prefix) and len(matches) < limit:
+                for result in self.results[self.keys[i]]:
+                    point = (result['lat'], result['lng'])
+                    if point not in seen and len(matches) < limit:
+                        seen.add(point)
+                        matches.append(result)
+                i += 1
+        return matches
+
+    def clear(self):
+        with self.lock:
+            self.keys = []
+            self.results = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+memory_tier = LRUCache(GEOCODE_MEMORY_ENTRIES)
+prefix_index = PrefixIndex(GEOCODE_PREFIX_MAX_ENTRIES)
+
+def _index(normalized, results, components):
+    # Each resolved address is indexed on its own so a partial query finds it
+    if components == GEOCODE_COMPONENTS:
+        prefix_index.add(normalized, results)
+        for result in results:
+            prefix_index.add(normalize_query(result['formatted_address'], components), [result])
+
+def _load(key):
+    results = memory_tier.get(key)
+    if results is not None:
+        return results, False
+    try:
+        results = get_cache_backend().get(key)
+    except Exception as e:
+        print(f"❌ Geocode cache read failed: {str(e)}")
+        return None, False
+    if results is not None:
+        memory_tier.put(key, results)
+        return results, True
+    return None, False
+
+def _save(key, results):
+    memory_tier.put(key, results)
+    try:
+        get_cache_backend().set(key, results, GEOCODE_CACHE_TTL_DAYS * 86400)
+    except Exception as e:
+        print(f"❌ Geocode cache write failed: {str(e)}")
+
+def get_cached_geocode(query, components=GEOCODE_COMPONENTS):
+    """Return (results, source) for a query answered locally, or (None, None).
+
+    source is 'memory', 'disk' or 'prefix'. Prefix answers come from
+    earlier lookups whose query or address starts with this query.
+    """
+    normalized = normalize_query(query, components)
+    if not normalized:
+        return None, None
+
+    results, from_disk = _load(get_geocode_key(normalized, components))
+    if results is not None:
+        if from_disk:
+            _index(normalized, results, components)
+        return results, 'disk' if from_disk else 'memory'
+
+    if len(normalized) >= GEOCODE_PREFIX_MIN_CHARS and components == GEOCODE_COMPONENTS:
+        results = prefix_index.search(normalized)
+        if results:
+            return results, 'prefix'
+    return None, None
+
+def save_geocode(query, results, components=GEOCODE_COMPONENTS):
+    """Store the formatted results Google returned for a query"""
+    normalized = normalize_query(query, components)
+    if not normalized or not results:
+        return
+    _save(get_geocode_key(normalized, components), results)
+    _index(normalized, results, components)
+
+def get_cached_reverse_geocode(lat, lng):
+    """Return cached formatted results for a coordinate, or None"""
+    return _load(get_reverse_key(lat, lng))[0]
+
+def save_reverse_geocode(lat, lng, results):
+    """Store reverse lookup results; their addresses also feed the prefix index"""
+    if not results:
+        return
+    _save(get_reverse_key(lat, lng), results)
+    for result in results:
+        prefix_index.add(normalize_query(result['formatted_address']), [result])
+
+def clear_geocode_memory():
+    memory_tier.clear()
+    prefix_index.clear()
+
+def get_geocode_stats():
+    return {'memory_entries': len(memory_tier), 'prefix_entries': len(prefix_index)}
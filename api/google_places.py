@@ -1,25 +1,31 @@
 import os
-import aiohttp
-import ssl
 import random
+import asyncio
 import json
 import hashlib
 import time
-from datetime import datetime, timedelta
+from api.client import GOOGLE_MAPS_BASE_URL, close_async_session, fetch_json_async
+from api.page_tokens import page_tokens
+from api.cache import CACHE_STALE_GRACE_HOURS, get_cache_backend, load_cached_or_stale, save_cached
+from revalidate import refresher
+from filter_engine import filter_candidates
+from place_tags import CUISINE_KEYWORDS, tag_place
+from geo import geometry_distances, parse_location
+from place_merge import PlaceMerger
+from api.photo_cache import get_photo_url
+from api.details_cache import DETAILS_FIELDS, get_cached_details, save_cached_details
 
 GOOGLE_API_KEY = os.getenv('GOOGLE_PLACES_API_KEY')
-GOOGLE_PLACES_URL = 'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
-GOOGLE_TEXT_SEARCH_URL = 'https://maps.googleapis.com/maps/api/place/textsearch/json'
-GOOGLE_PLACE_DETAILS_URL = 'https://maps.googleapis.com/maps/api/place/details/json'
+GOOGLE_PLACES_URL = f'{GOOGLE_MAPS_BASE_URL}/place/nearbysearch/json'
+GOOGLE_TEXT_SEARCH_URL = f'{GOOGLE_MAPS_BASE_URL}/place/textsearch/json'
+GOOGLE_PLACE_DETAILS_URL = f'{GOOGLE_MAPS_BASE_URL}/place/details/json'
 
 # Cache configuration
-CACHE_DIR = 'cache'
 CACHE_DURATION_HOURS = 24  # Cache results for 24 hours
 
-def ensure_cache_dir():
-    """Ensure cache directory exists"""
-    if not os.path.exists(CACHE_DIR):
-        os.makedirs(CACHE_DIR)
+# Details enrichment configuration
+DETAILS_CONCURRENCY = int(os.getenv('DETAILS_CONCURRENCY', 8))
+DETAILS_TIMEOUT_SECONDS = float(os.getenv('DETAILS_TIMEOUT_SECONDS', 5))
 
 def get_cache_key(location, filters, search_type):
     """Generate a cache key for the search parameters"""
@@ -31,36 +37,7 @@ def get_cache_key(location, filters, search_type):
         'search_type': search_type
     }
     cache_string = json.dumps(cache_data, sort_keys=True)
-    return hashlib.md5(cache_string.encode()).hexdigest()
-
-def get_cache_file(cache_key):
-    """Get the cache file path for a given key"""
-    return os.path.join(CACHE_DIR, f"{cache_key}.json")
-
-def is_cache_valid(cache_file):
-    """Check if cache file exists and is still valid"""
-    if not os.path.exists(cache_file):
-        return False
-    
-    # Check if cache is expired
-    file_time = datetime.fromtimestamp(os.path.getmtime(cache_file))
-    return datetime.now() - file_time < timedelta(hours=CACHE_DURATION_HOURS)
-
-def load_from_cache(cache_file):
-    """Load results from cache file"""
-    try:
-        with open(cache_file, 'r') as f:
-            return json.load(f)
-    except:
-        return None
-
-def save_to_cache(cache_file, results):
-    """Save results to cache file"""
-    try:
-        with open(cache_file, 'w') as f:
-            json.dump(results, f)
-    except:
-        pass  # Silently fail if cache save fails
+    return f"{search_type}:{hashlib.md5(cache_string.encode()).hexdigest()}"
 
 def should_use_cached_results(filters):
     """Determine if we should use cached results based on filters"""
@@ -74,26 +51,6 @@ def should_use_cached_results(filters):
     
     return True
 
-# Cuisine-specific keywords for better search results
-CUISINE_KEYWORDS = {
-    'japanese': ['sushi', 'ramen', 'tempura', 'udon', 'soba', 'yakitori', 'izakaya', 'bento', 'teppanyaki', 'sashimi'],
-    'chinese': ['dim sum', 'peking duck', 'kung pao', 'szechuan', 'cantonese', 'hot pot', 'dumplings', 'noodles'],
-    'italian': ['pizza', 'pasta', 'risotto', 'osso buco', 'bruschetta', 'tiramisu', 'gelato', 'prosciutto'],
-    'mexican': ['tacos', 'burritos', 'enchiladas', 'guacamole', 'quesadilla', 'mole', 'ceviche', 'tamales'],
-    'indian': ['curry', 'tandoori', 'naan', 'biryani', 'dal', 'samosa', 'kebab', 'masala'],
-    'thai': ['pad thai', 'tom yum', 'green curry', 'massaman', 'som tam', 'larb', 'satay'],
-    'korean': ['bbq', 'bibimbap', 'bulgogi', 'kimchi', 'japchae', 'tteokbokki', 'samgyeopsal'],
-    'vietnamese': ['pho', 'banh mi', 'spring rolls', 'bun cha', 'com tam', 'cao lau'],
-    'mediterranean': ['hummus', 'falafel', 'shawarma', 'kebab', 'tabbouleh', 'baklava'],
-    'french': ['croissant', 'escargot', 'coq au vin', 'ratatouille', 'quiche', 'creme brulee'],
-    'greek': ['gyro', 'moussaka', 'souvlaki', 'spanakopita', 'baklava', 'tzatziki'],
-    'spanish': ['paella', 'tapas', 'gazpacho', 'chorizo', 'jamón', 'sangria'],
-    'american': ['burger', 'steak', 'bbq', 'hot dog', 'mac and cheese', 'apple pie'],
-    'seafood': ['lobster', 'crab', 'shrimp', 'oysters', 'salmon', 'tuna', 'mussels'],
-    'vegetarian': ['vegan', 'plant-based', 'vegetarian', 'tofu', 'tempeh', 'quinoa'],
-    'dessert': ['ice cream', 'cake', 'pastry', 'donuts', 'cookies', 'chocolate']
-}
-
 def get_cuisine_keywords(cuisine):
     """Get relevant keywords for a cuisine type"""
     cuisine_lower = cuisine.lower()
@@ -294,20 +251,14 @@ def get_mock_restaurants(location, filters):
     ]
     
     # Don't pre-filter by radius - let the main filtering handle it
-    # Filter by cuisine if specified
-    if 'cuisine' in filters and filters['cuisine']:
-        cuisine_lower = filters['cuisine'].lower()
-        mock_restaurants = [r for r in mock_restaurants 
-                          if cuisine_lower in r['name'].lower() or 
-                          any(cuisine_lower in t.lower() for t in r['types'])]
-    
-    # Filter by dietary if specified
-    if 'dietary' in filters and filters['dietary']:
-        dietary_terms = [d.lower() for d in filters['dietary']]
-        mock_restaurants = [r for r in mock_restaurants 
-                          if any(diet in r['name'].lower() or 
-                                any(diet in t.lower() for t in r['types']) 
-                                for diet in dietary_terms)]
+    # Cuisine and dietary filters test the tag bitsets computed at ingest
+    for restaurant in mock_restaurants:
+        tag_place(restaurant)
+    cuisine = (filters.get('cuisine') or '').lower().strip()
+    dietary_terms = [d.lower() for d in filters.get('dietary') or []]
+    if cuisine or dietary_terms:
+        mock_restaurants, _ = filter_candidates(mock_restaurants, cuisine=cuisine or None,
+                                                dietary_terms=dietary_terms or None)
     
     # Filter by open now if specified
     if filters.get('open_now'):
@@ -319,199 +270,202 @@ def get_mock_restaurants(location, filters):
     
     return mock_restaurants
 
-async def get_place_details(session, place_id, search_log):
+async def get_place_details(place_id, search_log):
     """Get detailed information for a specific place"""
     try:
-        # Create a new session for this request to avoid session closed errors
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
+        # Check the per-place details cache before calling Google
+        result = get_cached_details(place_id, GOOGLE_API_KEY)
         
-        async with aiohttp.ClientSession(connector=connector) as detail_session:
+        if result is None:
             params = {
                 'key': GOOGLE_API_KEY,
                 'place_id': place_id,
-                'fields': 'photos,formatted_phone_number,website,opening_hours,reviews,price_level,rating,user_ratings_total'
+                'fields': DETAILS_FIELDS
             }
             
-            async with detail_session.get(GOOGLE_PLACE_DETAILS_URL, params=params) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    if data.get('status') == 'OK':
-                        result = data.get('result', {})
-                        
-                        # Extract photos
-                        photos = []
-                        if 'photos' in result:
-                            for photo in result['photos'][:3]:  # Limit to 3 photos
-                                photo_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=400&photoreference={photo['photo_reference']}&key={GOOGLE_API_KEY}"
-                                photos.append({
-                                    'url': photo_url,
-                                    'width': photo.get('width', 400),
-                                    'height': photo.get('height', 300)
-                                })
-                        
-                        # Extract reviews
-                        reviews = []
-                        if 'reviews' in result:
-                            for review in result['reviews'][:3]:  # Limit to 3 reviews
-                                reviews.append({
-                                    'author_name': review.get('author_name', 'Anonymous'),
-                                    'rating': review.get('rating', 0),
-                                    'text': review.get('text', '')[:200] + '...' if len(review.get('text', '')) > 200 else review.get('text', ''),
-                                    'time': review.get('time', 0)
-                                })
-                        
-                        return {
-                            'photos': photos,
-                            'formatted_phone_number': result.get('formatted_phone_number'),
-                            'website': result.get('website'),
-                            'opening_hours': result.get('opening_hours', {}).get('weekday_text', []),
-                            'reviews': reviews,
-                            'price_level': result.get('price_level'),
-                            'rating': result.get('rating'),
-                            'user_ratings_total': result.get('user_ratings_total')
-                        }
-                    else:
-                        search_log.append(f"  ❌ Details API error: {data.get('status')}")
-                else:
-                    search_log.append(f"  ❌ Details HTTP error: {resp.status}")
-                    
+            data = await fetch_json_async(GOOGLE_PLACE_DETAILS_URL, params=params, timeout=DETAILS_TIMEOUT_SECONDS)
+            if data.get('status') != 'OK':
+                search_log.append(f"  ❌ Details API error: {data.get('status')}")
+                return {}
+            
+            result = data.get('result', {})
+            save_cached_details(place_id, result)
+        
+        # Extract photos
+        photos = []
+        if 'photos' in result:
+            for photo in result['photos'][:3]:  # Limit to 3 photos
+                photo_url = get_photo_url(photo['photo_reference'], maxwidth=400)
+                photos.append({
+                    'url': photo_url,
+                    'width': photo.get('width', 400),
+                    'height': photo.get('height', 300)
+                })
+        
+        # Extract reviews
+        reviews = []
+        if 'reviews' in result:
+            for review in result['reviews'][:3]:  # Limit to 3 reviews
+                reviews.append({
+                    'author_name': review.get('author_name', 'Anonymous'),
+                    'rating': review.get('rating', 0),
+                    'text': review.get('text', '')[:200] + '...' if len(review.get('text', '')) > 200 else review.get('text', ''),
+                    'time': review.get('time', 0)
+                })
+        
+        return {
+            'photos': photos,
+            'formatted_phone_number': result.get('formatted_phone_number'),
+            'website': result.get('website'),
+            'opening_hours': result.get('opening_hours', {}).get('weekday_text', []),
+            'reviews': reviews,
+            'price_level': result.get('price_level'),
+            'rating': result.get('rating'),
+            'user_ratings_total': result.get('user_ratings_total')
+        }
+        
     except Exception as e:
         search_log.append(f"  ❌ Exception getting details for {place_id}: {str(e)}")
     
     return {}
 
-async def search_google_places(location, filters):
+async def enrich_with_details(results, search_log):
+    """Fetch place details for results concurrently, keeping their ranking order.
+
+    At most DETAILS_CONCURRENCY requests are in flight and each one is bounded
+    by DETAILS_TIMEOUT_SECONDS, so a slow or failing place only loses its own
+    details instead of holding up the rest of the page.
+    """
+    semaphore = asyncio.Semaphore(DETAILS_CONCURRENCY)
+    
+    async def enrich(result):
+        if not result.get('id'):
+            return result
+        async with semaphore:
+            try:
+                details = await asyncio.wait_for(
+                    get_place_details(result['id'], search_log),
+                    timeout=DETAILS_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                search_log.append(f"  ⏱️ Details timed out for {result['id']}")
+                details = {}
+        if details:
+            result.update(details)
+        return result
+    
+    return list(await asyncio.gather(*(enrich(result) for result in results)))
+
+def refresh_google_places(location, filters):
+    """Re-run a search in a background thread, bypassing the cache"""
+    async def refresh():
+        try:
+            await search_google_places(location, filters, use_cache=False)
+        finally:
+            await close_async_session()
+    
+    asyncio.run(refresh())
+
+async def search_google_places(location, filters, use_cache=True):
     # Check if API key is available
     if not GOOGLE_API_KEY or GOOGLE_API_KEY == 'your_google_places_api_key_here':
         print("No Google Places API key found, using mock data")
         return get_mock_restaurants(location, filters), []
     
-    # Initialize cache
-    ensure_cache_dir()
-    
     # Check if we should use cached results
-    if should_use_cached_results(filters):
+    if use_cache and should_use_cached_results(filters):
         cache_key = get_cache_key(location, filters, 'comprehensive')
-        cache_file = get_cache_file(cache_key)
-        
-        if is_cache_valid(cache_file):
-            cached_results = load_from_cache(cache_file)
-            if cached_results:
-                print(f"Using cached results: {len(cached_results)} restaurants")
-                return cached_results, ["📋 Using cached results (24h cache)"]
+        cached_results, stale = load_cached_or_stale(cache_key)
+        if cached_results:
+            print(f"Using cached results: {len(cached_results)} restaurants")
+            if stale:
+                # Serve the expired results now and refresh them in the background
+                refresher.schedule(cache_key, lambda: refresh_google_places(location, filters))
+                return [dict(r) for r in cached_results], ["📋 Using cached results (refreshing in background)"]
+            return [dict(r) for r in cached_results], ["📋 Using cached results (24h cache)"]
     
     search_log = []
-    all_results = []
-    seen_place_ids = set()
-    
-    # Create SSL context to handle certificate issues
-    ssl_context = ssl.create_default_context()
-    ssl_context.check_hostname = False
-    ssl_context.verify_mode = ssl.CERT_NONE
-    connector = aiohttp.TCPConnector(ssl=ssl_context)
+    merger = PlaceMerger()
+    upstream_calls = 0
+    queries = []
     
     # Cost optimization: Determine search strategy based on filters
     search_strategy = determine_search_strategy(filters)
     search_log.append(f"💰 Using search strategy: {search_strategy['name']}")
     
-    async with aiohttp.ClientSession(connector=connector) as session:
-        # Strategy 1: Smart radius searches based on user's requested radius
-        user_radius = filters.get('radius', 2000)
-        radius_values = get_optimized_radius_values(user_radius)
+    # Strategy 1: Smart radius searches based on user's requested radius
+    user_radius = filters.get('radius', 2000)
+    radius_values = get_optimized_radius_values(user_radius)
+    
+    for radius in radius_values:
+        basic_params = {
+            'key': GOOGLE_API_KEY,
+            'location': f"{location['lat']},{location['lng']}",
+            'radius': radius,
+            'type': 'restaurant',
+        }
         
-        for radius in radius_values:
-            basic_params = {
-                'key': GOOGLE_API_KEY,
-                'location': f"{location['lat']},{location['lng']}",
-                'radius': radius,
-                'type': 'restaurant',
-            }
-            
-            if filters.get('open_now'):
-                basic_params['opennow'] = 'true'
-            
-            search_log.append(f"🔍 Radius search: {radius}m")
-            basic_results = await perform_search_with_pagination(session, GOOGLE_PLACES_URL, basic_params, search_log)
-            
-            # Add only new results
-            new_results = [r for r in basic_results if r['id'] not in seen_place_ids]
-            all_results.extend(new_results)
-            seen_place_ids.update(r['id'] for r in new_results if r['id'])
+        if filters.get('open_now'):
+            basic_params['opennow'] = 'true'
         
-        # Strategy 2: Cuisine-specific searches (only if cuisine is specified)
-        if 'cuisine' in filters and filters['cuisine'] and len(filters['cuisine'].strip()) > 2:
-            cuisine = filters['cuisine'].strip()
-            keywords = get_cuisine_keywords(cuisine)
-            
-            search_log.append(f"🍽️ Cuisine search for '{cuisine}' with keywords: {', '.join(keywords[:3])}")
-            
-            for keyword in keywords[:3]:  # Limit to 3 keywords to reduce costs
-                if keyword.lower() != cuisine.lower():
-                    for radius in [2000, 5000]:  # Reduced radius values
-                        keyword_params = {
-                            'key': GOOGLE_API_KEY,
-                            'location': f"{location['lat']},{location['lng']}",
-                            'radius': radius,
-                            'type': 'restaurant',
-                            'keyword': keyword
-                        }
-                        
-                        if filters.get('open_now'):
-                            keyword_params['opennow'] = 'true'
-                        
-                        search_log.append(f"  🔎 Keyword search: '{keyword}' (radius: {radius}m)")
-                        keyword_results = await perform_search_with_pagination(session, GOOGLE_PLACES_URL, keyword_params, search_log)
-                        
-                        # Add only new results
-                        new_results = [r for r in keyword_results if r['id'] not in seen_place_ids]
-                        all_results.extend(new_results)
-                        seen_place_ids.update(r['id'] for r in new_results if r['id'])
+        queries.append((f"🔍 Radius search: {radius}m", GOOGLE_PLACES_URL, basic_params))
+    
+    # Strategy 2: Cuisine-specific searches (only if cuisine is specified)
+    if 'cuisine' in filters and filters['cuisine'] and len(filters['cuisine'].strip()) > 2:
+        cuisine = filters['cuisine'].strip()
+        keywords = get_cuisine_keywords(cuisine)
+        
+        search_log.append(f"🍽️ Cuisine search for '{cuisine}' with keywords: {', '.join(keywords[:3])}")
         
-        # Strategy 3: Fallback searches (only for larger radius searches)
-        if user_radius >= 3000:
-            fallback_keywords = ['seafood', 'chinese', 'japanese', 'italian', 'mexican', 'thai', 'indian', 'american', 'pizza', 'burger']
-            for keyword in fallback_keywords:
-                for radius in [5000]:  # Single radius to reduce costs
-                    fallback_params = {
+        for keyword in keywords[:3]:  # Limit to 3 keywords to reduce costs
+            if keyword.lower() != cuisine.lower():
+                for radius in [2000, 5000]:  # Reduced radius values
+                    keyword_params = {
                         'key': GOOGLE_API_KEY,
-                        'query': f"{keyword} restaurant",
-                        'type': 'restaurant',
                         'location': f"{location['lat']},{location['lng']}",
-                        'radius': radius
+                        'radius': radius,
+                        'type': 'restaurant',
+                        'keyword': keyword
                     }
                     
-                    search_log.append(f"🎯 Fallback search: '{keyword}' (radius: {radius}m)")
-                    fallback_results = await perform_search_with_pagination(session, GOOGLE_TEXT_SEARCH_URL, fallback_params, search_log)
+                    if filters.get('open_now'):
+                        keyword_params['opennow'] = 'true'
                     
-                    # Add only new results
-                    new_results = [r for r in fallback_results if r['id'] not in seen_place_ids]
-                    all_results.extend(new_results)
-                    seen_place_ids.update(r['id'] for r in new_results if r['id'])
-    
-    # Remove duplicates and process results
-    unique_results = []
-    seen_names = set()
-    
-    for result in all_results:
-        if result['name'] not in seen_names:
-            unique_results.append(result)
-            seen_names.add(result['name'])
+                    queries.append((f"  🔎 Keyword search: '{keyword}' (radius: {radius}m)", GOOGLE_PLACES_URL, keyword_params))
+    
+    # Strategy 3: Fallback searches (only for larger radius searches)
+    if user_radius >= 3000:
+        fallback_keywords = ['seafood', 'chinese', 'japanese', 'italian', 'mexican', 'thai', 'indian', 'american', 'pizza', 'burger']
+        for keyword in fallback_keywords:
+            for radius in [5000]:  # Single radius to reduce costs
+                fallback_params = {
+                    'key': GOOGLE_API_KEY,
+                    'query': f"{keyword} restaurant",
+                    'type': 'restaurant',
+                    'location': f"{location['lat']},{location['lng']}",
+                    'radius': radius
+                }
+                
+                queries.append((f"🎯 Fallback search: '{keyword}' (radius: {radius}m)", GOOGLE_TEXT_SEARCH_URL, fallback_params))
+    
+    # Every query runs at once; a paginated query parks on its page token while
+    # the others keep going, so wall time tracks the longest chain, not the sum.
+    # Logs and results are merged back in query order
+    query_logs = [[line] for line, _, _ in queries]
+    pages = await asyncio.gather(*(perform_search_with_pagination(url, params, log)
+                                   for (_, url, params), log in zip(queries, query_logs)))
+    for log, (results, _) in zip(query_logs, pages):
+        search_log.extend(log)
+        merger.extend(results)
+    upstream_calls += len(queries)
+    
+    # Branches of a chain share a name but not a place id, so only ids are deduplicated
+    unique_results = merger.results
     
     # Get additional details for top results (limit to first 10 to save API calls)
     search_log.append("📸 Fetching additional details for top results...")
-    detailed_results = []
-    
-    for i, result in enumerate(unique_results[:10]):
-        if result.get('id'):
-            details = await get_place_details(session, result['id'], search_log)
-            if details:
-                result.update(details)
-            detailed_results.append(result)
-        else:
-            detailed_results.append(result)
+    detailed_results = await enrich_with_details(unique_results[:10], search_log)
+    upstream_calls += len(detailed_results)
     
     # Add remaining results without details
     detailed_results.extend(unique_results[10:])
@@ -519,11 +473,15 @@ async def search_google_places(location, filters):
     search_log.append(f"✅ Total unique results found: {len(detailed_results)}")
     print(f"Processed {len(detailed_results)} Google Places results")
     
-    # Cache the results if appropriate
-    if should_use_cached_results(filters):
-        cache_key = get_cache_key(location, filters, 'comprehensive')
-        cache_file = get_cache_file(cache_key)
-        save_to_cache(cache_file, detailed_results)
+    # Cache the results if appropriate. A set missing queries that failed or
+    # were throttled is not stored, so a background refresh during an outage
+    # leaves the stale entry to age out through the grace window
+    complete = bool(queries) and all(answered for _, answered in pages)
+    if not complete:
+        search_log.append("⚠️ Some searches got no answer; results not cached")
+    elif should_use_cached_results(filters):
+        save_cached(get_cache_key(location, filters, 'comprehensive'), [dict(r) for r in detailed_results],
+                    CACHE_DURATION_HOURS * 3600, cost=upstream_calls)
         search_log.append("💾 Results cached for 24 hours")
     
     return detailed_results, search_log
@@ -554,156 +512,68 @@ def get_optimized_radius_values(user_radius):
         return [2000, 5000, user_radius]  # Three searches for large radius
 
 def cleanup_expired_cache():
-    """Remove expired cache files to save disk space"""
-    if not os.path.exists(CACHE_DIR):
-        return
-    
-    current_time = datetime.now()
-    expired_count = 0
-    
-    for filename in os.listdir(CACHE_DIR):
-        if filename.endswith('.json'):
-            file_path = os.path.join(CACHE_DIR, filename)
-            file_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-            
-            if current_time - file_time > timedelta(hours=CACHE_DURATION_HOURS):
-                try:
-                    os.remove(file_path)
-                    expired_count += 1
-                except:
-                    pass
+    """Remove expired cache entries to save disk space"""
+    # Keep entries that are still inside the stale-while-revalidate window
+    expired_count = get_cache_backend().cleanup_expired(grace_seconds=CACHE_STALE_GRACE_HOURS * 3600)
     
     if expired_count > 0:
-        print(f"Cleaned up {expired_count} expired cache files")
+        print(f"Cleaned up {expired_count} expired cache entries")
 
 def get_cache_stats():
     """Get cache statistics"""
-    if not os.path.exists(CACHE_DIR):
-        return {'total_files': 0, 'total_size_mb': 0}
-    
-    total_files = 0
-    total_size = 0
-    
-    for filename in os.listdir(CACHE_DIR):
-        if filename.endswith('.json'):
-            file_path = os.path.join(CACHE_DIR, filename)
-            total_files += 1
-            total_size += os.path.getsize(file_path)
-    
-    return {
-        'total_files': total_files,
-        'total_size_mb': round(total_size / (1024 * 1024), 2)
-    }
+    return get_cache_backend().stats()
+
+async def perform_search_with_pagination(url, params, search_log):
+    """Perform a search with pagination to get more results.
 
-async def perform_search_with_pagination(session, url, params, search_log):
-    """Perform a search with pagination to get more results"""
+    Follow-up pages go through the page token scheduler, which parks a fresh
+    token without blocking the event loop, so concurrent searches overlap
+    their waits instead of adding them up. Returns (results, answered),
+    where answered says whether the first page got OK or ZERO_RESULTS.
+    """
     all_results = []
+    answered = False
     next_page_token = None
+    issued_at = None
     max_pages = 2  # Reduced from 3 to 2 to save costs
+    origin_lat, origin_lng = parse_location(params['location'])
+    
+    async def get_page(page_token=None):
+        page_params = dict(params, pagetoken=page_token) if page_token else params
+        return await fetch_json_async(url, params=page_params)
     
     for page in range(max_pages):
-        if next_page_token:
-            params['pagetoken'] = next_page_token
-            # Google requires a short delay between pagination requests
-            import asyncio
-            await asyncio.sleep(2)
-        
         try:
-            async with session.get(url, params=params) as resp:
-                data = await resp.json()
-                status = data.get('status')
-                results_count = len(data.get('results', []))
-                
-                search_log.append(f"  📊 Page {page + 1}: Status: {status}, Results: {results_count}")
-                
-                if status not in ['OK', 'ZERO_RESULTS']:
-                    search_log.append(f"  ❌ Error: {data}")
-                    break
-                
-                if results_count == 0:
-                    break
-                
-                results = []
-                for place in data.get('results', []):
-                    from filters import haversine
-                    distance = haversine(
-                        float(params['location'].split(',')[0]), 
-                        float(params['location'].split(',')[1]),
-                        place['geometry']['location']['lat'],
-                        place['geometry']['location']['lng']
-                    )
-                    
-                    # Process photos to add URLs
-                    photos = []
-                    if 'photos' in place and place['photos']:
-                        for photo in place['photos'][:3]:  # Limit to 3 photos
-                            photo_url = f"https://maps.googleapis.com/maps/api/place/photo?key={GOOGLE_API_KEY}&photoreference={photo['photo_reference']}&maxwidth=400"
-                            photos.append({
-                                'url': photo_url,
-                                'width': photo.get('width'),
-                                'height': photo.get('height')
-                            })
-                    
-                    # Don't filter by distance here - let the main filtering handle it
-                    # Google Places API already respects the radius parameter
-                    results.append({
-                        'source': 'google',
-                        'id': place.get('place_id'),
-                        'name': place.get('name'),
-                        'address': place.get('vicinity'),
-                        'rating': place.get('rating', 0),
-                        'user_ratings_total': place.get('user_ratings_total', 0),
-                        'distance': distance,
-                        'price_level': place.get('price_level', 0),
-                        'open_now': place.get('opening_hours', {}).get('open_now') if place.get('opening_hours') else None,
-                        'photos': photos,
-                        'types': place.get('types', []),
-                        'lat': place['geometry']['location']['lat'],
-                        'lng': place['geometry']['location']['lng'],
-                    })
-                
-                all_results.extend(results)
-                
-                # Check for next page token
-                next_page_token = data.get('next_page_token')
-                if not next_page_token:
-                    break
-                    
-        except Exception as e:
-            search_log.append(f"  ❌ Exception on page {page + 1}: {str(e)}")
-            break
-    
-    return all_results
-
-async def perform_search(session, url, params, search_log):
-    """Perform a single search and return results"""
-    try:
-        async with session.get(url, params=params) as resp:
-            data = await resp.json()
+            if next_page_token:
+                data = await page_tokens.fetch(get_page, next_page_token, issued_at)
+            else:
+                data = await get_page()
+            
+            issued_at = time.monotonic()
             status = data.get('status')
             results_count = len(data.get('results', []))
             
-            search_log.append(f"  📊 Status: {status}, Results: {results_count}")
+            search_log.append(f"  📊 Page {page + 1}: Status: {status}, Results: {results_count}")
             
             if status not in ['OK', 'ZERO_RESULTS']:
                 search_log.append(f"  ❌ Error: {data}")
-                return []
+                break
+            answered = True
+            
+            if results_count == 0:
+                break
             
             results = []
-            for place in data.get('results', []):
-                from filters import haversine
-                distance = haversine(
-                    float(params['location'].split(',')[0]), 
-                    float(params['location'].split(',')[1]),
-                    place['geometry']['location']['lat'],
-                    place['geometry']['location']['lng']
-                )
+            places = data.get('results', [])
+            distances = geometry_distances(origin_lat, origin_lng, places)
+            for place, distance in zip(places, distances):
+                distance = float(distance)
                 
                 # Process photos to add URLs
                 photos = []
                 if 'photos' in place and place['photos']:
                     for photo in place['photos'][:3]:  # Limit to 3 photos
-                        photo_url = f"https://maps.googleapis.com/maps/api/place/photo?key={GOOGLE_API_KEY}&photoreference={photo['photo_reference']}&maxwidth=400"
+                        photo_url = get_photo_url(photo['photo_reference'], maxwidth=400)
                         photos.append({
                             'url': photo_url,
                             'width': photo.get('width'),
@@ -712,7 +582,7 @@ async def perform_search(session, url, params, search_log):
                 
                 # Don't filter by distance here - let the main filtering handle it
                 # Google Places API already respects the radius parameter
-                results.append({
+                results.append(tag_place({
                     'source': 'google',
                     'id': place.get('place_id'),
                     'name': place.get('name'),
@@ -726,10 +596,72 @@ async def perform_search(session, url, params, search_log):
                     'types': place.get('types', []),
                     'lat': place['geometry']['location']['lat'],
                     'lng': place['geometry']['location']['lng'],
-                })
+                }))
             
-            return results
+            all_results.extend(results)
             
+            # Check for next page token
+            next_page_token = data.get('next_page_token')
+            if not next_page_token:
+                break
+                
+        except Exception as e:
+            search_log.append(f"  ❌ Exception on page {page + 1}: {str(e)}")
+            break
+    
+    return all_results, answered
+
+async def perform_search(url, params, search_log):
+    """Perform a single search and return results"""
+    origin_lat, origin_lng = parse_location(params['location'])
+    try:
+        data = await fetch_json_async(url, params=params)
+        status = data.get('status')
+        results_count = len(data.get('results', []))
+        
+        search_log.append(f"  📊 Status: {status}, Results: {results_count}")
+        
+        if status not in ['OK', 'ZERO_RESULTS']:
+            search_log.append(f"  ❌ Error: {data}")
+            return []
+        
+        results = []
+        places = data.get('results', [])
+        distances = geometry_distances(origin_lat, origin_lng, places)
+        for place, distance in zip(places, distances):
+            distance = float(distance)
+            
+            # Process photos to add URLs
+            photos = []
+            if 'photos' in place and place['photos']:
+                for photo in place['photos'][:3]:  # Limit to 3 photos
+                    photo_url = get_photo_url(photo['photo_reference'], maxwidth=400)
+                    photos.append({
+                        'url': photo_url,
+                        'width': photo.get('width'),
+                        'height': photo.get('height')
+                    })
+            
+            # Don't filter by distance here - let the main filtering handle it
+            # Google Places API already respects the radius parameter
+            results.append(tag_place({
+                'source': 'google',
+                'id': place.get('place_id'),
+                'name': place.get('name'),
+                'address': place.get('vicinity'),
+                'rating': place.get('rating', 0),
+                'user_ratings_total': place.get('user_ratings_total', 0),
+                'distance': distance,
+                'price_level': place.get('price_level', 0),
+                'open_now': place.get('opening_hours', {}).get('open_now') if place.get('opening_hours') else None,
+                'photos': photos,
+                'types': place.get('types', []),
+                'lat': place['geometry']['location']['lat'],
+                'lng': place['geometry']['location']['lng'],
+            }))
+        
+        return results
+        
     except Exception as e:
         search_log.append(f"  ❌ Exception: {str(e)}")
         return [] 
\ No newline at end of file
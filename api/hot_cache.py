@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import heapq
+import threading
+
+HOT_CACHE_MAX_MB = float(os.getenv('HOT_CACHE_MAX_MB', 32))
+
+class HotCache:
+    """Memory-bounded in-process cache with GreedyDual-Size-Frequency eviction.
+
+    Each entry gets priority L + frequency * cost / size, where cost is the
+    number of upstream calls it took to build and L is the priority of the
+    last evicted entry. Cheap, large or rarely used entries leave first, while
+    the rising L lets stale-but-once-popular entries eventually age out.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.inflation = 0.0
+        self.entries = {}
+        self.heap = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def _priority(self, entry):
+        return self.inflation + entry['frequency'] * entry['cost'] / entry['size']
+
+    def _push(self, key, entry):
+        entry['priority'] = self._priority(entry)
+        heapq.heappush(self.heap, (entry['priority'], key))
+
+        # Every hit leaves a stale heap entry behind; rebuild the heap from the
+        # live entries before the stale ones outgrow them
+        if len(self.heap) > 4 * len(self.entries) + 64:
+            self.heap = [(e['priority'], k) for k, e in self.entries.items()]
+            heapq.heapify(self.heap)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry['size']
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry['expires_at'] <= time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            entry['frequency'] += 1
+            self._push(key, entry)
+            self.hits += 1
+            return entry['value']
+
+    def put(self, key, value, expires_at, cost=1, size=None):
+        """Store value until the expires_at timestamp, evicting lower-priority entries"""
+        if size is None:
+            size = len(json.dumps(value))
+        size = max(1, size)
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            previous = self.entries.get(key)
+            self._remove(key)
+            entry = {
+                'value': value,
+                'size': size,
+                'cost': max(1, cost),
+                'frequency': previous['frequency'] if previous else 1,
+                'expires_at': expires_at
+            }
+            self.entries[key] = entry
+            self.total_bytes += size
+            self._push(key, entry)
+            self._evict()
+
+    def _evict(self):
+        # Heap entries whose priority no longer matches are stale and skipped
+        while self.total_bytes > self.max_bytes and self.heap:
+            priority, key = heapq.heappop(self.heap)
+            entry = self.entries.get(key)
+            if entry is None or entry['priority'] != priority:
+                continue
+            self.inflation = priority
+            self._remove(key)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.heap = []
+            self.total_bytes = 0
+            self.inflation = 0.0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'size_mb': round(self.total_bytes / (1024 * 1024), 2),
+                'max_size_mb': round(self.max_bytes / (1024 * 1024), 2),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0,
+                'evictions': self.evictions
+            }
+
+# Single process-wide tier shared by the search and details caches
+hot_cache = HotCache(int(HOT_CACHE_MAX_MB * 1024 * 1024))
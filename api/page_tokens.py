@@ -0,0 +1,97 @@
+import os
+import time
+import asyncio
+import threading
+
+# A next_page_token only becomes valid a moment after Google issues it; until
+# then the same request answers INVALID_REQUEST
+PAGE_TOKEN_INITIAL_DELAY = float(os.getenv('PAGE_TOKEN_INITIAL_DELAY', 1.5))
+PAGE_TOKEN_MIN_DELAY = 0.5
+PAGE_TOKEN_POLL_SECONDS = float(os.getenv('PAGE_TOKEN_POLL_SECONDS', 0.25))
+PAGE_TOKEN_MAX_WAIT = float(os.getenv('PAGE_TOKEN_MAX_WAIT', 8))
+
+# Weight of the newest observation in the learned maturation delay
+PAGE_TOKEN_SMOOTHING = 0.2
+
+# Every premature poll costs a quota token, so the delay is only shortened
+# after this many tokens in a row were ready on the first try
+PAGE_TOKEN_SHRINK_AFTER = int(os.getenv('PAGE_TOKEN_SHRINK_AFTER', 10))
+
+class PageTokenScheduler:
+    """Fetch follow-up pages once their page token has matured.
+
+    A pending token is parked with asyncio.sleep until the learned delay
+    since it was issued has passed, so other queries keep running on the loop
+    meanwhile. If Google still answers INVALID_REQUEST the token is polled
+    again with a growing interval, up to PAGE_TOKEN_MAX_WAIT. The delay that
+    tokens actually needed feeds back into the next first attempt; it is
+    only shortened after a run of first-try successes, and never below the
+    latest age at which a token was still found invalid.
+    """
+
+    def __init__(self, initial_delay=PAGE_TOKEN_INITIAL_DELAY):
+        self.lock = threading.Lock()
+        self.ready_after = initial_delay
+        self.floor = PAGE_TOKEN_MIN_DELAY
+        self.streak = 0
+        self.fetched = 0
+        self.retries = 0
+        self.expired = 0
+
+    def _observe(self, waited, invalid_at):
+        """Record a fetched token; invalid_at is its age when last found invalid, or None"""
+        with self.lock:
+            self.fetched += 1
+            if invalid_at is not None:
+                # Back off towards what this token needed, and never probe
+                # earlier than the age at which it was still invalid
+                self.streak = 0
+                self.floor = max(PAGE_TOKEN_MIN_DELAY, invalid_at)
+                self.ready_after = max(self.floor, self.ready_after + PAGE_TOKEN_SMOOTHING * (waited - self.ready_after))
+                return
+            self.streak += 1
+            if self.streak >= PAGE_TOKEN_SHRINK_AFTER:
+                # Reliably ready on the first try: probe slightly earlier next time
+                self.streak = 0
+                self.ready_after = max(self.floor, self.ready_after * (1 - PAGE_TOKEN_SMOOTHING / 4))
+
+    async def fetch(self, get_page, token, issued_at):
+        """Return the decoded page for token, or the last response if it never matured.
+
+        get_page(token) performs the request and returns the decoded JSON.
+        issued_at is the time.monotonic() at which the token was received.
+        """
+        delay = issued_at + self.ready_after - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        interval = PAGE_TOKEN_POLL_SECONDS
+        invalid_at = None
+        while True:
+            started = time.monotonic() - issued_at
+            data = await get_page(token)
+            waited = time.monotonic() - issued_at
+            if data.get('status') != 'INVALID_REQUEST':
+                self._observe(waited, invalid_at)
+                return data
+            if waited + interval > PAGE_TOKEN_MAX_WAIT:
+                with self.lock:
+                    self.expired += 1
+                return data
+            with self.lock:
+                self.retries += 1
+            invalid_at = started
+            await asyncio.sleep(interval)
+            interval *= 1.5
+
+    def stats(self):
+        with self.lock:
+            return {
+                'ready_after_seconds': round(self.ready_after, 2),
+                'floor_seconds': round(self.floor, 2),
+                'fetched': self.fetched,
+                'retries': self.retries,
+                'expired': self.expired
+            }
+
+page_tokens = PageTokenScheduler()
@@ -0,0 +1,176 @@
+import os
+import hashlib
+import tempfile
+import threading
+from api.client import GOOGLE_MAPS_BASE_URL, fetch_bytes
+from api.cache import CACHE_DIR, load_cached, save_cached
+from singleflight import SingleFlight
+
+GOOGLE_PLACE_PHOTO_URL = f'{GOOGLE_MAPS_BASE_URL}/place/photo'
+
+# Photo bytes live on disk named by their SHA-256, so identical images share
+# one file and the digest doubles as a strong ETag
+PHOTO_CACHE_DIR = os.getenv('PHOTO_CACHE_DIR', os.path.join(CACHE_DIR, 'photos'))
+PHOTO_CACHE_MAX_MB = float(os.getenv('PHOTO_CACHE_MAX_MB', 256))
+PHOTO_CACHE_TTL_DAYS = float(os.getenv('PHOTO_CACHE_TTL_DAYS', 30))
+
+# A proxied URL always maps to the same bytes, so browsers may keep them
+PHOTO_BROWSER_MAX_AGE = 365 * 86400
+
+# Google accepts 1-1600 pixels for either bound
+PHOTO_MAX_PIXELS = 1600
+
+class PhotoStore:
+    """Content-addressed photo blobs with a disk cap.
+
+    Files are sharded by the first two hex digits of their digest. A file's
+    mtime is bumped whenever it is served, and once the store grows past
+    max_bytes the least recently served files are removed until it is back
+    under 90% of the cap.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total_bytes = None
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _blob_files(self):
+        if not os.path.exists(self.directory):
+            return []
+        return [os.path.join(root, f) for root, _, files in os.walk(self.directory)
+                for f in files if not f.endswith('.tmp')]
+
+    def _get_total_bytes(self):
+        # Sized once from disk, then tracked as blobs are written and evicted
+        if self.total_bytes is None:
+            self.total_bytes = sum(os.path.getsize(path) for path in self._blob_files())
+        return self.total_bytes
+
+    def get(self, digest):
+        """Return the blob path for digest, marking it recently used, or None"""
+        path = self.path(digest)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, content):
+        """Store bytes and return their digest"""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            os.utime(path)
+            return digest
+
+        # Size the store before the new blob lands so it is not counted twice
+        with self.lock:
+            self._get_total_bytes()
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self.lock:
+            self.total_bytes = self._get_total_bytes() + len(content)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+        return digest
+
+    def _evict(self):
+        target = self.max_bytes * 0.9
+        entries = []
+        for path in self._blob_files():
+            try:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+            except FileNotFoundError:
+                pass
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                evicted += 1
+            except FileNotFoundError:
+                pass
+        self.total_bytes = total
+        print(f"🧹 Evicted {evicted} cached photos ({round(total / (1024 * 1024), 2)} MB kept)")
+
+    def clear(self):
+        cleared = 0
+        with self.lock:
+            for path in self._blob_files():
+                try:
+                    os.remove(path)
+                    cleared += 1
+                except FileNotFoundError:
+                    pass
+            self.total_bytes = 0
+        return cleared
+
+    def stats(self):
+        with self.lock:
+            total_bytes = self._get_total_bytes()
+        return {
+            'total_size_mb': round(total_bytes / (1024 * 1024), 2),
+            'max_size_mb': round(self.max_bytes / (1024 * 1024), 2)
+        }
+
+photo_store = PhotoStore(PHOTO_CACHE_DIR, PHOTO_CACHE_MAX_MB * 1024 * 1024)
+photo_flight = SingleFlight()
+
+def clamp_photo_size(value):
+    """Parse a maxwidth/maxheight argument into Google's accepted range, or None"""
+    try:
+        return max(1, min(int(value), PHOTO_MAX_PIXELS))
+    except (TypeError, ValueError):
+        return None
+
+def get_photo_url(photo_reference, maxwidth=400, maxheight=None):
+    """Local proxy URL for a Google photo; keeps the API key off the page"""
+    url = f"/photo/{photo_reference}?maxwidth={maxwidth}"
+    return f"{url}&maxheight={maxheight}" if maxheight else url
+
+def get_photo(photo_reference, api_key, maxwidth=None, maxheight=None):
+    """Return (path, digest, content_type) for one size of a photo.
+
+    Each size is fetched from Google once; the reference-to-digest index is
+    kept in the cache backend and the bytes in the photo store. Concurrent
+    requests for the same size share one upstream fetch.
+    """
+    key = f"photo:{hashlib.md5(photo_reference.encode()).hexdigest()}:{maxwidth or ''}x{maxheight or ''}"
+    entry = load_cached(key)
+    if entry:
+        path = photo_store.get(entry['digest'])
+        if path:
+            return path, entry['digest'], entry['content_type']
+
+    def fetch():
+        params = {'key': api_key, 'photoreference': photo_reference}
+        if maxwidth:
+            params['maxwidth'] = maxwidth
+        if maxheight:
+            params['maxheight'] = maxheight
+        content, content_type = fetch_bytes(GOOGLE_PLACE_PHOTO_URL, params=params)
+        digest = photo_store.put(content)
+        save_cached(key, {'digest': digest, 'content_type': content_type}, PHOTO_CACHE_TTL_DAYS * 86400)
+        return digest, content_type
+
+    (digest, content_type), _ = photo_flight.do(key, fetch)
+    return photo_store.path(digest), digest, content_type
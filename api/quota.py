@@ -0,0 +1,240 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Priority classes for upstream calls. Requests made while a user waits are
+# interactive; cache refreshes and prefetches run as background work
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+# Default requests per second and burst size per endpoint class; each can be
+# overridden with QUOTA_<CLASS>_QPS and QUOTA_<CLASS>_BURST. Text search is
+# billed higher than nearby search, so it gets the smaller budget
+QUOTA_DEFAULTS = {
+    'nearby': (10, 20),
+    'text': (5, 10),
+    'details': (10, 20),
+    'geocode': (10, 20),
+    'photo': (20, 40),
+}
+
+# URL fragments that identify each endpoint class
+ENDPOINT_PATHS = (
+    ('nearbysearch', 'nearby'),
+    ('textsearch', 'text'),
+    ('place/details', 'details'),
+    ('place/photo', 'photo'),
+    ('geocode', 'geocode'),
+)
+
+# Background calls never dip into the share of each bucket kept for
+# interactive calls, and never wait for tokens
+QUOTA_BACKGROUND_RESERVE = float(os.getenv('QUOTA_BACKGROUND_RESERVE', 0.5))
+
+# How long an interactive call may wait for a token before giving up
+QUOTA_MAX_WAIT_SECONDS = float(os.getenv('QUOTA_MAX_WAIT_SECONDS', 2))
+
+# After OVER_QUERY_LIMIT an endpoint class is paused, doubling per repeat
+QUOTA_BACKOFF_SECONDS = float(os.getenv('QUOTA_BACKOFF_SECONDS', 2))
+QUOTA_BACKOFF_MAX_SECONDS = float(os.getenv('QUOTA_BACKOFF_MAX_SECONDS', 60))
+
+_priority = contextvars.ContextVar('upstream_priority', default=INTERACTIVE)
+
+class QuotaExceeded(Exception):
+    """Raised when no upstream token could be had in time"""
+
+    def __init__(self, endpoint, priority):
+        super().__init__(f"Upstream quota exhausted for {endpoint} ({priority})")
+        self.endpoint = endpoint
+        self.priority = priority
+
+def get_priority():
+    return _priority.get()
+
+@contextmanager
+def upstream_priority(priority):
+    """Run the enclosed upstream calls at the given priority class.
+
+    The priority lives in a context variable, so it follows the work into
+    asyncio tasks and into fan_out worker threads.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def get_endpoint(url):
+    """Endpoint class for a Google URL, or None for anything else"""
+    for fragment, endpoint in ENDPOINT_PATHS:
+        if fragment in url:
+            return endpoint
+    return None
+
+class TokenBucket:
+    """Token bucket refilled at rate tokens per second up to burst"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.backoffs = 0
+
+    def _refill(self, now):
+        # A paused bucket starts refilling only once the pause is over
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def take(self, floor=0.0):
+        """Take a token if more than floor are left; else return seconds to wait"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens - 1 >= floor:
+            self.tokens -= 1
+            return 0.0
+        return (floor + 1 - self.tokens) / self.rate
+
+    def available(self, within=0.0):
+        """Tokens on hand plus those refilled within the next `within` seconds"""
+        now = time.monotonic()
+        if now + within <= self.paused_until:
+            return 0
+        self._refill(now)
+        return int(self.tokens + max(0.0, now + within - max(now, self.paused_until)) * self.rate)
+
+    def pause(self):
+        self.backoffs += 1
+        delay = min(QUOTA_BACKOFF_SECONDS * 2 ** (self.backoffs - 1), QUOTA_BACKOFF_MAX_SECONDS)
+        self.paused_until = time.monotonic() + delay
+        self.updated = self.paused_until
+        self.tokens = 0.0
+        return delay
+
+class QuotaManager:
+    """Process-wide rate limiter for upstream Google calls.
+
+    Every endpoint class has its own token bucket. Interactive calls wait up
+    to QUOTA_MAX_WAIT_SECONDS for a token; background calls only run while
+    the bucket holds more than its interactive reserve and fail at once
+    otherwise, so refreshes cannot starve users. OVER_QUERY_LIMIT pauses the
+    endpoint class with exponential backoff.
+    """
+
+    def __init__(self, limits=None):
+        limits = limits or {
+            name: (float(os.getenv(f"QUOTA_{name.upper()}_QPS", qps)),
+                   float(os.getenv(f"QUOTA_{name.upper()}_BURST", burst)))
+            for name, (qps, burst) in QUOTA_DEFAULTS.items()
+        }
+        self.lock = threading.Lock()
+        self.buckets = {name: TokenBucket(qps, burst) for name, (qps, burst) in limits.items()}
+        self.rejected = {name: 0 for name in self.buckets}
+        self.over_limit = {name: 0 for name in self.buckets}
+
+    def _take(self, endpoint, priority):
+        bucket = self.buckets[endpoint]
+        floor = bucket.burst * QUOTA_BACKGROUND_RESERVE if priority == BACKGROUND else 0.0
+        with self.lock:
+            return bucket.take(floor)
+
+    def _reject(self, endpoint, priority):
+        with self.lock:
+            self.rejected[endpoint] += 1
+        raise QuotaExceeded(endpoint, priority)
+
+    def acquire(self, endpoint, max_wait=QUOTA_MAX_WAIT_SECONDS):
+        """Block until a token for endpoint is taken, or raise QuotaExceeded"""
+        if endpoint not in self.buckets:
+            return
+        priority = get_priority()
+        deadline = time.monotonic() + (max_wait if priority == INTERACTIVE else 0)
+        while True:
+            wait = self._take(endpoint, priority)
+            if wait == 0:
+                return
+            if time.monotonic() + wait > deadline:
+                self._reject(endpoint, priority)
+            time.sleep(wait)
+
+    async def acquire_async(self, endpoint, max_wait=QUOTA_MAX_WAIT_SECONDS):
+        """acquire() for coroutines; waits without blocking the event loop"""
+        if endpoint not in self.buckets:
+            return
+        priority = get_priority()
+        deadline = time.monotonic() + (max_wait if priority == INTERACTIVE else 0)
+        while True:
+            wait = self._take(endpoint, priority)
+            if wait == 0:
+                return
+            if time.monotonic() + wait > deadline:
+                self._reject(endpoint, priority)
+            await asyncio.sleep(wait)
+
+    def try_acquire(self, endpoint):
+        """Take a spare token for optional work (hedges) without waiting; return whether one was taken"""
+        if endpoint not in self.buckets:
+            return True
+        return self._take(endpoint, BACKGROUND) == 0
+
+    def report(self, endpoint, status):
+        """Feed back an upstream status; OVER_QUERY_LIMIT pauses the endpoint class"""
+        if endpoint not in self.buckets:
+            return
+        with self.lock:
+            bucket = self.buckets[endpoint]
+            if status == 'OVER_QUERY_LIMIT':
+                self.over_limit[endpoint] += 1
+                delay = bucket.pause()
+                print(f"🚦 {endpoint} over query limit, pausing for {delay:g}s")
+            elif status in ('OK', 'ZERO_RESULTS'):
+                bucket.backoffs = 0
+
+    def available(self, endpoint):
+        """Calls an interactive request could make on endpoint within its wait allowance"""
+        if endpoint not in self.buckets:
+            return float('inf')
+        with self.lock:
+            return self.buckets[endpoint].available(QUOTA_MAX_WAIT_SECONDS)
+
+    def stats(self):
+        with self.lock:
+            now = time.monotonic()
+            return {
+                name: {
+                    'available': bucket.available(),
+                    'rate': bucket.rate,
+                    'burst': bucket.burst,
+                    'paused_for': round(max(0.0, bucket.paused_until - now), 1),
+                    'rejected': self.rejected[name],
+                    'over_query_limit': self.over_limit[name]
+                }
+                for name, bucket in self.buckets.items()
+            }
+
+upstream_quota = QuotaManager()
+
+def fit_to_budget(queries, always=()):
+    """Trim a query plan to the calls the current budget covers.
+
+    Queries whose strategy is in always are kept; the rest are kept in order
+    while their endpoint class still has tokens, so when text search runs low
+    the cheaper nearby queries still go out. Returns the trimmed plan.
+    """
+    budget = {}
+    kept = []
+    for query in queries:
+        endpoint = get_endpoint(query['url'])
+        if endpoint not in budget:
+            budget[endpoint] = upstream_quota.available(endpoint)
+        if query['strategy'] in always or budget[endpoint] > 0:
+            budget[endpoint] -= 1
+            kept.append(query)
+    return kept
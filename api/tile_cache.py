@@ -0,0 +1,104 @@
+import os
+import math
+from geo import distances_from, place_distances
+from api.cache import CACHE_STALE_GRACE_HOURS, load_cached_or_stale, save_many_cached
+
+# Raw candidate sets are cached per spatial tile rather than per request, so
+# changing local-only filters (rating, price, open now) or nudging the map a
+# little reuses what earlier searches already fetched
+TILE_CACHE_TTL_HOURS = float(os.getenv('TILE_CACHE_TTL_HOURS', 24))
+
+# Google ranks nearby results by prominence, so a 5km search is much sparser
+# per tile than a 1km one; tiles are only shared within the same radius class
+RADIUS_CLASSES = [500, 1000, 2000, 5000, 10000, 20000, 50000]
+TILES_PER_RADIUS = 3  # Tile edge is radius_class / TILES_PER_RADIUS
+
+METERS_PER_DEGREE = 111320
+
+def get_radius_class(radius):
+    """Round a search radius up to its radius class"""
+    for radius_class in RADIUS_CLASSES:
+        if radius <= radius_class:
+            return radius_class
+    return RADIUS_CLASSES[-1]
+
+def get_tile_step(radius_class):
+    """Tile edge length in degrees for a radius class"""
+    return radius_class / TILES_PER_RADIUS / METERS_PER_DEGREE
+
+def get_tile(lat, lng, step):
+    """Quantize a coordinate to its (row, col) tile index"""
+    return (math.floor(lat / step), math.floor(lng / step))
+
+def get_tiles_in_radius(lat, lng, radius, step):
+    """Return the tiles whose centers lie within radius metres of the point"""
+    reach_lat = radius / METERS_PER_DEGREE
+    reach_lng = reach_lat / max(math.cos(math.radians(lat)), 0.01)
+    row_min, col_min = get_tile(lat - reach_lat, lng - reach_lng, step)
+    row_max, col_max = get_tile(lat + reach_lat, lng + reach_lng, step)
+
+    grid = [(row, col) for row in range(row_min, row_max + 1) for col in range(col_min, col_max + 1)]
+    distances = distances_from(lat, lng, [(row + 0.5) * step for row, _ in grid],
+                               [(col + 0.5) * step for _, col in grid])
+    tiles = [tile for tile, distance in zip(grid, distances) if distance <= radius]
+
+    # A radius smaller than a tile still needs the tile it sits in
+    return tiles or [get_tile(lat, lng, step)]
+
+def get_tile_key(cuisine, radius_class, tile):
+    """Cache key for one tile of one radius class and cuisine search"""
+    return f"tile:{cuisine or ''}:{radius_class}:{tile[0]}:{tile[1]}"
+
+def get_tile_candidates(location, radius, cuisine=None, allow_stale=False):
+    """Compose the raw candidate set for a search area from cached tiles.
+
+    Returns (results, is_stale). results is None unless every tile inside the
+    search circle is covered by an earlier search of the same radius class, in
+    which case the union of their candidates is returned with distances
+    recomputed for this location. With allow_stale, recently expired tiles
+    count as covered and is_stale reports whether any were used.
+    """
+    lat, lng = float(location['lat']), float(location['lng'])
+    radius_class = get_radius_class(radius)
+    step = get_tile_step(radius_class)
+    grace_seconds = CACHE_STALE_GRACE_HOURS * 3600 if allow_stale else 0
+
+    candidates = {}
+    any_stale = False
+    for tile in get_tiles_in_radius(lat, lng, radius, step):
+        entry, stale = load_cached_or_stale(get_tile_key(cuisine, radius_class, tile), grace_seconds)
+        if entry is None:
+            return None, False
+        any_stale = any_stale or stale
+        for candidate in entry['candidates']:
+            candidates.setdefault(candidate['id'], candidate)
+
+    results = [dict(candidate) for candidate in candidates.values()]
+    for result, distance in zip(results, place_distances(lat, lng, results)):
+        result['distance'] = int(distance)
+
+    # Keep the upstream ranking, falling back to distance across searches
+    results.sort(key=lambda r: (r.get('rank', 0), r['distance']))
+    for result in results:
+        result.pop('rank', None)
+    return results, any_stale
+
+def store_tile_candidates(location, radius, results, cuisine=None, cost=1):
+    """Bucket a fresh candidate set into the tiles its search circle covers"""
+    lat, lng = float(location['lat']), float(location['lng'])
+    radius_class = get_radius_class(radius)
+    step = get_tile_step(radius_class)
+
+    buckets = {}
+    for rank, result in enumerate(results):
+        if not result.get('id') or result.get('lat') is None or result.get('lng') is None:
+            continue
+        candidate = dict(result, rank=rank)
+        candidate.pop('distance', None)
+        buckets.setdefault(get_tile(result['lat'], result['lng'], step), []).append(candidate)
+
+    # Only tiles inside the searched circle are trustworthy; text-search hits
+    # further out are dropped rather than cached as partial tiles
+    tiles = get_tiles_in_radius(lat, lng, radius, step)
+    save_many_cached([(get_tile_key(cuisine, radius_class, tile), {'candidates': buckets.get(tile, [])})
+                      for tile in tiles], TILE_CACHE_TTL_HOURS * 3600, cost)
@@ -1,17 +1,45 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, send_file
 import os
-from dotenv import load_dotenv
-import requests
 import json
-from datetime import datetime, timedelta
+import queue
+import threading
+from dotenv import load_dotenv
+from fanout import fan_out
+from filter_engine import filter_candidates
+from place_tags import TAG_KEYWORDS, tag_place
+from geo import geometry_distances, place_distances
+from place_merge import PlaceMerger
+from pagination import get_page_size, load_result_page, save_result_set
+from query_planner import (ANCHOR_STRATEGIES, PLANNER_STOP_WINDOW, PLANNER_STOP_YIELD, EarlyStop, get_query_id,
+                           get_region, plan_queries, yield_tracker)
+from singleflight import SingleFlight
+from deadline import Deadline, DeadlineExceeded, deadline_expired, mark_degraded, mark_partial, request_deadline
+from revalidate import refresher
+from api.client import GOOGLE_MAPS_BASE_URL, fetch_json
+from api.quota import BACKGROUND, QuotaExceeded, fit_to_budget, get_priority, upstream_quota
+from api.breaker import CircuitOpen, get_breaker_stats
+from api.page_tokens import page_tokens
+from api.hot_cache import hot_cache
+from api.cache import CACHE_STALE_GRACE_HOURS, get_cache_backend
+from api.tile_cache import get_tile_candidates, store_tile_candidates
+from api.details_cache import DETAILS_TIERS, fetch_details, get_cached_details
+from api.geocode_cache import (GEOCODE_COMPONENTS, GEOCODE_MAX_RESULTS, clear_geocode_memory, get_cached_geocode,
+                               get_cached_reverse_geocode, get_geocode_stats, save_geocode, save_reverse_geocode)
+from api.photo_cache import PHOTO_BROWSER_MAX_AGE, clamp_photo_size, get_photo, get_photo_url, photo_store
 
 load_dotenv()
 
 app = Flask(__name__)
 
-# Cache configuration
-CACHE_DIR = 'cache'
-CACHE_DURATION_HOURS = 24
+# Upstream concurrency configuration
+SEARCH_MAX_WORKERS = int(os.getenv('SEARCH_MAX_WORKERS', 6))
+DETAILS_MAX_WORKERS = int(os.getenv('DETAILS_MAX_WORKERS', 8))
+DETAILS_TIMEOUT_SECONDS = float(os.getenv('DETAILS_TIMEOUT_SECONDS', 5))
+
+# Coalesces concurrent identical searches across request threads
+search_flight = SingleFlight()
+
+RESULTS_EXPIRED_MESSAGE = 'These results have expired. Please search again.'
 
 # Manual restaurant database for restaurants not in Google Places
 MANUAL_RESTAURANTS = {
@@ -30,248 +58,408 @@ MANUAL_RESTAURANTS = {
     }
 }
 
-def ensure_cache_dir():
-    """Ensure cache directory exists"""
-    if not os.path.exists(CACHE_DIR):
-        os.makedirs(CACHE_DIR)
-
-def get_cache_key(location, filters):
-    """Generate a cache key for the search parameters"""
-    import hashlib
-    cache_data = {
-        'lat': round(location['lat'], 4),
-        'lng': round(location['lng'], 4),
-        'filters': filters
-    }
-    cache_string = json.dumps(cache_data, sort_keys=True)
-    return hashlib.md5(cache_string.encode()).hexdigest()
+def build_search_plan(google_api_key, location_str, radius, filters):
+    """Build the list of upstream queries that make up one restaurant search"""
+    nearby_url = f'{GOOGLE_MAPS_BASE_URL}/place/nearbysearch/json'
+    text_url = f'{GOOGLE_MAPS_BASE_URL}/place/textsearch/json'
+    plan = []
 
-def get_cache_file(cache_key):
-    """Get the cache file path for a given key"""
-    return os.path.join(CACHE_DIR, f"{cache_key}.json")
+    # Strategy 1: Search for restaurants and cafes only (simplified)
+    for food_type in ['restaurant', 'cafe']:
+        plan.append({
+            'strategy': 'type',
+            'label': food_type,
+            'url': nearby_url,
+            'params': {
+                'key': google_api_key,
+                'location': location_str,
+                'radius': radius,
+                'type': food_type
+            },
+            'log': f"✅ Found {{count}} {food_type} establishments"
+        })
 
-def is_cache_valid(cache_file):
-    """Check if cache file exists and is still valid"""
-    if not os.path.exists(cache_file):
-        return False
+    # Strategy 2: Multiple radius searches to catch more places
+    for multiplier in [1, 2]:  # Reduced to just 2 radii for speed
+        search_radius = radius * multiplier
+        if search_radius > 50000:  # Google's max radius
+            continue
+        plan.append({
+            'strategy': 'radius',
+            'label': f"{search_radius}m",
+            'yield_label': f"{multiplier}x",
+            'url': nearby_url,
+            'params': {
+                'key': google_api_key,
+                'location': location_str,
+                'radius': search_radius,
+                'type': 'restaurant'
+            },
+            'log': f"✅ Radius {search_radius}m found {{count}} additional results"
+        })
+
+    # Strategy 3: Text search for specific cuisines if filter is applied
+    if filters.get('cuisine'):
+        cuisine = filters['cuisine'].lower()
+        plan.append({
+            'strategy': 'cuisine',
+            'label': cuisine,
+            'url': text_url,
+            'params': {
+                'key': google_api_key,
+                'query': f"{cuisine} food near {location_str}",
+                'location': location_str,
+                'radius': radius
+            },
+            'log': "✅ Text search found {count} additional results"
+        })
+
+    # Strategy 4: General text searches for common food terms
+    food_search_terms = [
+        "restaurants near me",
+        "food places",
+        "dining",
+        "eat",
+        "cafe",
+        "restaurant"
+    ]
+
+    # Strategy 5: Search for popular restaurant chains and names
+    popular_chains = [
+        "McDonald's", "KFC", "Subway", "Pizza Hut", "Domino's", "Burger King",
+        "Starbucks", "Dunkin'", "Taco Bell", "Wendy's", "Popeyes", "Chick-fil-A"
+    ]
+
+    for strategy, terms in (('term', food_search_terms), ('chain', popular_chains)):
+        for term in terms:
+            plan.append({
+                'strategy': strategy,
+                'label': term,
+                'url': text_url,
+                'params': {
+                    'key': google_api_key,
+                    'query': f"{term} near {location_str}",
+                    'location': location_str,
+                    'radius': radius
+                },
+                'log': f"✅ '{term}' search found {{count}} additional results"
+            })
+
+    return plan
+
+def run_search_query(query):
+    """Execute a single planned upstream query and return the decoded JSON.
+
+    Anchor queries fill the first page of results, so they may be hedged.
+    """
+    print(f"🔍 {query['strategy'].capitalize()} search: {query['label']}")
+    return fetch_json(query['url'], params=query['params'], timeout=10,
+                      hedge=query['strategy'] in ANCHOR_STRATEGIES)
+
+def prepare_google_search(location, filters, google_api_key):
+    """Return (radius, cuisine, search_key, candidate plan) for a search request"""
+    radius = filters.get('radius', 2000)
+    lat = float(location['lat'])
+    lng = float(location['lng'])
+    location_str = f"{lat},{lng}"
+    plan = build_search_plan(google_api_key, location_str, radius, filters)
     
-    file_time = datetime.fromtimestamp(os.path.getmtime(cache_file))
-    return datetime.now() - file_time < timedelta(hours=CACHE_DURATION_HOURS)
+    # rating, price and open-now filters are applied later in restaurants(),
+    # so only the area and cuisine identify the upstream search
+    cuisine = (filters.get('cuisine') or '').lower().strip()
+    search_key = f"{round(lat, 4)},{round(lng, 4)}:{radius}:{cuisine}"
+    return radius, cuisine, search_key, plan
 
-def load_from_cache(cache_file):
-    """Load results from cache file"""
-    try:
-        with open(cache_file, 'r') as f:
-            return json.load(f)
-    except:
+def load_search_tiles(location, radius, cuisine, search_key, refresh):
+    """Answer from cached tiles when earlier searches already cover this area.
+
+    Returns (results, search_log), or None on a miss. Expired tiles are
+    served as they are while refresh() runs in the background; the refresh
+    only replaces them if its run completes (see GoogleSearchRun.finish).
+    """
+    cached_results, stale = get_tile_candidates(location, radius, cuisine, allow_stale=True)
+    if cached_results is None:
         return None
+    if stale:
+        refresher.schedule(f"search:{search_key}", refresh)
+        return cached_results, ['✅ Using cached results (refreshing in background)']
+    return cached_results, ['✅ Using cached results']
 
-def save_to_cache(cache_file, results):
-    """Save results to cache file"""
-    try:
-        with open(cache_file, 'w') as f:
-            json.dump(results, f)
-    except:
-        pass
+def finish_google_search(location, radius, cuisine, results, search_log, shared):
+    """Hand a single-flight search result to one of its callers"""
+    if shared:
+        # The leader has cached its tiles; re-read them for exact distances
+        # from this caller's location
+        cached_results, _ = get_tile_candidates(location, radius, cuisine)
+        if cached_results is not None:
+            return cached_results, ['✅ Joined an identical in-flight search']
+        search_log = search_log + ['✅ Joined an identical in-flight search']
+    
+    # Every caller, leader included, gets its own copy because restaurants()
+    # extends and enriches the list in place
+    return [dict(r) for r in results], list(search_log)
 
-def search_google_places_sync(location, filters):
-    """Search Google Places API using multiple strategies to find more restaurants"""
+def search_google_places_sync(location, filters, on_batch=None):
+    """Search Google Places API using multiple strategies to find more restaurants.
+
+    on_batch is passed through to run_google_search when this call leads a
+    fresh upstream search; cached and joined searches only return.
+    """
     google_api_key = os.getenv('GOOGLE_API_KEY')
     if not google_api_key:
         return [], ['❌ Google API key not configured']
     
-    # Check cache first
-    ensure_cache_dir()
-    cache_key = get_cache_key(location, filters)
-    cache_file = get_cache_file(cache_key)
+    radius, cuisine, search_key, plan = prepare_google_search(location, filters, google_api_key)
     
-    if is_cache_valid(cache_file):
-        cached_results = load_from_cache(cache_file)
-        if cached_results:
-            return cached_results, ['✅ Using cached results']
+    def search(on_batch=None):
+        # Identical searches already in flight share one upstream fan-out
+        return search_flight.do(search_key, lambda: run_google_search(location, radius, cuisine, plan, on_batch))
     
-    # Search Google Places
-    radius = filters.get('radius', 2000)
-    search_log = []
+    cached = load_search_tiles(location, radius, cuisine, search_key, search)
+    if cached is not None:
+        return cached
     
-    try:
-        # Ensure location is properly formatted
-        lat = float(location['lat'])
-        lng = float(location['lng'])
-        location_str = f"{lat},{lng}"
-        
-        results = []
-        
-        # Strategy 1: Search for restaurants and cafes only (simplified)
-        food_types = [
-            'restaurant',
-            'cafe'
-        ]
-        
-        for food_type in food_types:
-            url = 'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
-            params = {
-                'key': google_api_key,
-                'location': location_str,
-                'radius': radius,
-                'type': food_type
-            }
-            
-            print(f"🔍 Searching for {food_type} establishments...")
-            response = requests.get(url, params=params, timeout=10)
-            data = response.json()
-            
-            if data.get('status') == 'OK':
-                for place in data.get('results', []):
-                    result = process_place_result(place, lat, lng)
-                    # Avoid duplicates
-                    if not any(r['id'] == result['id'] for r in results):
-                        results.append(result)
-                search_log.append(f"✅ Found {len(data.get('results', []))} {food_type} establishments")
-            elif data.get('status') == 'INVALID_REQUEST':
-                search_log.append(f"❌ Google Places API not enabled. Please enable 'Places API' in your Google Cloud Console.")
-                search_log.append(f"🔧 Go to: https://console.cloud.google.com/apis/library/places-backend.googleapis.com")
-                return [], search_log
+    (results, search_log), shared = search(on_batch)
+    return finish_google_search(location, radius, cuisine, results, search_log, shared)
+
+class GoogleSearchRun:
+    """Merge the responses of one planned Google search as they arrive.
+
+    The candidate queries are narrowed and ordered by the yield planner and
+    trimmed to the upstream budget when the run is created; the caller
+    executes self.plan, wrapping each call in issue() and land(), hands every
+    response to add() in plan order and stops once add() returns True, which
+    it also does once the request deadline has passed. Calls already in
+    flight at the stop are paid for anyway, so responses that land unmerged
+    still count towards their query's yield. finish() records the yields,
+    caches the merged candidates by tile if the run is complete, and returns
+    (results, search_log).
+    on_batch, if given, receives a copy of each strategy's new candidates.
+    """
+    
+    def __init__(self, location, radius, cuisine, candidates, on_batch=None):
+        self.location = location
+        self.radius = radius
+        self.cuisine = cuisine
+        self.lat = float(location['lat'])
+        self.lng = float(location['lng'])
+        self.on_batch = on_batch
+        self.search_log = []
+        self.candidates = candidates
+        
+        # Dedup by place id through a hash index as results stream in
+        self.merger = PlaceMerger()
+        
+        self.region = get_region(self.lat, self.lng)
+        self.planned = plan_queries(candidates, self.region)
+        
+        # When the upstream budget runs low, run the best planned queries that
+        # still fit instead of letting the rest fail on the quota
+        self.plan = fit_to_budget(self.planned, always=ANCHOR_STRATEGIES)
+        self.trimmed = len(self.plan) < len(self.planned)
+        if self.trimmed:
+            self.search_log.append(f"🪫 Upstream budget low: running {len(self.plan)} of {len(self.planned)} planned queries")
+        self.early_stop = EarlyStop()
+        
+        # Calls sent upstream and responses merged; the gap is calls still in
+        # flight or answered after the stop
+        self.lock = threading.Lock()
+        self.issued = 0
+        self.received = 0
+        self.landed = {}
+        self.finished = False
+        self.stopped = False
+        self.timed_out = False
+        self.failed = False
+        
+        # Queries answered OK or ZERO_RESULTS, and queries that failed, were
+        # skipped or got any other status
+        self.answered = 0
+        self.unanswered = 0
+    
+    def issue(self, query):
+        """Count one planned query as it goes out to Google"""
+        with self.lock:
+            self.issued += 1
+    
+    def land(self, query, data):
+        """Note a response as it arrives; once the run is finished only its yield is recorded"""
+        with self.lock:
+            if not self.finished:
+                self.landed[get_query_id(query)] = (query, data)
+                return
+        self._record_late(query, data)
+    
+    def _record_late(self, query, data):
+        """Record the yield of a response that was never merged.
+        
+        Yields landing after finish() stay in the tracker's memory and are
+        saved with the region's next search.
+        """
+        if not isinstance(data, dict) or data.get('status') not in ('OK', 'ZERO_RESULTS'):
+            return
+        place_ids = {place.get('place_id') for place in data.get('results', [])} - self.merger.ids - {None}
+        yield_tracker.record(self.region, get_query_id(query), len(place_ids))
+    
+    def add(self, query, data, error):
+        """Merge one query's response; return True when the search should stop"""
+        stop = self._merge(query, data, error)
+        
+        # Out of time: keep what has been merged and skip the remaining queries
+        if not stop and deadline_expired():
+            self.timed_out = True
+            return True
+        return stop
+    
+    def _merge(self, query, data, error):
+        search_log = self.search_log
+        self.received += 1
+        with self.lock:
+            self.landed.pop(get_query_id(query), None)
+        if isinstance(error, (QuotaExceeded, DeadlineExceeded, CircuitOpen)):
+            self.unanswered += 1
+            search_log.append(f"🪫 {query['label']} search skipped: {str(error)}")
+            return False
+        if error:
+            self.unanswered += 1
+            search_log.append(f"⚠️ {query['label']} search failed: {str(error)}")
+            return False
+        
+        status = data.get('status')
+        if status not in ('OK', 'ZERO_RESULTS'):
+            self.unanswered += 1
+        if status == 'OK':
+            new_results = list(self.merger.merge(process_place_results(data.get('results', []), self.lat, self.lng)))
+            if self.on_batch and new_results:
+                self.on_batch([dict(r) for r in new_results])
+            search_log.append(query['log'].format(count=len(data.get('results', []))))
+        elif status == 'ZERO_RESULTS':
+            new_results = []
+        elif status == 'INVALID_REQUEST' and query['strategy'] == 'type':
+            search_log.append(f"❌ Google Places API not enabled. Please enable 'Places API' in your Google Cloud Console.")
+            search_log.append(f"🔧 Go to: https://console.cloud.google.com/apis/library/places-backend.googleapis.com")
+            self.failed = True
+            return True
+        elif status == 'OVER_QUERY_LIMIT':
+            search_log.append(f"🚦 {query['label']} search hit the Google query limit")
+            return False
+        elif query['strategy'] == 'type':
+            search_log.append(f"⚠️ {query['label']} search returned: {status}")
+            return False
+        else:
+            return False
+        
+        # Only definitive answers count towards a query's yield
+        self.answered += 1
+        yield_tracker.record(self.region, get_query_id(query), len(new_results))
+        if self.early_stop.add(len(new_results)):
+            self.stopped = True
+            return True
+        return False
+    
+    def complete(self):
+        """Whether the merged candidates are a full answer for the search area.
+
+        Quota skips count as unanswered, and a plan trimmed to the budget
+        leaves queries out, so throttled runs (background refreshes often
+        are) are never cached. A trimmed run that stopped early never reached
+        the queries trimmed away, so it is complete all the same.
+        """
+        cut_short = self.trimmed and not self.stopped
+        return not self.timed_out and not cut_short and self.answered > 0 and self.unanswered == 0
+    
+    def finish(self):
+        """Record yields, cache the merged candidates and return (results, search_log)"""
+        search_log = self.search_log
+        with self.lock:
+            self.finished = True
+            late = list(self.landed.values())
+            self.landed = {}
+        if self.failed:
+            return [], search_log
+        
+        for query, data in late:
+            self._record_late(query, data)
+        yield_tracker.save(self.region)
+        search_log.append(f"🧭 Planned {len(self.planned)} of {len(self.candidates)} candidate queries, "
+                          f"issued {self.issued} calls, merged {self.received}")
+        if self.issued > self.received:
+            search_log.append(f"📥 {self.issued - self.received} calls answered after the stop or are still in flight; "
+                              f"only their yields are recorded")
+        if self.stopped:
+            search_log.append(f"⏹️ Stopped early: the last {PLANNER_STOP_WINDOW} calls added under {PLANNER_STOP_YIELD:g} new places each")
+        
+        results = self.merger.results
+        search_log.append(f"✅ Found {len(results)} total food establishments ({self.merger.duplicates} duplicates merged)")
+        
+        if self.timed_out:
+            # An incomplete candidate set must not answer later searches as a cached tile
+            mark_partial()
+            search_log.append(f"⏱️ Time budget used up after {self.received} of {len(self.plan)} queries; results are partial")
+            return results, search_log
+        
+        if not self.complete():
+            # Cached tiles answer later searches with no upstream call, so a
+            # set missing failed, skipped or trimmed queries is never stored
+            mark_degraded()
+            if self.unanswered:
+                search_log.append(f"⚠️ {self.unanswered} of {self.received} queries got no answer; results may be incomplete and are not cached")
             else:
-                search_log.append(f"⚠️ {food_type} search returned: {data.get('status')}")
-        
-        # Strategy 2: Multiple radius searches to catch more places
-        radiuses = [radius, radius * 2]  # Reduced to just 2 radii for speed
-        for search_radius in radiuses:
-            if search_radius > 50000:  # Google's max radius
-                continue
-                
-            url = 'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
-            params = {
-                'key': google_api_key,
-                'location': location_str,
-                'radius': search_radius,
-                'type': 'restaurant'
-            }
-            
-            print(f"🔍 Radius search: {search_radius}m")
-            response = requests.get(url, params=params, timeout=10)
-            data = response.json()
-            
-            if data.get('status') == 'OK':
-                for place in data.get('results', []):
-                    result = process_place_result(place, lat, lng)
-                    # Avoid duplicates only
-                    if not any(r['id'] == result['id'] for r in results):
-                        results.append(result)
-                search_log.append(f"✅ Radius {search_radius}m found {len(data.get('results', []))} additional results")
-        
-        # Strategy 3: Text search for specific cuisines if filter is applied
-        if filters.get('cuisine'):
-            cuisine = filters['cuisine'].lower()
-            text_search_query = f"{cuisine} food near {location_str}"
-            
-            text_url = 'https://maps.googleapis.com/maps/api/place/textsearch/json'
-            text_params = {
-                'key': google_api_key,
-                'query': text_search_query,
-                'location': location_str,
-                'radius': radius
-            }
-            
-            print(f"🔍 Making text search request: {text_search_query}")
-            text_response = requests.get(text_url, params=text_params, timeout=10)
-            text_data = text_response.json()
-            
-            if text_data.get('status') == 'OK':
-                for place in text_data.get('results', []):
-                    result = process_place_result(place, lat, lng)
-                    # Avoid duplicates
-                    if not any(r['id'] == result['id'] for r in results):
-                        results.append(result)
-                search_log.append(f"✅ Text search found {len(text_data.get('results', []))} additional results")
-        
-        # Strategy 4: General text searches for common food terms
-        food_search_terms = [
-            "restaurants near me",
-            "food places",
-            "dining",
-            "eat",
-            "cafe",
-            "restaurant"
-        ]
-        
-        for term in food_search_terms:
-            text_url = 'https://maps.googleapis.com/maps/api/place/textsearch/json'
-            text_params = {
-                'key': google_api_key,
-                'query': f"{term} near {location_str}",
-                'location': location_str,
-                'radius': radius
-            }
-            
-            print(f"🔍 Text search: {term}")
-            text_response = requests.get(text_url, params=text_params, timeout=10)
-            text_data = text_response.json()
-            
-            if text_data.get('status') == 'OK':
-                for place in text_data.get('results', []):
-                    result = process_place_result(place, lat, lng)
-                    # Avoid duplicates
-                    if not any(r['id'] == result['id'] for r in results):
-                        results.append(result)
-                search_log.append(f"✅ '{term}' search found {len(text_data.get('results', []))} additional results")
-        
-        # Strategy 5: Search for popular restaurant chains and names
-        popular_chains = [
-            "McDonald's", "KFC", "Subway", "Pizza Hut", "Domino's", "Burger King",
-            "Starbucks", "Dunkin'", "Taco Bell", "Wendy's", "Popeyes", "Chick-fil-A"
-        ]
-        
-        for chain in popular_chains:
-            text_url = 'https://maps.googleapis.com/maps/api/place/textsearch/json'
-            text_params = {
-                'key': google_api_key,
-                'query': f"{chain} near {location_str}",
-                'location': location_str,
-                'radius': radius
-            }
-            
-            print(f"🔍 Chain search: {chain}")
-            text_response = requests.get(text_url, params=text_params, timeout=10)
-            text_data = text_response.json()
-            
-            if text_data.get('status') == 'OK':
-                for place in text_data.get('results', []):
-                    result = process_place_result(place, lat, lng)
-                    # Avoid duplicates
-                    if not any(r['id'] == result['id'] for r in results):
-                        results.append(result)
-                search_log.append(f"✅ '{chain}' search found {len(text_data.get('results', []))} additional results")
-        
-        search_log.append(f"✅ Found {len(results)} total food establishments")
-        
-        # Cache results
-        save_to_cache(cache_file, results)
+                search_log.append("⚠️ Plan was trimmed to the upstream budget; results may be incomplete and are not cached")
+            return results, search_log
+        
+        if not results and get_priority() == BACKGROUND:
+            # A background refresh that comes back empty is more likely an
+            # upstream blip than an emptied area; the stale tiles stay and age
+            # out through the grace window
+            search_log.append("♻️ Refresh found nothing; keeping the cached results")
+            return results, search_log
+        
+        # Cache the unfiltered candidates by tile
+        store_tile_candidates(self.location, self.radius, results, self.cuisine, cost=self.issued)
         search_log.append("💾 Results cached for 24 hours")
         
         return results, search_log
+
+def run_google_search(location, radius, cuisine, candidates, on_batch=None):
+    """Execute a search plan against Google Places and cache the merged candidates.
+
+    on_batch, if given, receives a copy of each strategy's new candidates.
+    """
+    search_log = []
+    
+    try:
+        run = GoogleSearchRun(location, radius, cuisine, candidates, on_batch)
+        search_log = run.search_log
+        
+        def execute(query):
+            run.issue(query)
+            data = run_search_query(query)
+            run.land(query, data)
+            return data
+        
+        # Run every strategy concurrently; fan_out hands results back in plan
+        # order so the merged list does not depend on which call finishes first
+        responses = fan_out(run.plan, execute, max_workers=SEARCH_MAX_WORKERS)
+        for query, data, error in responses:
+            if run.add(query, data, error):
+                responses.close()
+                break
+        
+        return run.finish()
         
     except Exception as e:
         search_log.append(f"❌ Error searching Google Places: {str(e)}")
         return [], search_log
 
-def process_place_result(place, lat, lng):
+def process_place_results(places, lat, lng):
+    """Process a batch of place results from Google Places API"""
+    distances = geometry_distances(lat, lng, places)
+    return [process_place_result(place, distance) for place, distance in zip(places, distances)]
+
+def process_place_result(place, distance):
     """Process a single place result from Google Places API"""
-    # Calculate distance
-    from math import radians, cos, sin, asin, sqrt
-    lat1, lon1 = lat, lng
-    lat2, lon2 = place['geometry']['location']['lat'], place['geometry']['location']['lng']
-    
-    # Haversine formula
-    R = 6371  # Earth's radius in kilometers
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    distance = R * c * 1000  # Convert to meters
-    
-    return {
+    return tag_place({
         'source': 'google',
         'id': place.get('place_id'),
         'name': place.get('name'),
@@ -285,11 +473,11 @@ def process_place_result(place, lat, lng):
         'types': place.get('types', []),
         'lat': place['geometry']['location']['lat'],
         'lng': place['geometry']['location']['lng']
-    }
+    })
 
 @app.route('/')
 def index():
-    return render_template('index.html', google_api_key=os.getenv('GOOGLE_API_KEY', ''))
+    return render_template('index.html')
 
 @app.route('/test')
 def test():
@@ -313,14 +501,13 @@ def test_api():
     
     try:
         # Test with a simple geocoding request
-        url = 'https://maps.googleapis.com/maps/api/geocode/json'
+        url = f'{GOOGLE_MAPS_BASE_URL}/geocode/json'
         params = {
             'key': google_api_key,
             'address': 'San Francisco, CA'
         }
         
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
+        data = fetch_json(url, params=params, timeout=10)
         
         if data.get('status') == 'OK':
             return jsonify({
@@ -356,7 +543,7 @@ def test_places():
     
     try:
         # Test Places API directly
-        url = 'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
+        url = f'{GOOGLE_MAPS_BASE_URL}/place/nearbysearch/json'
         params = {
             'key': google_api_key,
             'location': '37.7749,-122.4194',  # San Francisco
@@ -364,8 +551,7 @@ def test_places():
             'type': 'restaurant'
         }
         
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
+        data = fetch_json(url, params=params, timeout=10)
         
         return jsonify({
             'status': 'success',
@@ -406,13 +592,12 @@ def test_all_apis():
     
     # Test Geocoding API
     try:
-        geocode_url = 'https://maps.googleapis.com/maps/api/geocode/json'
+        geocode_url = f'{GOOGLE_MAPS_BASE_URL}/geocode/json'
         geocode_params = {
             'key': google_api_key,
             'address': 'San Francisco, CA'
         }
-        response = requests.get(geocode_url, params=geocode_params, timeout=5)
-        data = response.json()
+        data = fetch_json(geocode_url, params=geocode_params, timeout=5)
         results['apis']['geocoding'] = {
             'status': data.get('status'),
             'enabled': data.get('status') == 'OK',
@@ -427,15 +612,14 @@ def test_all_apis():
     
     # Test Places API
     try:
-        places_url = 'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
+        places_url = f'{GOOGLE_MAPS_BASE_URL}/place/nearbysearch/json'
         places_params = {
             'key': google_api_key,
             'location': '37.7749,-122.4194',
             'radius': 1000,
             'type': 'restaurant'
         }
-        response = requests.get(places_url, params=places_params, timeout=5)
-        data = response.json()
+        data = fetch_json(places_url, params=places_params, timeout=5)
         results['apis']['places'] = {
             'status': data.get('status'),
             'enabled': data.get('status') == 'OK',
@@ -462,139 +646,111 @@ def test_all_apis():
     else:
         results['status'] = 'all_working'
     
+    # Circuit breaker state and latency per upstream endpoint class
+    results['circuit_breakers'] = get_breaker_stats()
+    
     return jsonify(results)
 
+def get_details_tier(value):
+    """Details tier a search request asked for: 'full' (default), 'minimal', or None for 'none'"""
+    if value == 'none':
+        return None
+    return value if value in DETAILS_TIERS else 'full'
+
+def parse_search_request():
+    """Validate a search request body and return (location, filters, error_response)"""
+    # Ensure we always return JSON
+    if not request.is_json:
+        return None, None, (jsonify({'error': 'Content-Type must be application/json'}), 400)
+        
+    location, filters, error = validate_search_body(request.get_json())
+    if error:
+        return None, None, (jsonify({'error': error}), 400)
+    return location, filters, None
+
+def validate_search_body(data):
+    """Return (location, filters, error_message) for a decoded search request body"""
+    if not data:
+        return None, None, 'Invalid JSON data'
+        
+    location = data.get('location')
+    filters = data.get('filters', {})
+    
+    if not location:
+        return None, None, 'Location is required'
+    
+    print(f"🔍 Searching for restaurants at {location['lat']}, {location['lng']}")
+    print(f"📋 Filters: {filters}")
+    return location, filters, None
+
+def search_restaurants(location, filters, on_batch=None):
+    """Collect unfiltered Google and manual candidates for a search.
+
+    on_batch, if given, is called with each batch of new Google candidates
+    as its strategy completes; manual restaurants only arrive in the return.
+    """
+    # Search using Google Places API
+    results, search_log = search_google_places_sync(location, filters, on_batch)
+    return add_manual_restaurants(results, search_log, location, filters)
+
+def add_manual_restaurants(results, search_log, location, filters):
+    """Add manual restaurants to Google candidates, skipping ones Google already returned"""
+    merger = PlaceMerger(results)
+    manual_results = list(merger.merge(search_manual_restaurants(location, filters)))
+    if manual_results:
+        search_log.append(f"✅ Added {len(manual_results)} manual restaurants")
+    if merger.near_duplicates:
+        search_log.append(f"🔗 Skipped {merger.near_duplicates} manual restaurants already listed by Google")
+    return merger.results, search_log
+
+def filter_search_results(results, filters):
+    """Apply a request's filters to candidates and return (filtered, stages)"""
+    # Cuisine is matched against the tag bitsets computed at ingest
+    cuisine = (filters.get('cuisine') or '').lower().strip() or None
+    
+    # Convert filter price level to integer to match Google Places API format
+    target_price_level = None
+    if filters.get('price_level') is not None and filters.get('price_level') != '':
+        try:
+            target_price_level = int(filters['price_level'])
+        except (ValueError, TypeError) as e:
+            print(f"❌ Error in price filtering: {str(e)}")
+            # Don't filter by price if there's an error
+    
+    # Every predicate is evaluated in one vectorized pass
+    return filter_candidates(
+        results,
+        radius=filters.get('radius') or None,
+        min_rating=filters.get('min_rating', 0),
+        open_now=filters.get('open_now'),
+        cuisine=cuisine,
+        price_level=target_price_level
+    )
+
 @app.route('/restaurants', methods=['POST'])
 def restaurants():
     try:
-        # Ensure we always return JSON
-        if not request.is_json:
-            return jsonify({'error': 'Content-Type must be application/json'}), 400
-            
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'Invalid JSON data'}), 400
-            
-        location = data.get('location')
-        filters = data.get('filters', {})
+        body = request.get_json(silent=True) or {}
+        page_size = get_page_size(body.get('page_size'))
+        details_tier = get_details_tier(body.get('details'))
         
-        if not location:
-            return jsonify({'error': 'Location is required'}), 400
+        # Later pages come from the retained result set, not a new search
+        if body.get('cursor'):
+            return restaurants_page(body['cursor'], page_size, details_tier)
         
-        print(f"🔍 Searching for restaurants at {location['lat']}, {location['lng']}")
-        print(f"📋 Filters: {filters}")
-        
-        # Search using Google Places API
-        results, search_log = search_google_places_sync(location, filters)
-        
-        # Add manual restaurants
-        manual_results = search_manual_restaurants(location, filters)
-        if manual_results:
-            results.extend(manual_results)
-            search_log.append(f"✅ Added {len(manual_results)} manual restaurants")
-        
-        # Apply filters
-        filtered_results = results.copy()
-        
-        # Debug: Show initial results
-        print(f"🔍 Initial results count: {len(filtered_results)}")
-        
-        # Filter by distance/radius first
-        if filters.get('radius'):
-            radius = filters['radius']
-            before_distance = len(filtered_results)
-            filtered_results = [r for r in filtered_results if r.get('distance', float('inf')) <= radius]
-            after_distance = len(filtered_results)
-            print(f"🔍 Distance filter: {before_distance} -> {after_distance} (radius: {radius}m)")
-        
-        # Filter by minimum rating
-        if filters.get('min_rating', 0) > 0:
-            before_rating = len(filtered_results)
-            filtered_results = [r for r in filtered_results 
-                              if r.get('rating') is not None and r.get('rating', 0) >= filters['min_rating']]
-            after_rating = len(filtered_results)
-            print(f"🔍 Rating filter: {before_rating} -> {after_rating} (min_rating: {filters['min_rating']})")
-        
-        # Filter by open now
-        if filters.get('open_now'):
-            before_open = len(filtered_results)
-            filtered_results = [r for r in filtered_results if r.get('open_now') is True]
-            after_open = len(filtered_results)
-            print(f"🔍 Open now filter: {before_open} -> {after_open}")
-        
-        # Filter by cuisine type
-        if filters.get('cuisine') and filters.get('cuisine').strip():
-            try:
-                cuisine = filters['cuisine'].lower()
-                cuisine_keywords = {
-                    'japanese': ['japanese', 'sushi', 'ramen', 'tempura', 'bento', 'izakaya', 'teppanyaki'],
-                    'chinese': ['chinese', 'dim sum', 'szechuan', 'cantonese', 'peking'],
-                    'italian': ['italian', 'pizza', 'pasta', 'ristorante', 'trattoria'],
-                    'indian': ['indian', 'curry', 'tandoori', 'biryani', 'masala'],
-                    'thai': ['thai', 'pad thai', 'tom yum', 'green curry'],
-                    'korean': ['korean', 'bbq', 'bibimbap', 'kimchi', 'bulgogi'],
-                    'mexican': ['mexican', 'taco', 'burrito', 'enchilada', 'quesadilla'],
-                    'american': ['american', 'burger', 'steak', 'bbq', 'diner'],
-                    'french': ['french', 'bistro', 'brasserie', 'crepe', 'croissant'],
-                    'mediterranean': ['mediterranean', 'greek', 'lebanese', 'turkish', 'falafel'],
-                    'seafood': ['seafood', 'fish', 'crab', 'lobster', 'oyster', 'shrimp', 'prawn'],
-                    'dessert': ['dessert', 'cake', 'ice cream', 'pastry', 'bakery', 'sweet'],
-                    'vietnamese': ['vietnamese', 'pho', 'banh mi', 'spring roll', 'viet']
-                }
-                
-                keywords = cuisine_keywords.get(cuisine, [cuisine])
-                before_cuisine = len(filtered_results)
-                filtered_results = [r for r in filtered_results 
-                                  if any(keyword in r.get('name', '').lower() or 
-                                        any(keyword in t.lower() for t in r.get('types', []))
-                                        for keyword in keywords)]
-                after_cuisine = len(filtered_results)
-                print(f"🔍 Cuisine filter: {before_cuisine} -> {after_cuisine} (cuisine: '{cuisine}', keywords: {keywords})")
-            except Exception as e:
-                print(f"❌ Error in cuisine filtering: {str(e)}")
-                # Don't filter by cuisine if there's an error
-                pass
-        
-        # Filter by price level
-        if filters.get('price_level') is not None and filters.get('price_level') != '':
-            before_price = len(filtered_results)
-            try:
-                # Convert filter price level to integer to match Google Places API format
-                target_price_level = int(filters['price_level'])
-                filtered_results = [r for r in filtered_results 
-                                  if r.get('price_level') == target_price_level]
-                after_price = len(filtered_results)
-                print(f"🔍 Price filter: {before_price} -> {after_price} (price_level: {target_price_level})")
-            except (ValueError, TypeError) as e:
-                print(f"❌ Error in price filtering: {str(e)}")
-                # Don't filter by price if there's an error
-                pass
-        
-        print(f"Processed {len(results)} Google Places results")
-        print(f"After filtering: {len(filtered_results)} restaurants")
-        
-        # Debug: Show what filters are being applied
-        if len(results) > 0 and len(filtered_results) == 0:
-            print(f"🔍 DEBUG: All {len(results)} results were filtered out!")
-            print(f"🔍 DEBUG: Applied filters: {filters}")
-            # Show first few results for debugging
-            for i, result in enumerate(results[:5]):
-                print(f"🔍 DEBUG: Result {i+1}: {result.get('name', 'Unknown')} - Rating: {result.get('rating', 'N/A')}, Distance: {result.get('distance', 'N/A')}m, Price: {result.get('price_level', 'N/A')}, Types: {result.get('types', [])}")
-        
-        # Get photos and details for top results
-        if filtered_results:
-            filtered_results = get_restaurant_details(filtered_results[:20])  # Limit to top 20 for details
-        
-        # Log search details
-        for log_entry in search_log:
-            print(log_entry)
+        location, filters, error = parse_search_request()
+        if error:
+            return error
         
-        return jsonify({
-            'results': filtered_results,
-            'search_log': search_log,
-            'total_found': len(results),
-            'total_filtered': len(filtered_results)
-        })
+        # Every upstream call of this search shares one time budget; whatever
+        # was merged by the deadline is returned, flagged as partial
+        with request_deadline() as deadline:
+            results, search_log = search_restaurants(location, filters)
+            page, summary = paginate_search_results(results, search_log, filters, page_size)
+            if details_tier:
+                page = get_restaurant_details(page, tier=details_tier)
+        
+        return jsonify(dict(summary, results=page, partial=deadline.partial, degraded=deadline.degraded))
         
     except Exception as e:
         print(f"❌ Error in restaurant search: {str(e)}")
@@ -602,185 +758,449 @@ def restaurants():
         print(traceback.format_exc())
         return jsonify({'error': f'Search failed: {str(e)}'}), 500
 
-def get_restaurant_details(restaurants, max_photos=3):
+def paginate_search_results(results, search_log, filters, page_size):
+    """Filter search candidates and keep the matches past the first page.
+
+    Returns (page, summary): the first page, still to be enriched, and the
+    remaining /restaurants response fields.
+    """
+    # Apply filters
+    print(f"🔍 Initial results count: {len(results)}")
+    
+    cuisine = (filters.get('cuisine') or '').lower().strip()
+    if cuisine:
+        print(f"🔍 Cuisine keywords for '{cuisine}': {sorted(TAG_KEYWORDS.get(cuisine, [cuisine]))}")
+    
+    filtered_results, stages = filter_search_results(results, filters)
+    for name, before, after in stages:
+        print(f"🔍 {name} filter: {before} -> {after}")
+    
+    print(f"Processed {len(results)} Google Places results")
+    print(f"After filtering: {len(filtered_results)} restaurants")
+    
+    # Debug: Show what filters are being applied
+    if len(results) > 0 and len(filtered_results) == 0:
+        print(f"🔍 DEBUG: All {len(results)} results were filtered out!")
+        print(f"🔍 DEBUG: Applied filters: {filters}")
+        # Show first few results for debugging
+        for i, result in enumerate(results[:5]):
+            print(f"🔍 DEBUG: Result {i+1}: {result.get('name', 'Unknown')} - Rating: {result.get('rating', 'N/A')}, Distance: {result.get('distance', 'N/A')}m, Price: {result.get('price_level', 'N/A')}, Types: {result.get('types', [])}")
+    
+    # Keep the rest for later pages; only the page returned is enriched
+    next_cursor = save_result_set([dict(r) for r in filtered_results], page_size, total_found=len(results))
+    page = filtered_results[:page_size]
+    
+    # Log search details
+    for log_entry in search_log:
+        print(log_entry)
+    
+    return page, {
+        'next_cursor': next_cursor,
+        'search_log': search_log,
+        'total_found': len(results),
+        'total_filtered': len(filtered_results)
+    }
+
+def restaurants_page(cursor, page_size, details_tier='full'):
+    """Serve the page a cursor points at from its retained result set"""
+    loaded = load_search_page(cursor, page_size)
+    if loaded is None:
+        return jsonify({'error': RESULTS_EXPIRED_MESSAGE}), 410
+    
+    page, summary = loaded
+    with request_deadline() as deadline:
+        if details_tier:
+            page = get_restaurant_details(page, tier=details_tier)
+    return jsonify(dict(summary, results=page, partial=deadline.partial))
+
+def load_search_page(cursor, page_size):
+    """Return (page, summary) for a cursor like paginate_search_results, or None once expired"""
+    loaded = load_result_page(cursor, page_size)
+    if loaded is None:
+        return None
+    
+    page, next_cursor, result_set = loaded
+    print(f"📄 Serving {len(page)} more results from a retained result set")
+    return page, {
+        'next_cursor': next_cursor,
+        'search_log': [],
+        'total_found': result_set.get('total_found'),
+        'total_filtered': len(result_set['results'])
+    }
+
+@app.route('/restaurants/stream', methods=['POST'])
+def restaurants_stream():
+    """Stream filtered results as NDJSON frames while the search strategies complete.
+
+    Each line is a JSON object: {'type': 'results', 'results': [...]} for every
+    batch with new matches, then one {'type': 'summary', ...} carrying the
+    totals, search log, a partial flag when the deadline cut the search short,
+    a degraded flag when upstream calls were skipped or failed, and a
+    next_cursor for /restaurants when more than one page matched, or
+    {'type': 'error', 'error': ...} on failure.
+    """
+    location, filters, error = parse_search_request()
+    if error:
+        return error
+    page_size = get_page_size(request.get_json().get('page_size'))
+    details_tier = get_details_tier(request.get_json().get('details'))
+    
+    # The search runs on its own thread and hands batches over as they land;
+    # it and the enrichment in generate() share one time budget
+    deadline = Deadline()
+    events = queue.Queue()
+    def run():
+        try:
+            with request_deadline(deadline):
+                events.put(('done', search_restaurants(location, filters,
+                                                       on_batch=lambda batch: events.put(('batch', batch)))))
+        except Exception as e:
+            events.put(('error', e))
+    threading.Thread(target=run, daemon=True).start()
+    
+    def generate():
+        seen_ids = set()
+        matched = []
+        returned = 0
+        while True:
+            kind, payload = events.get()
+            if kind == 'error':
+                print(f"❌ Error in streaming restaurant search: {str(payload)}")
+                yield json.dumps({'type': 'error', 'error': f'Search failed: {str(payload)}'}) + '\n'
+                return
+            
+            # The final candidate set repeats what was streamed; send only the rest
+            if kind == 'batch':
+                batch = payload
+            else:
+                results, search_log = payload
+                batch = [r for r in results if r.get('id') not in seen_ids]
+            seen_ids.update(r.get('id') for r in batch)
+            
+            filtered, _ = filter_search_results(batch, filters)
+            matched.extend(dict(r) for r in filtered)
+            page = filtered[:page_size - returned]
+            if page:
+                if details_tier:
+                    with request_deadline(deadline):
+                        page = get_restaurant_details(page, tier=details_tier)
+                returned += len(page)
+                yield json.dumps({'type': 'results', 'results': page}) + '\n'
+            
+            if kind == 'done':
+                for log_entry in search_log:
+                    print(log_entry)
+                # Matches past the first page stay server-side behind a cursor
+                yield json.dumps({
+                    'type': 'summary',
+                    'next_cursor': save_result_set(matched, returned, total_found=len(results)),
+                    'search_log': search_log,
+                    'total_found': len(results),
+                    'total_filtered': len(matched),
+                    'total_returned': returned,
+                    'partial': deadline.partial,
+                    'degraded': deadline.degraded
+                }) + '\n'
+                return
+    
+    # Proxies must pass frames through as they are written
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def load_place_details(place_id, google_api_key, tier='full'):
+    """Return one tier of raw details for a place, from cache or Google"""
+    # Check the per-place details cache before calling Google
+    result = get_cached_details(place_id, google_api_key, tier)
+    
+    if result is None:
+        # Get place details to get photo references and menu info
+        result = fetch_details(place_id, google_api_key, timeout=DETAILS_TIMEOUT_SECONDS, tier=tier)
+    return result
+
+def format_place_details(result, max_photos=3, tier='full'):
+    """Turn a raw details result into the fields a restaurant card shows"""
+    # Photos are served through the /photo proxy so the API key stays server-side
+    photos = []
+    if result.get('photos'):
+        for photo in result['photos'][:max_photos]:
+            photos.append({
+                'url': get_photo_url(photo['photo_reference'], maxwidth=400, maxheight=300),
+                'width': photo.get('width'),
+                'height': photo.get('height')
+            })
+    details = {
+        'photos': photos,
+        'google_url': result.get('url')  # Google Maps URL
+    }
+    if tier == 'minimal':
+        return details
+    
+    # Add menu and website links
+    details['website'] = result.get('website')
+    details['phone'] = result.get('formatted_phone_number')
+    details['opening_hours'] = result.get('opening_hours', {}).get('weekday_text', [])
+    details['editorial_summary'] = result.get('editorial_summary', {}).get('overview')
+    
+    # Add reviews
+    reviews = []
+    if result.get('reviews'):
+        for review in result['reviews'][:1]:  # Limit to 1 review
+            reviews.append({
+                'author': review.get('author_name'),
+                'rating': review.get('rating'),
+                'text': review.get('text'),
+                'time': review.get('relative_time_description')
+            })
+    details['reviews'] = reviews
+    return details
+
+def fetch_restaurant_details(restaurant, google_api_key, max_photos=3, tier='full'):
+    """Fetch place details for one restaurant and merge them into the dict"""
+    result = load_place_details(restaurant['id'], google_api_key, tier)
+    
+    if result:
+        details = format_place_details(result, max_photos, tier)
+        restaurant.update(details)
+        print(f"✅ Got {tier} details for {restaurant.get('name', 'Unknown')} - {len(details['photos'])} photos, {len(details.get('reviews', []))} reviews")
+    else:
+        restaurant['photos'] = []
+        restaurant['reviews'] = []
+        print(f"ℹ️ No details available for {restaurant.get('name', 'Unknown')}")
+
+    return restaurant
+
+def select_details_targets(restaurants):
+    """Restaurants to enrich, in ranking order, within the details budget"""
+    to_enrich = [r for r in restaurants if r.get('id')]
+    
+    # On a low details budget only the top ranked places are enriched; the
+    # rest can still be loaded on demand through the details route
+    budget = upstream_quota.available('details')
+    if budget < len(to_enrich):
+        print(f"🪫 Details budget low: enriching {budget} of {len(to_enrich)} restaurants")
+        to_enrich = to_enrich[:budget]
+    return to_enrich
+
+def get_restaurant_details(restaurants, max_photos=3, tier='full'):
     """Get detailed information including photos and menu links for restaurants"""
     google_api_key = os.getenv('GOOGLE_API_KEY')
     if not google_api_key:
         print("❌ No Google API key available for details")
         return restaurants
     
-    print(f"📸 Fetching details for {len(restaurants)} restaurants...")
+    print(f"📸 Fetching {tier} details for {len(restaurants)} restaurants...")
     
-    for i, restaurant in enumerate(restaurants):
-        if not restaurant.get('id'):
-            continue
-            
-        try:
-            # Get place details to get photo references and menu info
-            details_url = 'https://maps.googleapis.com/maps/api/place/details/json'
-            details_params = {
-                'key': google_api_key,
-                'place_id': restaurant['id'],
-                'fields': 'photos,website,url,formatted_phone_number,opening_hours,reviews,editorial_summary'
-            }
-            
-            response = requests.get(details_url, params=details_params, timeout=10)
-            data = response.json()
-            
-            if data.get('status') == 'OK' and data.get('result'):
-                result = data['result']
-                
-                # Process photos
-                photos = []
-                if result.get('photos'):
-                    for photo in result['photos'][:max_photos]:
-                        photo_url = f"https://maps.googleapis.com/maps/api/place/photo"
-                        photo_params = {
-                            'key': google_api_key,
-                            'photoreference': photo['photo_reference'],
-                            'maxwidth': 400,
-                            'maxheight': 300
-                        }
-                        photos.append({
-                            'url': photo_url,
-                            'params': photo_params,
-                            'width': photo.get('width'),
-                            'height': photo.get('height')
-                        })
-                restaurant['photos'] = photos
-                
-                # Add menu and website links
-                restaurant['website'] = result.get('website')
-                restaurant['google_url'] = result.get('url')  # Google Maps URL
-                restaurant['phone'] = result.get('formatted_phone_number')
-                restaurant['opening_hours'] = result.get('opening_hours', {}).get('weekday_text', [])
-                restaurant['editorial_summary'] = result.get('editorial_summary', {}).get('overview')
-                
-                # Add reviews
-                reviews = []
-                if result.get('reviews'):
-                    for review in result['reviews'][:1]:  # Limit to 1 review
-                        reviews.append({
-                            'author': review.get('author_name'),
-                            'rating': review.get('rating'),
-                            'text': review.get('text'),
-                            'time': review.get('relative_time_description')
-                        })
-                restaurant['reviews'] = reviews
-                
-                print(f"✅ Got details for {restaurant.get('name', 'Unknown')} - {len(photos)} photos, {len(reviews)} reviews")
-            else:
-                restaurant['photos'] = []
-                restaurant['reviews'] = []
-                print(f"ℹ️ No details available for {restaurant.get('name', 'Unknown')}")
-                
-        except Exception as e:
-            print(f"❌ Error getting details for {restaurant.get('name', 'Unknown')}: {str(e)}")
+    # Details are fetched concurrently; each restaurant is updated in place,
+    # so the ranking order of the list is untouched
+    to_enrich = select_details_targets(restaurants)
+    if to_enrich and deadline_expired():
+        # No time left; the cards load their details on demand instead
+        print("⏱️ Deadline reached, skipping details")
+        mark_partial()
+        to_enrich = []
+    def enrich(restaurant):
+        return fetch_restaurant_details(restaurant, google_api_key, max_photos, tier)
+    
+    for restaurant, _, error in fan_out(to_enrich, enrich, max_workers=DETAILS_MAX_WORKERS):
+        if error:
+            print(f"❌ Error getting details for {restaurant.get('name', 'Unknown')}: {str(error)}")
             restaurant['photos'] = []
             restaurant['reviews'] = []
     
     return restaurants
 
+@app.route('/restaurants/<place_id>/details')
+def restaurant_details(place_id):
+    """Details for one place on demand; ?tier=minimal|full (default full)"""
+    tier = request.args.get('tier', 'full')
+    if tier not in DETAILS_TIERS:
+        return jsonify({'error': f"Unknown tier '{tier}'. Use one of: {', '.join(DETAILS_TIERS)}"}), 400
+    
+    google_api_key = os.getenv('GOOGLE_API_KEY')
+    if not google_api_key:
+        return jsonify({'error': 'Google API key not configured'}), 500
+    
+    try:
+        result = load_place_details(place_id, google_api_key, tier)
+    except Exception as e:
+        print(f"❌ Error getting details for {place_id}: {str(e)}")
+        return jsonify({'error': f'Details lookup failed: {str(e)}'}), 502
+    
+    if not result:
+        return jsonify({'error': 'No details available for this place'}), 404
+    
+    details = format_place_details(result, tier=tier)
+    details.update({'id': place_id, 'tier': tier})
+    return jsonify(details)
+
+@app.route('/photo/<photo_reference>')
+def photo(photo_reference):
+    """Serve a place photo from the local photo cache, fetching it from Google once"""
+    maxwidth = clamp_photo_size(request.args.get('maxwidth'))
+    maxheight = clamp_photo_size(request.args.get('maxheight'))
+    if not maxwidth and not maxheight:
+        maxwidth = 400
+    
+    google_api_key = os.getenv('GOOGLE_API_KEY')
+    if not google_api_key:
+        return jsonify({'error': 'Google API key not configured'}), 500
+    
+    try:
+        path, digest, content_type = get_photo(photo_reference, google_api_key, maxwidth, maxheight)
+    except (QuotaExceeded, CircuitOpen) as e:
+        print(f"🪫 Photo deferred: {str(e)}")
+        return jsonify({'error': 'Photo temporarily unavailable'}), 503, {'Retry-After': '5'}
+    except Exception as e:
+        print(f"❌ Error fetching photo: {str(e)}")
+        return jsonify({'error': f'Photo unavailable: {str(e)}'}), 502
+    
+    # send_file hands the open file to the server's sendfile support and
+    # answers If-None-Match with 304 using the content digest as a strong ETag
+    response = send_file(path, mimetype=content_type, etag=digest, max_age=PHOTO_BROWSER_MAX_AGE, conditional=True)
+    response.headers['Cache-Control'] = f'public, max-age={PHOTO_BROWSER_MAX_AGE}, immutable'
+    return response
+
+GEOCODE_URL = f'{GOOGLE_MAPS_BASE_URL}/geocode/json'
+GEOCODE_SUGGESTION = 'You can manually enter coordinates or use "Use My Location" instead.'
+
+def parse_geocode_body(data):
+    """Return (query, lat, lng, reverse) for a /geocode request body"""
+    query = (data.get('query') or '').strip()
+    lat, lng = data.get('lat'), data.get('lng')
+    reverse = not query and lat is not None and lng is not None
+    return query, lat, lng, reverse
+
+def load_cached_geocode(query, lat, lng, reverse):
+    """Cached /geocode response body for a request, or None"""
+    if reverse:
+        print(f"🔍 Reverse geocoding request for: {lat}, {lng}")
+        cached = get_cached_reverse_geocode(lat, lng)
+        if cached is not None:
+            print("📋 Reverse geocode answered from cache")
+            return {'results': cached, 'cached': True}
+    else:
+        print(f"🔍 Geocoding request for: {query}")
+        cached, source = get_cached_geocode(query)
+        if cached is not None:
+            print(f"📋 Geocode answered from {source} cache")
+            return {'results': cached, 'cached': True}
+    return None
+
+def get_geocode_params(query, lat, lng, reverse, google_api_key):
+    if reverse:
+        return {
+            'key': google_api_key,
+            'latlng': f"{lat},{lng}"
+        }
+    return {
+        'key': google_api_key,
+        'address': query,
+        'components': GEOCODE_COMPONENTS  # Focus on Singapore
+    }
+
+def format_geocode_response(data, query, lat, lng, reverse):
+    """Turn a Geocoding API reply into (body, status) and cache good answers"""
+    status = data.get('status')
+    print(f"📊 Geocoding response status: {status}")
+    
+    if status == 'REQUEST_DENIED':
+        error_msg = data.get('error_message', 'Unknown error')
+        print(f"❌ Geocoding API error: {error_msg}")
+        return {
+            'error': f'API access denied: {error_msg}. Please check your Google API key configuration.',
+            'suggestion': GEOCODE_SUGGESTION
+        }, 400
+    
+    if status != 'OK':
+        print(f"❌ Geocoding error: {status}")
+        return {'error': f'Geocoding failed: {status}'}, 400
+    
+    results = data.get('results', [])
+    print(f"✅ Found {len(results)} geocoding results")
+    
+    formatted_results = []
+    for result in results[:GEOCODE_MAX_RESULTS]:  # Limit to 5 results
+        location = result['geometry']['location']
+        formatted_results.append({
+            'formatted_address': result['formatted_address'],
+            'lat': location['lat'],
+            'lng': location['lng']
+        })
+    
+    if reverse:
+        save_reverse_geocode(lat, lng, formatted_results)
+    else:
+        save_geocode(query, formatted_results)
+    
+    return {'results': formatted_results}, 200
+
 @app.route('/geocode', methods=['POST'])
 def geocode():
+    """Forward geocode {'query'} or reverse geocode {'lat', 'lng'} through the geocode cache"""
     try:
-        data = request.get_json()
-        query = data.get('query', '').strip()
+        query, lat, lng, reverse = parse_geocode_body(request.get_json())
         
-        if not query:
+        if not query and not reverse:
             return jsonify({'error': 'Query is required'}), 400
         
-        print(f"🔍 Geocoding request for: {query}")
+        cached = load_cached_geocode(query, lat, lng, reverse)
+        if cached is not None:
+            return jsonify(cached)
         
         google_api_key = os.getenv('GOOGLE_API_KEY')
         if not google_api_key:
             return jsonify({
                 'error': 'Google Geocoding API is not configured. Please set GOOGLE_API_KEY environment variable.',
-                'suggestion': 'You can manually enter coordinates or use "Use My Location" instead.'
-            }), 400
-        
-        url = 'https://maps.googleapis.com/maps/api/geocode/json'
-        params = {
-            'key': google_api_key,
-            'address': query,
-            'components': 'country:SG'  # Focus on Singapore
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
-        
-        status = data.get('status')
-        print(f"📊 Geocoding response status: {status}")
-        
-        if status == 'REQUEST_DENIED':
-            error_msg = data.get('error_message', 'Unknown error')
-            print(f"❌ Geocoding API error: {error_msg}")
-            return jsonify({
-                'error': f'API access denied: {error_msg}. Please check your Google API key configuration.',
-                'suggestion': 'You can manually enter coordinates or use "Use My Location" instead.'
+                'suggestion': GEOCODE_SUGGESTION
             }), 400
         
-        if status != 'OK':
-            print(f"❌ Geocoding error: {status}")
-            return jsonify({'error': f'Geocoding failed: {status}'}), 400
-        
-        results = data.get('results', [])
-        print(f"✅ Found {len(results)} geocoding results")
-        
-        formatted_results = []
-        for result in results[:5]:  # Limit to 5 results
-            location = result['geometry']['location']
-            formatted_results.append({
-                'formatted_address': result['formatted_address'],
-                'lat': location['lat'],
-                'lng': location['lng']
-            })
-        
-        return jsonify({'results': formatted_results})
+        params = get_geocode_params(query, lat, lng, reverse, google_api_key)
+        data = fetch_json(GEOCODE_URL, params=params, timeout=10, hedge=True)
+        body, status = format_geocode_response(data, query, lat, lng, reverse)
+        return jsonify(body), status
         
+    except (QuotaExceeded, CircuitOpen) as e:
+        print(f"🪫 Geocoding deferred: {str(e)}")
+        return jsonify({
+            'error': 'Geocoding is busy, please try again in a moment.',
+            'suggestion': GEOCODE_SUGGESTION
+        }), 503, {'Retry-After': '5'}
     except Exception as e:
         print(f"❌ Geocoding error: {str(e)}")
         return jsonify({
             'error': f'Geocoding failed: {str(e)}',
-            'suggestion': 'You can manually enter coordinates or use "Use My Location" instead.'
+            'suggestion': GEOCODE_SUGGESTION
         }), 400
 
 @app.route('/cache/stats')
 def cache_stats():
     """Get cache statistics"""
-    if not os.path.exists(CACHE_DIR):
-        return jsonify({'total_files': 0, 'total_size_mb': 0})
-    
-    total_files = 0
-    total_size = 0
-    
-    for filename in os.listdir(CACHE_DIR):
-        if filename.endswith('.json'):
-            file_path = os.path.join(CACHE_DIR, filename)
-            total_files += 1
-            total_size += os.path.getsize(file_path)
-    
-    return jsonify({
-        'total_files': total_files,
-        'total_size_mb': round(total_size / (1024 * 1024), 2)
-    })
+    stats = get_cache_backend().stats()
+    stats['memory'] = hot_cache.stats()
+    stats['photos'] = photo_store.stats()
+    stats['geocode'] = get_geocode_stats()
+    stats['refresh'] = refresher.stats()
+    stats['quota'] = upstream_quota.stats()
+    stats['page_tokens'] = page_tokens.stats()
+    return jsonify(stats)
 
 @app.route('/cache/clear', methods=['POST'])
 def clear_cache():
-    """Clear all cache files"""
-    if not os.path.exists(CACHE_DIR):
-        return jsonify({'message': 'No cache to clear'})
+    """Clear all cache entries"""
+    hot_cache.clear()
+    clear_geocode_memory()
+    cleared_count = get_cache_backend().clear()
+    cleared_photos = photo_store.clear()
     
-    cleared_count = 0
-    for filename in os.listdir(CACHE_DIR):
-        if filename.endswith('.json'):
-            try:
-                os.remove(os.path.join(CACHE_DIR, filename))
-                cleared_count += 1
-            except:
-                pass
+    return jsonify({'message': f'Cleared {cleared_count} cache entries and {cleared_photos} photos'})
+
+@app.route('/cache/cleanup', methods=['POST'])
+def cleanup_cache():
+    """Remove expired cache entries"""
+    # Keep entries that are still inside the stale-while-revalidate window
+    expired_count = get_cache_backend().cleanup_expired(grace_seconds=CACHE_STALE_GRACE_HOURS * 3600)
     
-    return jsonify({'message': f'Cleared {cleared_count} cache files'})
+    return jsonify({'message': f'Cleaned up {expired_count} expired cache entries'})
 
 @app.route('/search-restaurant', methods=['POST'])
 def search_restaurant_by_name():
@@ -800,40 +1220,42 @@ def search_restaurant_by_name():
         if not google_api_key:
             return jsonify({'error': 'Google API key not configured'}), 400
         
-        # Text search for the specific restaurant
-        text_url = 'https://maps.googleapis.com/maps/api/place/textsearch/json'
-        text_params = {
-            'key': google_api_key,
-            'query': f"{restaurant_name} restaurant",
-            'location': f"{location['lat']},{location['lng']}",
-            'radius': 5000  # 5km radius
-        }
-        
         print(f"🔍 Searching for restaurant: {restaurant_name}")
-        response = requests.get(text_url, params=text_params, timeout=10)
-        data = response.json()
-        
-        if data.get('status') != 'OK':
-            return jsonify({
-                'error': f'Search failed: {data.get("status")}',
-                'error_message': data.get('error_message', 'Unknown error')
-            }), 400
-        
-        results = []
-        for place in data.get('results', []):
-            result = process_place_result(place, location['lat'], location['lng'])
-            results.append(result)
-        
-        return jsonify({
-            'results': results,
-            'total_found': len(results),
-            'search_query': restaurant_name
-        })
+        data = fetch_json(TEXT_SEARCH_URL, params=get_name_search_params(restaurant_name, location, google_api_key), timeout=10)
+        body, status = format_name_search_response(data, restaurant_name, location)
+        return jsonify(body), status
         
     except Exception as e:
         print(f"❌ Error in restaurant name search: {str(e)}")
         return jsonify({'error': f'Search failed: {str(e)}'}), 500
 
+TEXT_SEARCH_URL = f'{GOOGLE_MAPS_BASE_URL}/place/textsearch/json'
+
+def get_name_search_params(restaurant_name, location, google_api_key):
+    """Text search parameters for finding one restaurant by name"""
+    return {
+        'key': google_api_key,
+        'query': f"{restaurant_name} restaurant",
+        'location': f"{location['lat']},{location['lng']}",
+        'radius': 5000  # 5km radius
+    }
+
+def format_name_search_response(data, restaurant_name, location):
+    """Turn a text search reply into the /search-restaurant (body, status)"""
+    if data.get('status') != 'OK':
+        return {
+            'error': f'Search failed: {data.get("status")}',
+            'error_message': data.get('error_message', 'Unknown error')
+        }, 400
+    
+    results = process_place_results(data.get('results', []), location['lat'], location['lng'])
+    
+    return {
+        'results': results,
+        'total_found': len(results),
+        'search_query': restaurant_name
+    }, 200
+
 def search_manual_restaurants(location, filters):
     """Search manually added restaurants that might be missing from Google Places API"""
     manual_restaurants = [
@@ -964,24 +1386,13 @@ def search_manual_restaurants(location, filters):
     radius = filters.get('radius', 2000)
     filtered_results = []
     
-    for restaurant in manual_restaurants:
-        # Calculate distance using Haversine formula
-        from math import radians, cos, sin, asin, sqrt
-        lat1, lon1 = location['lat'], location['lng']
-        lat2, lon2 = restaurant['lat'], restaurant['lng']
-        
-        R = 6371  # Earth's radius in kilometers
-        dlat = radians(lat2 - lat1)
-        dlon = radians(lon2 - lon1)
-        a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-        c = 2 * asin(sqrt(a))
-        distance = R * c * 1000  # Convert to meters
-        
+    distances = place_distances(location['lat'], location['lng'], manual_restaurants)
+    for restaurant, distance in zip(manual_restaurants, distances):
         restaurant['distance'] = int(distance)
         
         # Only include if within radius
         if distance <= radius:
-            filtered_results.append(restaurant)
+            filtered_results.append(tag_place(restaurant))
     
     return filtered_results
 
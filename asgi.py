@@ -0,0 +1,283 @@
+# ASGI entry point: the search routes run natively on one long-lived event
+# loop and share its pooled aiohttp session, so many I/O-bound searches can be
+# in flight per process. Every other route is handed to the Flask app.
+#
+#   gunicorn asgi:app -k uvicorn.workers.UvicornWorker --workers 1 --timeout 120
+import os
+import json
+import asyncio
+from asgiref.wsgi import WsgiToAsgi
+from app import app as flask_app
+from app import (DETAILS_MAX_WORKERS, DETAILS_TIMEOUT_SECONDS, GEOCODE_SUGGESTION, GEOCODE_URL,
+                 RESULTS_EXPIRED_MESSAGE, SEARCH_MAX_WORKERS, TEXT_SEARCH_URL, GoogleSearchRun,
+                 add_manual_restaurants, finish_google_search, format_geocode_response,
+                 format_name_search_response, format_place_details, get_details_tier, get_geocode_params,
+                 get_name_search_params, load_cached_geocode, load_search_page, load_search_tiles,
+                 paginate_search_results, parse_geocode_body, prepare_google_search, run_google_search,
+                 search_flight, select_details_targets, validate_search_body)
+from pagination import get_page_size
+from query_planner import ANCHOR_STRATEGIES
+from singleflight import AsyncSingleFlight
+from deadline import deadline_expired, mark_partial, request_deadline
+from api.client import close_async_session, fetch_json_async
+from api.quota import QuotaExceeded
+from api.breaker import CircuitOpen
+from api.details_cache import fetch_details_async, get_cached_details
+
+# Identical searches on the loop share one upstream fan-out
+async_search_flight = AsyncSingleFlight()
+
+async def run_search_query_async(query):
+    """Execute a single planned upstream query and return the decoded JSON"""
+    print(f"🔍 {query['strategy'].capitalize()} search: {query['label']}")
+    return await fetch_json_async(query['url'], params=query['params'], timeout=10,
+                                  hedge=query['strategy'] in ANCHOR_STRATEGIES)
+
+async def run_google_search_async(location, radius, cuisine, candidates):
+    """run_google_search on the event loop instead of a thread pool"""
+    search_log = []
+    tasks = []
+
+    try:
+        # Planning may load the region's yield stats from the cache backend
+        run = await asyncio.to_thread(GoogleSearchRun, location, radius, cuisine, candidates)
+        search_log = run.search_log
+
+        # At most SEARCH_MAX_WORKERS calls of one search are in flight, so an
+        # early stop still saves the queries that have not started
+        limit = asyncio.Semaphore(SEARCH_MAX_WORKERS)
+        started = set()
+        async def execute(query):
+            async with limit:
+                started.add(asyncio.current_task())
+                run.issue(query)
+                data = await run_search_query_async(query)
+                run.land(query, data)
+                return data
+        tasks = [asyncio.ensure_future(execute(query)) for query in run.plan]
+
+        # Responses are merged in plan order, as fan_out hands them back
+        for query, task in zip(run.plan, tasks):
+            try:
+                data, error = await task, None
+            except Exception as e:
+                data, error = None, e
+            if run.add(query, data, error):
+                break
+
+        # Yield and tile writes go to the cache backend off the loop
+        return await asyncio.to_thread(run.finish)
+
+    except Exception as e:
+        search_log.append(f"❌ Error searching Google Places: {str(e)}")
+        return [], search_log
+    finally:
+        # Calls already sent are left to land so their yields reach the
+        # planner; queries still waiting for a slot are cancelled
+        for task in tasks:
+            if task in started and not task.done():
+                task.add_done_callback(lambda task: task.cancelled() or task.exception())
+                continue
+            if task.done() and not task.cancelled():
+                task.exception()
+            task.cancel()
+
+async def search_google_places_async(location, filters):
+    """search_google_places_sync for the event loop"""
+    google_api_key = os.getenv('GOOGLE_API_KEY')
+    if not google_api_key:
+        return [], ['❌ Google API key not configured']
+
+    radius, cuisine, search_key, plan = prepare_google_search(location, filters, google_api_key)
+
+    def refresh():
+        # Background refreshes run on the refresher's threads
+        return search_flight.do(search_key, lambda: run_google_search(location, radius, cuisine, plan))
+
+    # Cache backend reads and writes run off the loop, like run.finish
+    cached = await asyncio.to_thread(load_search_tiles, location, radius, cuisine, search_key, refresh)
+    if cached is not None:
+        return cached
+
+    (results, search_log), shared = await async_search_flight.do(
+        search_key, lambda: run_google_search_async(location, radius, cuisine, plan))
+    return await asyncio.to_thread(finish_google_search, location, radius, cuisine, results, search_log, shared)
+
+async def get_restaurant_details_async(restaurants, max_photos=3, tier='full'):
+    """get_restaurant_details for the event loop; restaurants are updated in place"""
+    google_api_key = os.getenv('GOOGLE_API_KEY')
+    if not google_api_key:
+        print("❌ No Google API key available for details")
+        return restaurants
+
+    print(f"📸 Fetching {tier} details for {len(restaurants)} restaurants...")
+    to_enrich = select_details_targets(restaurants)
+    if to_enrich and deadline_expired():
+        print("⏱️ Deadline reached, skipping details")
+        mark_partial()
+        return restaurants
+    limit = asyncio.Semaphore(DETAILS_MAX_WORKERS)
+
+    async def enrich(restaurant):
+        try:
+            result = await asyncio.to_thread(get_cached_details, restaurant['id'], google_api_key, tier)
+            if result is None:
+                async with limit:
+                    result = await fetch_details_async(restaurant['id'], google_api_key,
+                                                       timeout=DETAILS_TIMEOUT_SECONDS, tier=tier)
+            if result:
+                restaurant.update(format_place_details(result, max_photos, tier))
+                return
+        except Exception as e:
+            print(f"❌ Error getting details for {restaurant.get('name', 'Unknown')}: {str(e)}")
+        restaurant['photos'] = []
+        restaurant['reviews'] = []
+
+    await asyncio.gather(*(enrich(r) for r in to_enrich))
+    return restaurants
+
+async def restaurants(body):
+    try:
+        page_size = get_page_size(body.get('page_size'))
+        details_tier = get_details_tier(body.get('details'))
+
+        # Later pages come from the retained result set, not a new search
+        if body.get('cursor'):
+            loaded = await asyncio.to_thread(load_search_page, body['cursor'], page_size)
+            if loaded is None:
+                return {'error': RESULTS_EXPIRED_MESSAGE}, 410
+        else:
+            location, filters, error = validate_search_body(body)
+            if error:
+                return {'error': error}, 400
+
+        # The task's context carries the deadline into every upstream call
+        with request_deadline() as deadline:
+            if body.get('cursor'):
+                page, summary = loaded
+            else:
+                results, search_log = await search_google_places_async(location, filters)
+                results, search_log = add_manual_restaurants(results, search_log, location, filters)
+                page, summary = await asyncio.to_thread(paginate_search_results, results, search_log, filters, page_size)
+
+            if details_tier:
+                page = await get_restaurant_details_async(page, tier=details_tier)
+        return dict(summary, results=page, partial=deadline.partial, degraded=deadline.degraded), 200
+
+    except Exception as e:
+        print(f"❌ Error in restaurant search: {str(e)}")
+        return {'error': f'Search failed: {str(e)}'}, 500
+
+async def geocode(body):
+    try:
+        query, lat, lng, reverse = parse_geocode_body(body)
+
+        if not query and not reverse:
+            return {'error': 'Query is required'}, 400
+
+        cached = await asyncio.to_thread(load_cached_geocode, query, lat, lng, reverse)
+        if cached is not None:
+            return cached, 200
+
+        google_api_key = os.getenv('GOOGLE_API_KEY')
+        if not google_api_key:
+            return {
+                'error': 'Google Geocoding API is not configured. Please set GOOGLE_API_KEY environment variable.',
+                'suggestion': GEOCODE_SUGGESTION
+            }, 400
+
+        params = get_geocode_params(query, lat, lng, reverse, google_api_key)
+        data = await fetch_json_async(GEOCODE_URL, params=params, timeout=10, hedge=True)
+        # Saves the answer to the geocode cache
+        return await asyncio.to_thread(format_geocode_response, data, query, lat, lng, reverse)
+
+    except (QuotaExceeded, CircuitOpen) as e:
+        print(f"🪫 Geocoding deferred: {str(e)}")
+        return {
+            'error': 'Geocoding is busy, please try again in a moment.',
+            'suggestion': GEOCODE_SUGGESTION
+        }, 503, {'Retry-After': '5'}
+    except Exception as e:
+        print(f"❌ Geocoding error: {str(e)}")
+        return {
+            'error': f'Geocoding failed: {str(e)}',
+            'suggestion': GEOCODE_SUGGESTION
+        }, 400
+
+async def search_restaurant_by_name(body):
+    try:
+        restaurant_name = body.get('name', '').strip()
+        location = body.get('location')
+
+        if not restaurant_name:
+            return {'error': 'Restaurant name is required'}, 400
+
+        if not location:
+            return {'error': 'Location is required'}, 400
+
+        google_api_key = os.getenv('GOOGLE_API_KEY')
+        if not google_api_key:
+            return {'error': 'Google API key not configured'}, 400
+
+        print(f"🔍 Searching for restaurant: {restaurant_name}")
+        data = await fetch_json_async(TEXT_SEARCH_URL, params=get_name_search_params(restaurant_name, location, google_api_key),
+                                      timeout=10)
+        return format_name_search_response(data, restaurant_name, location)
+
+    except Exception as e:
+        print(f"❌ Error in restaurant name search: {str(e)}")
+        return {'error': f'Search failed: {str(e)}'}, 500
+
+# Routes served on the loop; everything else goes to the Flask app
+ROUTES = {
+    ('POST', '/restaurants'): restaurants,
+    ('POST', '/geocode'): geocode,
+    ('POST', '/search-restaurant'): search_restaurant_by_name,
+}
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+async def read_json(receive):
+    """Read the whole request body and decode it, or return None"""
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    try:
+        return json.loads(b''.join(chunks) or b'null')
+    except ValueError:
+        return None
+
+async def send_json(send, body, status=200, headers=None):
+    # Flask's JSON provider keeps responses identical to the WSGI routes
+    payload = flask_app.json.dumps(body).encode()
+    raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]
+    raw_headers += [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': payload})
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            print("🚀 ASGI event loop started")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_async_session()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    handler = ROUTES.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+    if handler is None:
+        return await wsgi_app(scope, receive, send)
+
+    body = await read_json(receive)
+    if not isinstance(body, dict):
+        return await send_json(send, {'error': 'Invalid JSON data'}, 400)
+    await send_json(send, *(await handler(body)))
@@ -0,0 +1,342 @@
+# Local stand-in for the Google Maps web services the app calls: nearby
+# search, text search, place details, geocoding and place photos, served over
+# a synthetic city. Point the app at it with
+#
+#   python benchmarks/places_stub.py --port 8765 --places 2000
+#   GOOGLE_MAPS_BASE_URL=http://127.0.0.1:8765/maps/api GOOGLE_API_KEY=benchmark python app.py
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from urllib.parse import parse_qs, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Default city: central Singapore, which the app's geocoding is scoped to
+CITY_CENTER = (1.3521, 103.8198)
+CITY_RADIUS_METERS = 12000
+
+# Median latency in milliseconds per endpoint class; calls are drawn from a
+# lognormal around it, which gives the long tail real upstream calls show
+STUB_LATENCY_MS = {
+    'nearby': 180,
+    'text': 250,
+    'details': 120,
+    'geocode': 90,
+    'photo': 150,
+}
+STUB_LATENCY_SIGMA = 0.5
+
+# Google answers 20 results per page and at most 60 per query
+PAGE_SIZE = 20
+MAX_RESULTS = 60
+
+# A next_page_token answers INVALID_REQUEST until it has matured
+PAGE_TOKEN_DELAY_SECONDS = 1.5
+PAGE_TOKEN_TTL_SECONDS = 120
+
+CUISINE_WORDS = {
+    'japanese': ['Sushi', 'Ramen', 'Izakaya', 'Japanese'],
+    'chinese': ['Dim Sum', 'Cantonese', 'Szechuan', 'Chinese'],
+    'italian': ['Pizza', 'Trattoria', 'Pasta', 'Italian'],
+    'indian': ['Curry', 'Tandoori', 'Biryani', 'Indian'],
+    'thai': ['Thai', 'Tom Yum'],
+    'korean': ['Korean BBQ', 'Bibimbap', 'Korean'],
+    'mexican': ['Taco', 'Burrito', 'Mexican'],
+    'american': ['Burger', 'Steak', 'Diner'],
+    'french': ['Bistro', 'Brasserie', 'French'],
+    'seafood': ['Seafood', 'Crab', 'Oyster'],
+    'vietnamese': ['Pho', 'Banh Mi', 'Vietnamese'],
+    'dessert': ['Bakery', 'Dessert', 'Ice Cream'],
+}
+NAME_WORDS = ['Golden', 'Jade', 'Lucky', 'Little', 'Royal', 'Old Town', 'Harbour', 'Garden', 'Red Lantern',
+              'Blue Door', 'Corner', 'Happy', 'Silver', 'Bamboo', 'Sunrise', 'Orchid', 'Lotus', 'Family']
+NAME_SUFFIXES = ['Kitchen', 'House', 'Bar', 'Eatery', 'Place', 'Restaurant', 'Cafe', 'Express']
+CHAINS = ["McDonald's", 'KFC', 'Subway', 'Pizza Hut', "Domino's", 'Burger King',
+          'Starbucks', "Dunkin'", 'Taco Bell', "Wendy's", 'Popeyes', 'Chick-fil-A']
+NEIGHBORHOODS = ['Riverside', 'Harbourfront', 'Old Market', 'Hillview', 'Garden Bay', 'Civic Centre',
+                 'East Coast', 'Westgate', 'North Point', 'Lakeside', 'Airport Park', 'Pearl Hill',
+                 'Canal Quarter', 'Tanjong Heights', 'Palm Grove', 'Marina South']
+
+# Generic text search terms that match every food place
+GENERIC_TERMS = {'restaurants near me', 'restaurant', 'restaurants', 'food places', 'dining', 'eat', 'food'}
+
+def distance_meters(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 6371000 * 2 * math.asin(math.sqrt(a))
+
+def offset(lat, lng, north_m, east_m):
+    return lat + north_m / 111320, lng + east_m / (111320 * math.cos(math.radians(lat)))
+
+class SyntheticCity:
+    """A seeded city of restaurants clustered around named neighborhoods"""
+
+    def __init__(self, places=2000, seed=7, center=CITY_CENTER, radius=CITY_RADIUS_METERS):
+        rng = random.Random(seed)
+        self.center = center
+        self.neighborhoods = []
+        for name in NEIGHBORHOODS:
+            angle, reach = rng.uniform(0, 2 * math.pi), radius * math.sqrt(rng.random())
+            lat, lng = offset(center[0], center[1], reach * math.cos(angle), reach * math.sin(angle))
+            self.neighborhoods.append({'name': name, 'lat': lat, 'lng': lng})
+
+        self.places = [self._make_place(rng, i) for i in range(places)]
+        self.by_id = {place['place_id']: place for place in self.places}
+
+    def _make_place(self, rng, index):
+        hood = rng.choice(self.neighborhoods)
+        lat, lng = offset(hood['lat'], hood['lng'], rng.gauss(0, 900), rng.gauss(0, 900))
+        if rng.random() < 0.08:
+            name, cuisine = rng.choice(CHAINS), 'american'
+        else:
+            cuisine = rng.choice(list(CUISINE_WORDS))
+            name = f"{rng.choice(NAME_WORDS)} {rng.choice(CUISINE_WORDS[cuisine])} {rng.choice(NAME_SUFFIXES)}"
+        types = ['restaurant', 'food', 'point_of_interest', 'establishment']
+        if 'Cafe' in name or rng.random() < 0.15:
+            types.insert(1, 'cafe')
+        place_id = f"stub_{index:06d}"
+        return {
+            'place_id': place_id,
+            'name': name,
+            'cuisine': cuisine,
+            'vicinity': f"{rng.randint(1, 300)} {hood['name']} Road",
+            'formatted_address': f"{rng.randint(1, 300)} {hood['name']} Road, Singapore {rng.randint(100000, 829999)}",
+            'geometry': {'location': {'lat': round(lat, 7), 'lng': round(lng, 7)}},
+            'rating': round(min(5.0, max(2.5, rng.gauss(4.1, 0.4))), 1),
+            'user_ratings_total': int(rng.lognormvariate(5, 1.3)),
+            'price_level': rng.choice([1, 1, 2, 2, 2, 3, 4]),
+            'opening_hours': {'open_now': rng.random() < 0.75},
+            'business_status': 'OPERATIONAL',
+            'types': types,
+            'photos': [{'photo_reference': f"{place_id}_p{n}", 'width': 1600, 'height': 1200}
+                       for n in range(rng.randint(0, 5))],
+        }
+
+    def within(self, lat, lng, radius):
+        """Places within radius meters of a point, most prominent first"""
+        found = [p for p in self.places if distance_meters(
+            lat, lng, p['geometry']['location']['lat'], p['geometry']['location']['lng']) <= radius]
+        return sorted(found, key=lambda p: -p['user_ratings_total'])
+
+    def nearby(self, lat, lng, radius, place_type=None, keyword=None):
+        places = self.within(lat, lng, min(radius, 50000))
+        if place_type and place_type != 'restaurant':
+            places = [p for p in places if place_type in p['types']]
+        if keyword:
+            places = [p for p in places if self._matches(p, keyword.lower())]
+        return places
+
+    def text(self, query, lat=None, lng=None, radius=5000):
+        """Text search: the query's term, biased to (but not limited by) the radius"""
+        term = query.lower().split(' near ')[0].strip()
+        for suffix in (' food', ' restaurant'):
+            if term.endswith(suffix) and term != suffix.strip():
+                term = term[:-len(suffix)]
+        places = self.within(lat, lng, radius * 2) if lat is not None else self.places
+        if term not in GENERIC_TERMS:
+            places = [p for p in places if self._matches(p, term)]
+        return places
+
+    @staticmethod
+    def _matches(place, term):
+        return term in place['name'].lower() or term == place['cuisine'] or term in place['types']
+
+    def geocode(self, address):
+        address = address.lower()
+        return [hood for hood in self.neighborhoods if hood['name'].lower() in address or address in hood['name'].lower()]
+
+    def reverse_geocode(self, lat, lng):
+        return sorted(self.neighborhoods, key=lambda h: distance_meters(lat, lng, h['lat'], h['lng']))[:1]
+
+def listing(place):
+    """A place as search endpoints return it, without stub-only fields"""
+    return {key: value for key, value in place.items() if key not in ('cuisine', 'formatted_address')}
+
+def details(place):
+    result = dict(listing(place), formatted_address=place['formatted_address'])
+    result.update({
+        'url': f"https://maps.google.com/?cid={place['place_id']}",
+        'website': f"https://example.com/{place['place_id']}",
+        'formatted_phone_number': '6123 4567',
+        'editorial_summary': {'overview': f"{place['cuisine'].capitalize()} food in a relaxed setting."},
+        'opening_hours': dict(place['opening_hours'],
+                              weekday_text=[f"{day}: 11:00 AM – 10:00 PM" for day in
+                                            ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+                                             'Saturday', 'Sunday')]),
+        'reviews': [{'author_name': 'A. Diner', 'rating': 5, 'text': 'Lovely food.',
+                     'relative_time_description': 'a month ago'}],
+    })
+    return result
+
+class PlacesStub:
+    """Answers Google Maps web service requests from a SyntheticCity.
+
+    Every call sleeps for a lognormal latency around its endpoint's median
+    (scaled by latency_scale) and fails with probability error_rate, as an
+    HTTP 500 or an UNKNOWN_ERROR status. Calls are counted per endpoint.
+    """
+
+    def __init__(self, city, latency_scale=1.0, error_rate=0.0, token_delay=PAGE_TOKEN_DELAY_SECONDS, seed=7):
+        self.city = city
+        self.latency_scale = latency_scale
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = {}
+        self.calls = {name: 0 for name in STUB_LATENCY_MS}
+        self.errors = 0
+
+    def stats(self):
+        with self.lock:
+            return {'calls': dict(self.calls), 'total_calls': sum(self.calls.values()), 'errors': self.errors}
+
+    def _delay(self, endpoint):
+        with self.lock:
+            self.calls[endpoint] += 1
+            latency = self.rng.lognormvariate(math.log(STUB_LATENCY_MS[endpoint] / 1000), STUB_LATENCY_SIGMA)
+            failed = self.rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(latency * self.latency_scale)
+        return failed and self.rng.choice(['http', 'status'])
+
+    def _page(self, places):
+        """First page of a result list, parking the rest behind a page token"""
+        places = places[:MAX_RESULTS]
+        data = {'status': 'OK' if places else 'ZERO_RESULTS', 'results': [listing(p) for p in places[:PAGE_SIZE]]}
+        if len(places) > PAGE_SIZE:
+            token = f"tok{self.rng.getrandbits(64):016x}"
+            with self.lock:
+                self.tokens[token] = (places[PAGE_SIZE:], time.monotonic())
+            data['next_page_token'] = token
+        return data
+
+    def _next_page(self, token):
+        with self.lock:
+            entry = self.tokens.get(token)
+        if entry is None:
+            return {'status': 'INVALID_REQUEST', 'results': []}
+        places, issued_at = entry
+        age = time.monotonic() - issued_at
+        if age < self.token_delay or age > PAGE_TOKEN_TTL_SECONDS:
+            return {'status': 'INVALID_REQUEST', 'results': []}
+        with self.lock:
+            self.tokens.pop(token, None)
+        return self._page(places)
+
+    def handle(self, path, params):
+        """Return (http_status, content_type, body) for a request path and its query parameters"""
+        endpoint = next((name for fragment, name in (('nearbysearch', 'nearby'), ('textsearch', 'text'),
+                                                     ('details', 'details'), ('photo', 'photo'),
+                                                     ('geocode', 'geocode')) if fragment in path), None)
+        if endpoint is None:
+            return 404, 'application/json', {'status': 'NOT_FOUND'}
+        failure = self._delay(endpoint)
+        if failure == 'http':
+            return 500, 'text/html', b'<html>Server Error</html>'
+        if not params.get('key'):
+            return 200, 'application/json', {'status': 'REQUEST_DENIED', 'error_message': 'The provided API key is invalid.'}
+        if failure == 'status':
+            return 200, 'application/json', {'status': 'UNKNOWN_ERROR', 'results': []}
+        if endpoint == 'photo':
+            return self._photo(params)
+        return 200, 'application/json', getattr(self, f"_{endpoint}")(params)
+
+    def _location(self, params):
+        lat, lng = (float(v) for v in params['location'].split(','))
+        return lat, lng
+
+    def _nearby(self, params):
+        if params.get('pagetoken'):
+            return self._next_page(params['pagetoken'])
+        lat, lng = self._location(params)
+        return self._page(self.city.nearby(lat, lng, float(params.get('radius', 1500)),
+                                           params.get('type'), params.get('keyword')))
+
+    def _text(self, params):
+        if params.get('pagetoken'):
+            return self._next_page(params['pagetoken'])
+        lat, lng = self._location(params) if params.get('location') else (None, None)
+        return self._page(self.city.text(params.get('query', ''), lat, lng, float(params.get('radius', 5000))))
+
+    def _details(self, params):
+        place = self.city.by_id.get(params.get('place_id'))
+        if place is None:
+            return {'status': 'NOT_FOUND'}
+        return {'status': 'OK', 'result': details(place)}
+
+    def _geocode(self, params):
+        if params.get('latlng'):
+            hoods = self.city.reverse_geocode(*(float(v) for v in params['latlng'].split(',')))
+        else:
+            hoods = self.city.geocode(params.get('address', ''))
+        results = [{'formatted_address': f"{h['name']}, Singapore",
+                    'geometry': {'location': {'lat': h['lat'], 'lng': h['lng']}}} for h in hoods]
+        return {'status': 'OK' if results else 'ZERO_RESULTS', 'results': results}
+
+    def _photo(self, params):
+        reference = params.get('photo_reference', '')
+        width = int(params.get('maxwidth') or params.get('maxheight') or 400)
+        # Deterministic filler bytes, sized roughly like a JPEG of that width
+        body = (reference.encode() * (width * 40 // max(1, len(reference)) + 1))[:width * 40]
+        return 200, 'image/jpeg', b'\xff\xd8\xff\xe0' + body
+
+    def serve(self, host='127.0.0.1', port=0):
+        """Start serving on a daemon thread; return the server (server_address has the port)"""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                if url.path == '/stats':
+                    status, content_type, body = 200, 'application/json', stub.stats()
+                else:
+                    status, content_type, body = stub.handle(url.path, params)
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+def add_stub_arguments(parser):
+    parser.add_argument('--places', type=int, default=2000, help='restaurants in the synthetic city')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--latency-scale', type=float, default=1.0, help='multiplier on every upstream latency')
+    parser.add_argument('--error-rate', type=float, default=0.01, help='share of upstream calls that fail')
+    parser.add_argument('--token-delay', type=float, default=PAGE_TOKEN_DELAY_SECONDS,
+                        help='seconds before a page token becomes valid')
+
+def build_stub(args):
+    city = SyntheticCity(places=args.places, seed=args.seed)
+    return PlacesStub(city, latency_scale=args.latency_scale, error_rate=args.error_rate,
+                      token_delay=args.token_delay, seed=args.seed)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the Google Places APIs')
+    parser.add_argument('--port', type=int, default=8765)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server = build_stub(args).serve(port=args.port)
+    print(f"🏙️ Serving {args.places} synthetic places on http://127.0.0.1:{args.port}/maps/api")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
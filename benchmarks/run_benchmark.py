@@ -0,0 +1,267 @@
+# Benchmark the search routes against the local Google Places stand-in, so
+# latency and upstream call counts can be measured without spending quota:
+#
+#   python benchmarks/run_benchmark.py --searches 20 --save-baseline benchmarks/baseline.json
+#   python benchmarks/run_benchmark.py --searches 20 --baseline benchmarks/baseline.json
+#
+# By default the Flask app runs in this process with its caches in a
+# temporary directory. --target benchmarks a running server instead, which
+# must be started with GOOGLE_MAPS_BASE_URL=http://127.0.0.1:<stub-port>/maps/api.
+# A remote server keeps what it learned in memory (planner yields, quota
+# buckets, breaker windows, page-token delay) across /cache/clear, so with
+# --target only the first cold session is truly cold; restart the server and
+# run --scenarios cold with --searches 1 per run for clean cold numbers.
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import urllib.error
+import urllib.request
+from places_stub import CUISINE_WORDS, add_stub_arguments, build_stub, offset
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Routes reported, in the order a user session hits them
+ROUTES = ('geocode', 'restaurants', 'photo', 'search-restaurant')
+
+# A metric regresses when it moves the wrong way by more than the tolerance
+# and by more than its noise floor
+BASELINE_TOLERANCE = 0.10
+COMPARED_METRICS = {
+    'p50_ms': ('lower', 5.0),
+    'p95_ms': ('lower', 5.0),
+    'p99_ms': ('lower', 5.0),
+    'upstream_calls_per_request': ('lower', 0.5),
+    'cache_hit_ratio': ('higher', 0.05),
+}
+
+# Settings that must match for a baseline comparison to mean anything
+BASELINE_CONFIG = ('places', 'seed', 'latency_scale', 'error_rate', 'token_delay', 'searches', 'photos')
+
+class InProcessTarget:
+    """The Flask app in this process, driven through its test client"""
+
+    def __init__(self, stub_url, workdir):
+        os.environ['GOOGLE_MAPS_BASE_URL'] = stub_url
+        os.environ.setdefault('GOOGLE_API_KEY', 'benchmark-key')
+        os.environ['CACHE_DB_PATH'] = os.path.join(workdir, 'cache.db')
+        os.environ['PHOTO_CACHE_DIR'] = os.path.join(workdir, 'photos')
+        sys.path.insert(0, REPO_ROOT)
+        from app import app
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+    def reset(self):
+        """Clear the caches and forget what the app learned, as if the process had just started"""
+        from api import breaker, page_tokens, quota
+        from query_planner import yield_tracker
+        self.request('POST', '/cache/clear')
+        with yield_tracker.lock:
+            yield_tracker.tables.clear()
+        quota.upstream_quota.__init__()
+        page_tokens.page_tokens.__init__()
+        with breaker._lock:
+            breaker._breakers.clear()
+
+class HttpTarget:
+    """A running server, driven over HTTP"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=120) as response:
+                status, content_type, payload = response.status, response.headers.get('Content-Type', ''), response.read()
+        except urllib.error.HTTPError as e:
+            status, content_type, payload = e.code, e.headers.get('Content-Type', ''), e.read()
+        return status, json.loads(payload) if 'json' in content_type else None
+
+    def reset(self):
+        """Clear the server's caches; its in-memory state needs a restart to clear"""
+        self.request('POST', '/cache/clear')
+
+def build_workload(city, sessions, seed):
+    """One user session per search: geocode an area, search near it, look a place up by name"""
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(sessions):
+        hood = rng.choice(city.neighborhoods)
+        lat, lng = offset(hood['lat'], hood['lng'], rng.gauss(0, 400), rng.gauss(0, 400))
+        filters = {'radius': rng.choice([1000, 2000, 3000])}
+        if rng.random() < 0.4:
+            filters['cuisine'] = rng.choice(list(CUISINE_WORDS))
+        if rng.random() < 0.3:
+            filters['min_rating'] = 4
+        place = rng.choice(city.places)
+        workload.append({
+            'geocode': {'lat': lat, 'lng': lng} if rng.random() < 0.2 else {'query': hood['name']},
+            'restaurants': {'location': {'lat': lat, 'lng': lng}, 'filters': filters},
+            'search-restaurant': {'name': place['name'], 'location': place['geometry']['location']},
+        })
+    return workload
+
+def timed(target, stub, samples, route, method, path, body=None):
+    """Send one request and record its latency and the upstream calls it caused"""
+    before = stub.stats()['calls']
+    started = time.perf_counter()
+    status, data = target.request(method, path, body)
+    elapsed = time.perf_counter() - started
+    after = stub.stats()['calls']
+    if samples is not None:
+        samples[route].append({
+            'ms': elapsed * 1000,
+            'ok': status == 200,
+            'calls': {endpoint: after[endpoint] - before[endpoint] for endpoint in after},
+        })
+    return data
+
+def run_session(target, stub, session, photos, samples):
+    timed(target, stub, samples, 'geocode', 'POST', '/geocode', session['geocode'])
+    data = timed(target, stub, samples, 'restaurants', 'POST', '/restaurants', session['restaurants']) or {}
+    photo_urls = [photo['url'] for r in data.get('results', []) for photo in r.get('photos', [])]
+    for url in photo_urls[:photos]:
+        timed(target, stub, samples, 'photo', 'GET', url)
+    timed(target, stub, samples, 'search-restaurant', 'POST', '/search-restaurant', session['search-restaurant'])
+
+def run_scenario(target, stub, workload, photos, warm):
+    """Cold: every session starts from a freshly reset app. Warm: sessions are replayed after a priming pass."""
+    samples = {route: [] for route in ROUTES}
+    target.reset()
+    if warm:
+        for session in workload:
+            run_session(target, stub, session, photos, None)
+    for session in workload:
+        if not warm:
+            target.reset()
+        run_session(target, stub, session, photos, samples)
+    return {route: summarize(route_samples) for route, route_samples in samples.items() if route_samples}
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted values"""
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def summarize(samples):
+    latencies = sorted(sample['ms'] for sample in samples)
+    totals = [sum(sample['calls'].values()) for sample in samples]
+    endpoints = samples[0]['calls']
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not sample['ok']),
+        'p50_ms': round(percentile(latencies, 0.50), 1),
+        'p95_ms': round(percentile(latencies, 0.95), 1),
+        'p99_ms': round(percentile(latencies, 0.99), 1),
+        'upstream_calls_per_request': round(sum(totals) / len(samples), 2),
+        # A request counts as a cache hit when it caused no upstream call
+        'cache_hit_ratio': round(sum(1 for total in totals if total == 0) / len(samples), 3),
+        'upstream_calls_by_endpoint': {
+            endpoint: round(sum(sample['calls'][endpoint] for sample in samples) / len(samples), 2)
+            for endpoint in endpoints
+            if any(sample['calls'][endpoint] for sample in samples)
+        },
+    }
+
+def print_report(results):
+    print(f"\n{'scenario':<9}{'route':<19}{'n':>4}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'calls/req':>11}{'hit ratio':>11}{'errors':>8}")
+    for scenario, routes in results.items():
+        for route, m in routes.items():
+            print(f"{scenario:<9}{route:<19}{m['requests']:>4}{m['p50_ms']:>10.1f}{m['p95_ms']:>10.1f}"
+                  f"{m['p99_ms']:>10.1f}{m['upstream_calls_per_request']:>11.2f}{m['cache_hit_ratio']:>11.3f}"
+                  f"{m['errors']:>8}")
+
+def compare(results, baseline, tolerance):
+    """Print each metric against the baseline; return the number of regressions"""
+    mismatched = [key for key in BASELINE_CONFIG if baseline['config'].get(key) != results['config'].get(key)]
+    if mismatched:
+        print(f"⚠️ Baseline was recorded with different settings: {', '.join(mismatched)}")
+
+    regressions = 0
+    print(f"\nCompared with baseline from {baseline['recorded_at']} (tolerance {tolerance:.0%}):")
+    for scenario, routes in results['results'].items():
+        for route, metrics in routes.items():
+            base = baseline['results'].get(scenario, {}).get(route)
+            if base is None:
+                continue
+            for metric, (better, noise) in COMPARED_METRICS.items():
+                old, new = base[metric], metrics[metric]
+                delta = new - old if better == 'lower' else old - new
+                regressed = delta > noise and delta > abs(old) * tolerance
+                regressions += regressed
+                change = f"{(new - old) / old:+.0%}" if old else 'n/a'
+                mark = '⚠️ regression' if regressed else ''
+                print(f"  {scenario:<6} {route:<18} {metric:<27} {old:>9} → {new:<9} {change:>6} {mark}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /restaurants, /geocode and /search-restaurant '
+                                                 'against a local Google Places stand-in')
+    add_stub_arguments(parser)
+    parser.add_argument('--searches', type=int, default=20, help='user sessions per scenario')
+    parser.add_argument('--photos', type=int, default=2, help='result photos fetched per search')
+    parser.add_argument('--scenarios', default='cold,warm', help='comma-separated: cold, warm')
+    parser.add_argument('--target', help='base URL of a running server instead of the in-process app')
+    parser.add_argument('--stub-port', type=int, default=0, help='port for the stand-in (fix it with --target)')
+    parser.add_argument('--save-baseline', metavar='PATH', help='write the results as a baseline')
+    parser.add_argument('--baseline', metavar='PATH', help='compare against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=BASELINE_TOLERANCE)
+    args = parser.parse_args()
+
+    stub = build_stub(args)
+    server = stub.serve(port=args.stub_port)
+    stub_url = f"http://127.0.0.1:{server.server_address[1]}/maps/api"
+    print(f"🏙️ Places stand-in with {args.places} places on {stub_url}")
+
+    workdir = None
+    if args.target:
+        print(f"🎯 Benchmarking {args.target}; it must run with GOOGLE_MAPS_BASE_URL={stub_url}")
+        target = HttpTarget(args.target)
+        if 'cold' in args.scenarios.split(',') and args.searches > 1:
+            print("⚠️ Only the first cold session is fully cold against --target; "
+                  "restart the server between runs of --searches 1 for clean cold numbers")
+    else:
+        workdir = tempfile.mkdtemp(prefix='restaurant-bench-')
+        target = InProcessTarget(stub_url, workdir)
+
+    workload = build_workload(stub.city, args.searches, args.seed)
+    results = {
+        'recorded_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'config': {key: getattr(args, key) for key in BASELINE_CONFIG},
+        'results': {},
+    }
+    for scenario in args.scenarios.split(','):
+        print(f"⏱️ Running {scenario} scenario ({args.searches} sessions)...")
+        results['results'][scenario] = run_scenario(target, stub, workload, args.photos, warm=scenario == 'warm')
+    results['upstream'] = stub.stats()
+
+    print_report(results['results'])
+    print(f"\nUpstream calls: {results['upstream']['total_calls']} "
+          f"({results['upstream']['errors']} injected errors) {results['upstream']['calls']}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Baseline saved to {args.save_baseline}")
+
+    regressions = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print(f"\n{'⚠️' if regressions else '✅'} {regressions} regressions")
+    server.shutdown()
+    if workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
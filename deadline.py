@@ -0,0 +1,81 @@
+import os
+import time
+import contextvars
+from contextlib import contextmanager
+
+# Time budget for one search request, well inside the 120s worker timeout so
+# the user gets whatever was found instead of a killed worker
+SEARCH_DEADLINE_SECONDS = float(os.getenv('SEARCH_DEADLINE_SECONDS', 25))
+
+# Upstream calls are not started with less than this much budget left
+DEADLINE_MIN_CALL_SECONDS = 0.25
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+class DeadlineExceeded(Exception):
+    """Raised instead of starting an upstream call once the budget is spent"""
+
+class Deadline:
+    """Absolute time by which a request must answer.
+
+    partial is set by whichever layer cuts work short, so the route can flag
+    the response. degraded flags results left incomplete by skipped, failed or
+    budget-trimmed upstream calls rather than by the clock.
+    """
+
+    def __init__(self, seconds=SEARCH_DEADLINE_SECONDS):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.partial = False
+        self.degraded = False
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() < DEADLINE_MIN_CALL_SECONDS
+
+    def timeout(self, timeout):
+        """Clamp an upstream timeout to the budget left; raise once it is spent"""
+        if self.expired():
+            self.partial = True
+            raise DeadlineExceeded(f"Request deadline of {self.seconds:g}s reached")
+        return min(timeout, self.remaining())
+
+@contextmanager
+def request_deadline(deadline=None):
+    """Run the enclosed work under a deadline (a new SEARCH_DEADLINE_SECONDS one by default).
+
+    The deadline lives in a context variable, so it follows the work into
+    fan_out worker threads and asyncio tasks.
+    """
+    deadline = deadline or Deadline()
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+def get_deadline():
+    return _deadline.get()
+
+def clamp_timeout(timeout):
+    """Upstream timeout for the current request; raises DeadlineExceeded when none is left"""
+    deadline = _deadline.get()
+    return timeout if deadline is None else deadline.timeout(timeout)
+
+def deadline_expired():
+    deadline = _deadline.get()
+    return deadline is not None and deadline.expired()
+
+def mark_partial():
+    """Flag the current request's results as cut short by its deadline"""
+    deadline = _deadline.get()
+    if deadline is not None:
+        deadline.partial = True
+
+def mark_degraded():
+    """Flag the current request's results as missing upstream answers"""
+    deadline = _deadline.get()
+    if deadline is not None:
+        deadline.degraded = True
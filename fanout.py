@@ -0,0 +1,41 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+DEFAULT_MAX_WORKERS = 6
+
+def fan_out(tasks, worker, max_workers=DEFAULT_MAX_WORKERS):
+    """Run worker(task) for every task on a bounded thread pool.
+
+    Yields (task, result, error) tuples in task order. A result is yielded as
+    soon as it and every task before it have finished, so callers can merge
+    incrementally while the merged output stays the same no matter which
+    call returns first. Closing the generator early cancels pending tasks.
+    Each task runs in a copy of the caller's context, so context variables
+    such as the upstream priority carry over to the worker threads.
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks))))
+    futures = {executor.submit(contextvars.copy_context().run, worker, task): index
+               for index, task in enumerate(tasks)}
+    finished = {}
+    next_index = 0
+
+    try:
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished[futures[future]] = future
+
+            # Release the contiguous prefix of finished tasks in plan order
+            while next_index in finished:
+                future = finished.pop(next_index)
+                error = future.exception()
+                result = None if error else future.result()
+                yield tasks[next_index], result, error
+                next_index += 1
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
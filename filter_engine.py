@@ -0,0 +1,117 @@
+import numpy as np
+from place_tags import get_tag_mask, get_tags, search_text
+
+class CandidateTable:
+    """Columnar view of a list of place dicts.
+
+    Each attribute the filters look at is held in its own NumPy array, so a
+    predicate is evaluated for every place at once instead of per dict.
+    Missing numbers become NaN and open_now is stored as 1/0/-1 (unknown).
+    Cuisine and dietary tags come from the bitset each place carries from
+    ingest; the lowercased text column is only built if a filter term is
+    not a known tag.
+    """
+
+    def __init__(self, places):
+        self.places = list(places)
+        self.size = len(self.places)
+        self.rating = np.array([_number(p.get('rating')) for p in self.places], dtype=float)
+        self.distance = np.array([_number(p.get('distance')) for p in self.places], dtype=float)
+        self.price_level = np.array([_number(p.get('price_level')) for p in self.places], dtype=float)
+        self.open_now = np.array([_tristate(p.get('open_now')) for p in self.places], dtype=np.int8)
+        self.tags = np.array([get_tags(p) for p in self.places], dtype=np.int64)
+        self._text = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = np.array([search_text(p) for p in self.places], dtype=str)
+        return self._text
+
+    def match_terms(self, terms):
+        """Mask of places matching any term, by tag bit where the term is a known tag"""
+        tag_mask = 0
+        unknown = []
+        for term in terms:
+            bit = get_tag_mask(term)
+            if bit is None:
+                unknown.append(term)
+            else:
+                tag_mask |= bit
+        mask = (self.tags & tag_mask) != 0
+        if unknown:
+            mask |= self.match_any(unknown)
+        return mask
+
+    def match_any(self, keywords):
+        """Mask of places whose name or any type contains one of the keywords"""
+        mask = np.zeros(self.size, dtype=bool)
+        for keyword in keywords:
+            mask |= np.char.find(self.text, keyword.lower()) >= 0
+        return mask
+
+def _number(value):
+    return np.nan if value is None else float(value)
+
+def _tristate(value):
+    if value is None:
+        return -1
+    return 1 if value else 0
+
+def filter_candidates(places, radius=None, min_rating=0, open_now=False, cuisine=None,
+                      dietary_terms=None, price_level=None, lenient=False, sort_by_rating=False,
+                      literal=False):
+    """Filter places with every predicate evaluated as one vectorized mask.
+
+    With lenient=False a place missing a filtered attribute is dropped (an
+    unknown distance is outside the radius, unknown open_now is not open).
+    With lenient=True missing distance, price or open_now pass their filter.
+    A missing rating always counts as 0. cuisine and dietary_terms are matched
+    against the places' tag bitsets, falling back to a substring scan of name
+    and types for terms outside the tag vocabulary. With literal=True every
+    term is only scanned for as written, without its tag's keywords.
+
+    Returns (filtered places, stages) where stages lists (name, before, after)
+    counts for each filter that was applied, in order.
+    """
+    table = places if isinstance(places, CandidateTable) else CandidateTable(places)
+    mask = np.ones(table.size, dtype=bool)
+    stages = []
+
+    def apply(name, stage_mask):
+        before = int(np.count_nonzero(mask))
+        mask[:] &= stage_mask
+        stages.append((name, before, int(np.count_nonzero(mask))))
+
+    rating = np.nan_to_num(table.rating, nan=0.0)
+
+    with np.errstate(invalid='ignore'):
+        if radius is not None:
+            within = table.distance <= radius
+            apply('Distance', within | np.isnan(table.distance) if lenient else within)
+
+        if min_rating and min_rating > 0:
+            apply('Rating', rating >= min_rating)
+
+        if open_now:
+            apply('Open now', table.open_now != 0 if lenient else table.open_now == 1)
+
+        match = table.match_any if literal else table.match_terms
+        if cuisine:
+            apply('Cuisine', match([cuisine]))
+
+        if dietary_terms:
+            apply('Dietary', match(dietary_terms))
+
+        if price_level is not None:
+            same_price = table.price_level == price_level
+            apply('Price', same_price | np.isnan(table.price_level) if lenient else same_price)
+
+    indices = np.flatnonzero(mask)
+
+    if sort_by_rating:
+        # Rating desc, then distance asc; lexsort is stable like list.sort
+        distance = np.where(np.isnan(table.distance), np.inf, table.distance)
+        indices = indices[np.lexsort((distance[indices], -rating[indices]))]
+
+    return [table.places[i] for i in indices], stages
@@ -0,0 +1,88 @@
+import os
+import numpy as np
+
+EARTH_RADIUS_M = 6371000
+
+# The equirectangular projection is used for points up to this far from the
+# origin at latitudes up to EQUIRECTANGULAR_MAX_LATITUDE; anything outside is
+# recomputed with haversine. Within those limits its relative error against
+# haversine stays under EQUIRECTANGULAR_MAX_RELATIVE_ERROR (about 5 m at 50 km
+# near the poles, centimetres at city scale), see verify_error_bound()
+EQUIRECTANGULAR_MAX_METERS = float(os.getenv('EQUIRECTANGULAR_MAX_METERS', 50000))
+EQUIRECTANGULAR_MAX_LATITUDE = 80
+EQUIRECTANGULAR_MAX_RELATIVE_ERROR = 1e-4
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres between two points"""
+    return float(haversine_many(lat1, lon1, lat2, lon2))
+
+def haversine_many(lat, lng, lats, lngs):
+    """Great-circle distances in metres from one origin to arrays of points"""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lngs, dtype=float) - lng)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def equirectangular_many(lat, lng, lats, lngs):
+    """Flat-earth distances in metres, scaled by the cosine of the mean latitude"""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(lats)
+    x = np.radians(np.asarray(lngs, dtype=float) - lng) * np.cos((phi1 + phi2) / 2)
+    return EARTH_RADIUS_M * np.hypot(x, phi2 - phi1)
+
+def distances_from(lat, lng, lats, lngs):
+    """Distances in metres from (lat, lng) to every point, as a float array.
+
+    Uses the equirectangular fast path and falls back to haversine for the
+    points where its error bound does not hold.
+    """
+    lat, lng = float(lat), float(lng)
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    if abs(lat) > EQUIRECTANGULAR_MAX_LATITUDE:
+        return haversine_many(lat, lng, lats, lngs)
+
+    distances = equirectangular_many(lat, lng, lats, lngs)
+    far = (distances > EQUIRECTANGULAR_MAX_METERS) | (np.abs(lats) > EQUIRECTANGULAR_MAX_LATITUDE)
+    if far.any():
+        distances[far] = haversine_many(lat, lng, lats[far], lngs[far])
+    return distances
+
+def place_distances(lat, lng, places):
+    """Distances in metres from (lat, lng) to place dicts carrying 'lat'/'lng'"""
+    return distances_from(lat, lng, [p['lat'] for p in places], [p['lng'] for p in places])
+
+def geometry_distances(lat, lng, places):
+    """Distances in metres from (lat, lng) to raw Google results with a geometry"""
+    return distances_from(lat, lng, [p['geometry']['location']['lat'] for p in places],
+                          [p['geometry']['location']['lng'] for p in places])
+
+def parse_location(location_str):
+    """Split a 'lat,lng' string into a float pair"""
+    lat, lng = location_str.split(',')
+    return float(lat), float(lng)
+
+def verify_error_bound(samples=100000, seed=0):
+    """Compare the fast path to haversine on random points inside its limits.
+
+    Returns the largest relative error seen and raises AssertionError if it
+    exceeds EQUIRECTANGULAR_MAX_RELATIVE_ERROR.
+    """
+    rng = np.random.default_rng(seed)
+    worst = 0.0
+    for lat in np.linspace(-EQUIRECTANGULAR_MAX_LATITUDE, EQUIRECTANGULAR_MAX_LATITUDE, 9):
+        bearing = rng.uniform(0, 2 * np.pi, samples)
+        meters = rng.uniform(1, EQUIRECTANGULAR_MAX_METERS, samples)
+        lats = np.clip(lat + meters * np.cos(bearing) / 111320,
+                       -EQUIRECTANGULAR_MAX_LATITUDE, EQUIRECTANGULAR_MAX_LATITUDE)
+        lngs = meters * np.sin(bearing) / (111320 * np.cos(np.radians(lats)))
+        exact = haversine_many(lat, 0.0, lats, lngs)
+        fast = equirectangular_many(lat, 0.0, lats, lngs)
+        worst = max(worst, float(np.max(np.abs(fast - exact) / exact)))
+    assert worst <= EQUIRECTANGULAR_MAX_RELATIVE_ERROR, f"equirectangular error {worst:.2e} exceeds bound"
+    return worst
+
+if __name__ == "__main__":
+    print(f"✅ Equirectangular fast path max relative error: {verify_error_bound():.2e}")
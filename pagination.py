@@ -0,0 +1,89 @@
+import os
+import json
+import time
+import uuid
+import base64
+from api.cache import get_cache_backend, load_cached, save_cached
+from revalidate import refresher
+
+# Filtered result sets are kept server-side so later pages need no upstream search
+RESULT_SET_TTL_MINUTES = float(os.getenv('RESULT_SET_TTL_MINUTES', 30))
+RESULT_SET_PREFIX = 'resultset:'
+
+# Expired result sets are swept from the backend at most this often
+RESULT_SET_PURGE_SECONDS = float(os.getenv('RESULT_SET_PURGE_SECONDS', 300))
+_last_purge = 0.0
+DEFAULT_PAGE_SIZE = int(os.getenv('SEARCH_RESULTS_LIMIT', 20))
+MAX_PAGE_SIZE = 50
+
+def get_page_size(value):
+    """Clamp a requested page size, falling back to the default"""
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+def encode_cursor(set_id, offset):
+    """Opaque cursor pointing at offset within a retained result set"""
+    return base64.urlsafe_b64encode(json.dumps([set_id, offset]).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (set_id, offset) for a cursor, or None if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        set_id, offset = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(set_id, str) or not isinstance(offset, int) or offset < 0:
+            return None
+        return set_id, offset
+    except Exception:
+        return None
+
+def save_result_set(results, offset, total_found=None):
+    """Retain a filtered result list and return the cursor for results[offset:].
+
+    Returns None when nothing is left past offset, so no set is stored.
+    """
+    if offset >= len(results):
+        return None
+    set_id = uuid.uuid4().hex
+    # Sets are written to the durable backend only, so any worker can serve a
+    # cursor, and are kept out of the hot tier where they would crowd out tiles
+    save_cached(f"{RESULT_SET_PREFIX}{set_id}", {'results': results, 'total_found': total_found},
+                RESULT_SET_TTL_MINUTES * 60, hot=False)
+    schedule_result_set_purge()
+    return encode_cursor(set_id, offset)
+
+def schedule_result_set_purge():
+    """Sweep expired result sets in the background every RESULT_SET_PURGE_SECONDS"""
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge < RESULT_SET_PURGE_SECONDS:
+        return
+    _last_purge = now
+
+    def purge():
+        purged = get_cache_backend().cleanup_expired(prefix=RESULT_SET_PREFIX)
+        if purged:
+            print(f"🧹 Purged {purged} expired result sets")
+
+    refresher.schedule('purge:resultsets', purge)
+
+def load_result_page(cursor, page_size=DEFAULT_PAGE_SIZE):
+    """Return (page, next_cursor, result_set) for a cursor.
+
+    Returns None for a malformed cursor or a result set that has expired.
+    Page entries are copies, so callers may enrich them in place.
+    """
+    decoded = decode_cursor(cursor)
+    if decoded is None:
+        return None
+    set_id, offset = decoded
+    result_set = load_cached(f"{RESULT_SET_PREFIX}{set_id}", hot=False)
+    if result_set is None:
+        return None
+
+    results = result_set['results']
+    page = [dict(r) for r in results[offset:offset + page_size]]
+    next_offset = offset + len(page)
+    next_cursor = encode_cursor(set_id, next_offset) if next_offset < len(results) else None
+    return page, next_cursor, result_set
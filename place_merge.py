@@ -0,0 +1,101 @@
+import os
+import re
+import math
+import unicodedata
+from difflib import SequenceMatcher
+from geo import haversine
+
+# Places from different sources closer than this, with similar names, are
+# treated as the same restaurant
+NEAR_DUPLICATE_METERS = float(os.getenv('NEAR_DUPLICATE_METERS', 75))
+NAME_SIMILARITY_THRESHOLD = float(os.getenv('NAME_SIMILARITY_THRESHOLD', 0.85))
+
+METERS_PER_DEGREE = 111320
+
+# Words that say what a place is rather than which place it is
+GENERIC_NAME_WORDS = {'the', 'restaurant', 'restaurants', 'cafe', 'café', 'bar', 'and', '&',
+                      'kitchen', 'eatery', 'dining', 'house', 'co', 'ltd', 'pte'}
+
+def normalize_name(name):
+    """Lowercase, strip accents and punctuation, and drop generic words"""
+    name = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode().lower()
+    return tuple(w for w in re.findall(r'[a-z0-9]+', name) if w not in GENERIC_NAME_WORDS)
+
+def names_match(a, b):
+    """True if two normalized names look like the same place"""
+    if not a or not b:
+        return False
+    # 'Domo' vs 'Domo Modern Japanese': one name leads the other
+    shorter, longer = (a, b) if len(a) <= len(b) else (b, a)
+    if longer[:len(shorter)] == shorter:
+        return True
+    return SequenceMatcher(None, ' '.join(a), ' '.join(b)).ratio() >= NAME_SIMILARITY_THRESHOLD
+
+class PlaceMerger:
+    """Merge place results from several queries and sources in one pass.
+
+    Exact duplicates are found through a place id index. Places from
+    different sources (manual entries vs Google) are also checked for near
+    duplicates: a spatial hash with cells of NEAR_DUPLICATE_METERS limits the
+    comparison to places in the neighbouring cells, whose names are then
+    compared. Places from the same source are never merged by name, so chain
+    branches with their own ids stay separate. The first place seen wins.
+    """
+
+    def __init__(self, places=None, near_meters=NEAR_DUPLICATE_METERS):
+        self.near_meters = near_meters
+        self.cell = near_meters / METERS_PER_DEGREE
+        self.ids = set()
+        self.grid = {}
+        self.results = []
+        self.duplicates = 0
+        self.near_duplicates = 0
+        self.extend(places or [])
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell), math.floor(lng / self.cell))
+
+    def _find_near_duplicate(self, place, name):
+        lat, lng = place['lat'], place['lng']
+        row, col = self._cell(lat, lng)
+        # Longitude cells shrink towards the poles, so look further east/west
+        reach = math.ceil(1 / max(math.cos(math.radians(lat)), 0.01))
+        for r in range(row - 1, row + 2):
+            for c in range(col - reach, col + reach + 1):
+                for other, other_name in self.grid.get((r, c), ()):
+                    if other.get('source') == place.get('source'):
+                        continue
+                    if (names_match(name, other_name)
+                            and haversine(lat, lng, other['lat'], other['lng']) <= self.near_meters):
+                        return other
+        return None
+
+    def add(self, place):
+        """Add a place; return False if it duplicates one already merged"""
+        place_id = place.get('id')
+        if place_id and place_id in self.ids:
+            self.duplicates += 1
+            return False
+
+        located = place.get('lat') is not None and place.get('lng') is not None
+        if located:
+            name = normalize_name(place.get('name'))
+            if self._find_near_duplicate(place, name) is not None:
+                self.near_duplicates += 1
+                return False
+            self.grid.setdefault(self._cell(place['lat'], place['lng']), []).append((place, name))
+
+        if place_id:
+            self.ids.add(place_id)
+        self.results.append(place)
+        return True
+
+    def extend(self, places):
+        """Add places and return how many were new"""
+        return sum(1 for _ in self.merge(places))
+
+    def merge(self, places):
+        """Add places as they arrive and yield the ones that are new"""
+        for place in places:
+            if self.add(place):
+                yield place
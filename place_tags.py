@@ -0,0 +1,119 @@
+import re
+import hashlib
+
+# Keywords the /restaurants cuisine filter matches against names and types
+CUISINE_FILTER_KEYWORDS = {
+    'japanese': ['japanese', 'sushi', 'ramen', 'tempura', 'bento', 'izakaya', 'teppanyaki'],
+    'chinese': ['chinese', 'dim sum', 'szechuan', 'cantonese', 'peking'],
+    'italian': ['italian', 'pizza', 'pasta', 'ristorante', 'trattoria'],
+    'indian': ['indian', 'curry', 'tandoori', 'biryani', 'masala'],
+    'thai': ['thai', 'pad thai', 'tom yum', 'green curry'],
+    'korean': ['korean', 'bbq', 'bibimbap', 'kimchi', 'bulgogi'],
+    'mexican': ['mexican', 'taco', 'burrito', 'enchilada', 'quesadilla'],
+    'american': ['american', 'burger', 'steak', 'bbq', 'diner'],
+    'french': ['french', 'bistro', 'brasserie', 'crepe', 'croissant'],
+    'mediterranean': ['mediterranean', 'greek', 'lebanese', 'turkish', 'falafel'],
+    'seafood': ['seafood', 'fish', 'crab', 'lobster', 'oyster', 'shrimp', 'prawn'],
+    'dessert': ['dessert', 'cake', 'ice cream', 'pastry', 'bakery', 'sweet'],
+    'vietnamese': ['vietnamese', 'pho', 'banh mi', 'spring roll', 'viet']
+}
+
+# Dish keywords per cuisine; the legacy search expands a cuisine into
+# keyword queries with them. They are too loose to tag places by substring
+# ('tuna' in 'Fortuna', 'dal' in 'Sandals'), so they stay out of the filters
+CUISINE_KEYWORDS = {
+    'japanese': ['sushi', 'ramen', 'tempura', 'udon', 'soba', 'yakitori', 'izakaya', 'bento', 'teppanyaki', 'sashimi'],
+    'chinese': ['dim sum', 'peking duck', 'kung pao', 'szechuan', 'cantonese', 'hot pot', 'dumplings', 'noodles'],
+    'italian': ['pizza', 'pasta', 'risotto', 'osso buco', 'bruschetta', 'tiramisu', 'gelato', 'prosciutto'],
+    'mexican': ['tacos', 'burritos', 'enchiladas', 'guacamole', 'quesadilla', 'mole', 'ceviche', 'tamales'],
+    'indian': ['curry', 'tandoori', 'naan', 'biryani', 'dal', 'samosa', 'kebab', 'masala'],
+    'thai': ['pad thai', 'tom yum', 'green curry', 'massaman', 'som tam', 'larb', 'satay'],
+    'korean': ['bbq', 'bibimbap', 'bulgogi', 'kimchi', 'japchae', 'tteokbokki', 'samgyeopsal'],
+    'vietnamese': ['pho', 'banh mi', 'spring rolls', 'bun cha', 'com tam', 'cao lau'],
+    'mediterranean': ['hummus', 'falafel', 'shawarma', 'kebab', 'tabbouleh', 'baklava'],
+    'french': ['croissant', 'escargot', 'coq au vin', 'ratatouille', 'quiche', 'creme brulee'],
+    'greek': ['gyro', 'moussaka', 'souvlaki', 'spanakopita', 'baklava', 'tzatziki'],
+    'spanish': ['paella', 'tapas', 'gazpacho', 'chorizo', 'jamón', 'sangria'],
+    'american': ['burger', 'steak', 'bbq', 'hot dog', 'mac and cheese', 'apple pie'],
+    'seafood': ['lobster', 'crab', 'shrimp', 'oysters', 'salmon', 'tuna', 'mussels'],
+    'vegetarian': ['vegan', 'plant-based', 'vegetarian', 'tofu', 'tempeh', 'quinoa'],
+    'dessert': ['ice cream', 'cake', 'pastry', 'donuts', 'cookies', 'chocolate']
+}
+
+# Single-word cuisine options offered by the front end
+SIMPLE_CUISINES = ['pizza', 'burger', 'sushi', 'ramen', 'coffee', 'bakery', 'bar', 'cafe']
+
+DIETARY_KEYWORDS = {
+    'vegetarian': ['vegetarian', 'veggie'],
+    'vegan': ['vegan', 'plant-based'],
+    'halal': ['halal'],
+    'gluten-free': ['gluten-free', 'gluten free'],
+    'kosher': ['kosher']
+}
+
+# Joins name and types into one searchable string per place; keywords never
+# contain it, so a match cannot straddle two fields
+FIELD_SEPARATOR = '\x00'
+
+def _build_tag_keywords():
+    tag_keywords = {}
+    for table in (CUISINE_FILTER_KEYWORDS, DIETARY_KEYWORDS):
+        for tag, keywords in table.items():
+            tag_keywords.setdefault(tag, {tag}).update(k.lower() for k in keywords)
+    for tag in SIMPLE_CUISINES:
+        tag_keywords.setdefault(tag, {tag})
+    return tag_keywords
+
+TAG_KEYWORDS = _build_tag_keywords()
+TAG_BITS = {tag: 1 << i for i, tag in enumerate(sorted(TAG_KEYWORDS))}
+
+# Bitsets are stored with cached places; the vocabulary version they were
+# computed under tells whether their bits still mean the same tags
+TAG_VERSION = hashlib.md5(repr(sorted((tag, sorted(keywords)) for tag, keywords in TAG_KEYWORDS.items()))
+                          .encode()).hexdigest()[:8]
+
+def _build_matcher():
+    keyword_masks = {}
+    for tag, keywords in TAG_KEYWORDS.items():
+        for keyword in keywords:
+            keyword_masks[keyword] = keyword_masks.get(keyword, 0) | TAG_BITS[tag]
+
+    # A lookahead alternation finds a match at every position, but only the
+    # longest keyword per position; fold in the masks of keywords that are
+    # prefixes of it ('viet' inside 'vietnamese') so none are lost
+    for keyword in list(keyword_masks):
+        for other in keyword_masks:
+            if other != keyword and keyword.startswith(other):
+                keyword_masks[keyword] |= keyword_masks[other]
+
+    alternation = '|'.join(re.escape(k) for k in sorted(keyword_masks, key=len, reverse=True))
+    return re.compile(f"(?=({alternation}))"), keyword_masks
+
+TAG_PATTERN, KEYWORD_MASKS = _build_matcher()
+
+def search_text(place):
+    """Lowercased name and types of a place, joined for substring matching"""
+    return FIELD_SEPARATOR.join([place.get('name') or ''] + list(place.get('types') or [])).lower()
+
+def compute_tags(place):
+    """Return the cuisine/dietary bitset for a place from its name and types"""
+    tags = 0
+    for match in TAG_PATTERN.finditer(search_text(place)):
+        tags |= KEYWORD_MASKS[match.group(1)]
+    return tags
+
+def tag_place(place):
+    """Attach the cuisine/dietary bitset to a place dict at ingest and return it"""
+    place['tags'] = compute_tags(place)
+    place['tags_version'] = TAG_VERSION
+    return place
+
+def get_tags(place):
+    """The place's bitset, recomputed if it is missing or from an older vocabulary"""
+    if place.get('tags') is None or place.get('tags_version') != TAG_VERSION:
+        return compute_tags(place)
+    return place['tags']
+
+def get_tag_mask(term):
+    """Bit for a cuisine or dietary term, or None if the term is not a known tag"""
+    return TAG_BITS.get((term or '').lower().strip())
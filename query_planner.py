@@ -0,0 +1,118 @@
+import os
+import math
+import random
+import threading
+from api.cache import get_cache_backend
+
+# Regions are ~11km grid cells; yield statistics are kept per region and
+# globally, and the global figures stand in for regions seen for the first time
+PLANNER_REGION_DEGREES = 0.1
+PLANNER_STATS_TTL_DAYS = float(os.getenv('PLANNER_STATS_TTL_DAYS', 30))
+
+# Queries with no history are assumed to add PRIOR_YIELD new places, weighted
+# as if PRIOR_CALLS calls had been observed
+PRIOR_YIELD = 5.0
+PRIOR_CALLS = 2
+
+# A query is skipped once its expected yield falls below PLANNER_MIN_YIELD,
+# except for a PLANNER_EXPLORE_RATE share of searches that retry it
+PLANNER_MIN_YIELD = float(os.getenv('PLANNER_MIN_YIELD', 0.5))
+PLANNER_EXPLORE_RATE = float(os.getenv('PLANNER_EXPLORE_RATE', 0.1))
+
+# A search stops once the last PLANNER_STOP_WINDOW calls added fewer than
+# PLANNER_STOP_YIELD new places each on average
+PLANNER_STOP_WINDOW = int(os.getenv('PLANNER_STOP_WINDOW', 4))
+PLANNER_STOP_YIELD = float(os.getenv('PLANNER_STOP_YIELD', 1.0))
+
+# Strategies that always run first; they establish the base candidate set and
+# surface API configuration errors
+ANCHOR_STRATEGIES = ('type',)
+
+def get_region(lat, lng):
+    """Coarse grid cell used to group yield statistics"""
+    return f"{math.floor(lat / PLANNER_REGION_DEGREES)}:{math.floor(lng / PLANNER_REGION_DEGREES)}"
+
+def get_query_id(query):
+    """Stable identity of a planned query across searches and radii"""
+    return f"{query['strategy']}:{query.get('yield_label', query['label'])}"
+
+class YieldTracker:
+    """Records how many new unique places each query contributed.
+
+    Statistics are {query_id: (calls, new_places)} per region plus a global
+    table. Each table is loaded from the cache backend the first time a
+    process needs it and written back after every search, so what was
+    learned survives restarts.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tables = {}
+
+    def _table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            try:
+                table = get_cache_backend().get(f"planner:{name}") or {}
+            except Exception as e:
+                print(f"❌ Planner stats read failed: {str(e)}")
+                table = {}
+            self.tables[name] = table
+        return table
+
+    def expected_yield(self, region, query_id):
+        """Smoothed mean of new places per call for a query in a region"""
+        with self.lock:
+            global_calls, global_new = self._table('global').get(query_id, (0, 0))
+            calls, new_places = self._table(region).get(query_id, (0, 0))
+        prior = (global_new + PRIOR_YIELD * PRIOR_CALLS) / (global_calls + PRIOR_CALLS)
+        return (new_places + prior * PRIOR_CALLS) / (calls + PRIOR_CALLS)
+
+    def record(self, region, query_id, new_places):
+        with self.lock:
+            for name in (region, 'global'):
+                calls, total = self._table(name).get(query_id, (0, 0))
+                self._table(name)[query_id] = (calls + 1, total + new_places)
+
+    def save(self, region):
+        with self.lock:
+            items = [(f"planner:{name}", dict(self._table(name))) for name in (region, 'global')]
+        try:
+            get_cache_backend().set_many(items, PLANNER_STATS_TTL_DAYS * 86400)
+        except Exception as e:
+            print(f"❌ Planner stats write failed: {str(e)}")
+
+    def stats(self):
+        with self.lock:
+            return {name: {qid: {'calls': c, 'new_places': n} for qid, (c, n) in table.items()}
+                    for name, table in self.tables.items()}
+
+yield_tracker = YieldTracker()
+
+def plan_queries(candidates, region, tracker=yield_tracker):
+    """Pick and order candidate queries by their expected yield.
+
+    Anchor strategies keep their place at the front; the rest run in order of
+    expected new places, and those below PLANNER_MIN_YIELD are dropped unless
+    this search is one that explores them again.
+    """
+    anchors = [q for q in candidates if q['strategy'] in ANCHOR_STRATEGIES]
+    scored = [(tracker.expected_yield(region, get_query_id(q)), q)
+              for q in candidates if q['strategy'] not in ANCHOR_STRATEGIES]
+    explore = random.random() < PLANNER_EXPLORE_RATE
+    kept = [(score, q) for score, q in scored if explore or score >= PLANNER_MIN_YIELD]
+    kept.sort(key=lambda item: item[0], reverse=True)
+    return anchors + [q for _, q in kept]
+
+class EarlyStop:
+    """Tracks marginal yield as results arrive and says when to stop"""
+
+    def __init__(self, window=PLANNER_STOP_WINDOW, min_yield=PLANNER_STOP_YIELD):
+        self.window = window
+        self.min_yield = min_yield
+        self.recent = []
+
+    def add(self, new_places):
+        """Record one call's yield; return True if the search should stop"""
+        self.recent = (self.recent + [new_places])[-self.window:]
+        return len(self.recent) == self.window and sum(self.recent) / self.window < self.min_yield
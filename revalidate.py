@@ -0,0 +1,66 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from api.quota import BACKGROUND, upstream_priority
+
+REFRESH_MAX_WORKERS = int(os.getenv('REFRESH_MAX_WORKERS', 2))
+REFRESH_MAX_PENDING = int(os.getenv('REFRESH_MAX_PENDING', 16))
+
+class BackgroundRefresher:
+    """Run cache refreshes off the request path, deduplicated and bounded.
+
+    A key that is already queued or running is not scheduled again, and once
+    max_pending refreshes are outstanding new ones are dropped; the stale
+    entry simply gets another chance on its next hit. A burst of stale hits
+    therefore costs at most max_pending upstream refreshes. Refreshes call
+    upstream at background priority, so they yield to interactive searches.
+    """
+
+    def __init__(self, max_workers=REFRESH_MAX_WORKERS, max_pending=REFRESH_MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.executor = None
+        self.executor_pid = None
+        self.dropped = 0
+
+    def _get_executor(self):
+        # Worker threads do not survive a fork, so each process gets its own pool
+        if self.executor is None or self.executor_pid != os.getpid():
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                               thread_name_prefix='cache-refresh')
+            self.executor_pid = os.getpid()
+            self.pending = set()
+        return self.executor
+
+    def schedule(self, key, fn):
+        """Queue fn() to refresh key; return False if deduplicated or dropped"""
+        with self.lock:
+            executor = self._get_executor()
+            if key in self.pending:
+                return False
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self.pending.add(key)
+
+        def run():
+            try:
+                with upstream_priority(BACKGROUND):
+                    fn()
+            except Exception as e:
+                print(f"❌ Background refresh failed for {key}: {str(e)}")
+            finally:
+                with self.lock:
+                    self.pending.discard(key)
+
+        executor.submit(run)
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {'pending': len(self.pending), 'dropped': self.dropped}
+
+# Shared by the search and details caches
+refresher = BackgroundRefresher()
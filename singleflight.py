@@ -0,0 +1,80 @@
+import asyncio
+import threading
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers that arrive while it
+    is in flight block until it finishes and receive the same result (or the
+    same exception). Nothing is remembered once the call completes, so caching
+    stays the job of the cache layers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        """Run fn() once per in-flight key and return (result, shared)"""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self.calls[key] = call
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result'], True
+
+        try:
+            call['result'] = fn()
+        except BaseException as e:
+            call['error'] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call['done'].set()
+        return call['result'], False
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.calls)
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines sharing one event loop.
+
+    Followers await the leader's future instead of blocking a thread.
+    """
+
+    def __init__(self):
+        self.calls = {}
+
+    async def do(self, key, fn):
+        """Await fn() once per in-flight key and return (result, shared)"""
+        call = self.calls.get(key)
+        if call is not None:
+            return await asyncio.shield(call), True
+
+        call = asyncio.get_running_loop().create_future()
+        self.calls[key] = call
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        except BaseException as e:
+            call.set_exception(e)
+            # Followers re-raise it; mark it retrieved for the leader's copy
+            call.exception()
+            raise
+        finally:
+            del self.calls[key]
+        call.set_result(result)
+        return result, False
+
+    def in_flight(self):
+        return len(self.calls)